@@ -0,0 +1,228 @@
+import logging
+import operator
+import re
+from collections import deque
+from fnmatch import fnmatchcase
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# "[avg|min|max|sum] <metric> [over <duration>] <op> <number|field> [for <duration>]"
+_EXPR = re.compile(
+    r'^\s*(?:(?P<agg>avg|min|max|sum)\s+(?P<agg_metric>.+?)\s+over\s+(?P<window>\S+)|(?P<metric>.+?))'
+    r'\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<threshold>\S+)'
+    r'(?:\s+for\s+(?P<for>\S+))?\s*$'
+)
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text):
+    # '30s', '5m', '1h', '2d' or a plain number of seconds
+    text = str(text).strip()
+    if text and text[-1] in _UNITS:
+        return float(text[:-1]) * _UNITS[text[-1]]
+    return float(text)
+
+
+class SlidingWindow:
+    """Aggregate over the last `window` seconds in O(1) amortized per sample.
+
+    avg and sum keep a running sum over a deque of samples; min and max keep
+    a monotonic deque whose head is always the current extreme.
+    """
+
+    def __init__(self, agg, window):
+        self.agg = agg
+        self.window = window
+        self.samples = deque()
+        self.total = 0.0
+        self.better = operator.lt if agg == 'min' else operator.gt
+
+    def add(self, ts, value):
+        samples = self.samples
+        if self.agg in ('min', 'max'):
+            # Anything the new value beats can never be the extreme again
+            while samples and not self.better(samples[-1][1], value):
+                samples.pop()
+            samples.append((ts, value))
+            while samples[0][0] <= ts - self.window:
+                samples.popleft()
+            return samples[0][1]
+        samples.append((ts, value))
+        self.total += value
+        while samples[0][0] <= ts - self.window:
+            self.total -= samples.popleft()[1]
+        if len(samples) == 1:
+            # Drop accumulated rounding error whenever the window restarts
+            self.total = value
+        return self.total / len(samples) if self.agg == 'avg' else self.total
+
+
+class Rule:
+    def __init__(self, name, expr, severity='warning'):
+        match = _EXPR.match(expr)
+        if match is None:
+            raise ValueError(f"Cannot parse alert expression: {expr!r}")
+        self.name = name
+        self.expr = expr
+        self.severity = severity
+        self.agg = match.group('agg')
+        self.pattern = (match.group('agg_metric') or match.group('metric')).strip()
+        self.window = parse_duration(match.group('window')) if self.agg else 0.0
+        self.op = OPERATORS[match.group('op')]
+        try:
+            self.threshold = float(match.group('threshold'))
+            self.threshold_field = None
+        except ValueError:
+            # A field name such as 'high', resolved next to each matched metric
+            self.threshold = None
+            self.threshold_field = match.group('threshold')
+        self.hold = parse_duration(match.group('for')) if match.group('for') else 0.0
+
+    def threshold_for(self, series, flat):
+        if self.threshold_field is None:
+            return self.threshold
+        if self.threshold_field in flat:
+            return flat[self.threshold_field]
+        return flat.get(f"{series.rpartition('.')[0]}.{self.threshold_field}")
+
+    def to_dict(self):
+        return {'name': self.name, 'expr': self.expr, 'severity': self.severity}
+
+
+class _SeriesState:
+    __slots__ = ('window', 'pending_since', 'firing_since', 'value', 'threshold', 'last_seen')
+
+    def __init__(self, rule):
+        self.window = SlidingWindow(rule.agg, rule.window) if rule.agg else None
+        self.pending_since = None
+        self.firing_since = None
+        self.value = None
+        self.threshold = None
+        self.last_seen = None
+
+
+class AlertEngine:
+    """Evaluates alert rules against each flattened sample.
+
+    Every (rule, series) pair is a small state machine: it goes pending when
+    its condition first holds, fires once the condition has held for the
+    rule's 'for' duration, and resolves when the condition stops holding.
+    Only those transitions produce events. A series that has been missing
+    from the samples for `missing_after` seconds (an unmounted disk, a
+    removed sensor or cgroup, a stale collector) resolves if it was firing,
+    and its state is dropped.
+    """
+
+    def __init__(self, rules, recent_events=100, missing_after=30.0):
+        self.rules = rules
+        self.missing_after = missing_after
+        self.by_name = {rule.name: rule for rule in rules}
+        self.states = {}
+        self.recent = deque(maxlen=recent_events)
+        self._matches = {}
+
+    @classmethod
+    def from_config(cls, entries, missing_after=30.0):
+        rules = []
+        for entry in entries or []:
+            if isinstance(entry, str):
+                entry = {'expr': entry}
+            try:
+                rule = Rule(entry.get('name', entry['expr']), entry['expr'], entry.get('severity', 'warning'))
+            except (KeyError, ValueError, AttributeError) as e:
+                logging.error(f"Skipping invalid alert rule {entry!r}: {e}")
+                continue
+            if any(r.name == rule.name for r in rules):
+                logging.error(f"Skipping alert rule with duplicate name {rule.name!r}")
+                continue
+            rules.append(rule)
+        return cls(rules, missing_after=missing_after)
+
+    def groups(self, names):
+        # The metric groups (first part of a flattened name) among `names`
+        # that some rule could read. '*' also matches dots, so only the part
+        # of a pattern before its first '*' has to match the group.
+        wanted = set()
+        for rule in self.rules:
+            patterns = [rule.pattern]
+            if rule.threshold_field is not None and '.' in rule.threshold_field:
+                patterns.append(rule.threshold_field)
+            for pattern in patterns:
+                head = pattern.split('*', 1)[0]
+                group = head.split('.', 1)[0] if '.' in head else head + ('*' if '*' in pattern else '')
+                wanted.update(name for name in names if fnmatchcase(name, group))
+        return wanted
+
+    def series_for(self, rule, flat, keys):
+        # Pattern matches are cached per key set, which rarely changes
+        cached = self._matches.get(rule.name)
+        if cached is None or cached[0] != keys:
+            if any(c in rule.pattern for c in '*?['):
+                matched = [k for k in flat if fnmatchcase(k, rule.pattern)]
+            else:
+                matched = [rule.pattern] if rule.pattern in flat else []
+            cached = (keys, matched)
+            self._matches[rule.name] = cached
+        return cached[1]
+
+    def evaluate(self, ts, flat):
+        events = []
+        keys = frozenset(flat)
+        for rule in self.rules:
+            for series in self.series_for(rule, flat, keys):
+                threshold = rule.threshold_for(series, flat)
+                if threshold is None:
+                    continue
+                key = (rule.name, series)
+                state = self.states.get(key)
+                if state is None:
+                    state = self.states[key] = _SeriesState(rule)
+                value = flat[series]
+                state.last_seen = ts
+                if state.window is not None:
+                    value = state.window.add(ts, value)
+                state.value = value
+                state.threshold = threshold
+                if rule.op(value, threshold):
+                    if state.pending_since is None:
+                        state.pending_since = ts
+                    if state.firing_since is None and ts - state.pending_since >= rule.hold:
+                        state.firing_since = ts
+                        events.append(self._event(rule, series, state, 'firing', ts))
+                else:
+                    state.pending_since = None
+                    if state.firing_since is not None:
+                        events.append(self._event(rule, series, state, 'resolved', ts))
+                        state.firing_since = None
+        gone = [key for key, state in self.states.items()
+                if state.last_seen < ts and ts - state.last_seen >= self.missing_after]
+        for key in gone:
+            state = self.states.pop(key)
+            if state.firing_since is not None:
+                events.append(self._event(self.by_name[key[0]], key[1], state, 'resolved', ts))
+        self.recent.extend(events)
+        return events
+
+    def _event(self, rule, series, state, status, ts):
+        return {
+            'rule': rule.name,
+            'series': series,
+            'state': status,
+            'severity': rule.severity,
+            'expr': rule.expr,
+            'value': round(state.value, 3),
+            'threshold': state.threshold,
+            'since': state.firing_since,
+            'timestamp': ts
+        }
+
+    def active(self):
+        return [self._event(self.by_name[name], series, state, 'firing', state.firing_since)
+                for (name, series), state in self.states.items() if state.firing_since is not None]
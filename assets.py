@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+# Hashed asset URLs never change content, so browsers may keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def encode_body(body, etag, compresslevel=9):
+    # A response body with its ETag and gzip variant; the gzip copy is
+    # dropped when it would not be smaller
+    compressed = gzip.compress(body, compresslevel=compresslevel)
+    return {'etag': etag, 'body': body, 'gzip': compressed if len(compressed) < len(body) else None}
+
+
+def conditional_response(request, entry, content_type, cache_control='no-cache'):
+    headers = {'ETag': entry['etag'], 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if_none_match = request.headers.get('If-None-Match', '')
+    if if_none_match.strip() == '*' or entry['etag'] in (t.strip() for t in if_none_match.split(',')):
+        return web.Response(status=304, headers=headers)
+    body = entry['body']
+    if entry['gzip'] is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = entry['gzip']
+        headers['Content-Encoding'] = 'gzip'
+    headers['Content-Type'] = content_type
+    return web.Response(body=body, headers=headers)
+
+
+def _content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+class AssetPipeline:
+    """Static files served under content-hashed names.
+
+    Every file under `root` is read, hashed and gzipped once, and rebuilt
+    only when its mtime changes. Templates link to url('dashboard.js'),
+    which resolves to '/static/dashboard.<hash>.js'. That name is served with
+    an immutable Cache-Control, so a changed file always gets a new URL.
+    Pages look for changed files through refresh(), which walks the tree at
+    most once per rescan_interval seconds (never, if it is 0).
+    """
+
+    def __init__(self, root, prefix='/static/', rescan_interval=2.0):
+        self.root = Path(root)
+        self.prefix = prefix
+        self.rescan_interval = rescan_interval
+        self.assets = {}
+        self._by_name = {}
+        self._scanned = None
+
+    def build(self):
+        # Returns True if any asset was added, changed or removed
+        self._scanned = time.monotonic()
+        changed = False
+        seen = set()
+        for path in sorted(self.root.rglob('*')) if self.root.is_dir() else []:
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.root).as_posix()
+            seen.add(name)
+            mtime = path.stat().st_mtime_ns
+            current = self.assets.get(name)
+            if current is not None and current['mtime'] == mtime:
+                continue
+            body = path.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            stem, ext = os.path.splitext(name)
+            entry = encode_body(body, f'"{digest}"')
+            entry.update(name=name, hashed=f"{stem}.{digest}{ext}", mtime=mtime, content_type=_content_type(name))
+            self.assets[name] = entry
+            changed = True
+        for name in set(self.assets) - seen:
+            del self.assets[name]
+            changed = True
+        if changed:
+            self._by_name = {}
+            for entry in self.assets.values():
+                self._by_name[entry['name']] = entry
+                self._by_name[entry['hashed']] = entry
+        return changed
+
+    def refresh(self):
+        # build(), unless the last scan was too recent
+        if self._scanned is not None and (self.rescan_interval <= 0 or
+                                          time.monotonic() - self._scanned < self.rescan_interval):
+            return False
+        return self.build()
+
+    def url(self, name):
+        return self.prefix + self.assets[name]['hashed']
+
+    async def handle(self, request):
+        entry = self._by_name.get(request.match_info['path'])
+        if entry is None:
+            raise web.HTTPNotFound()
+        # The plain name still works, but must be revalidated
+        cache_control = IMMUTABLE if request.match_info['path'] == entry['hashed'] else 'no-cache'
+        return conditional_response(request, entry, entry['content_type'], cache_control)
+
+
+class TemplatePage:
+    # A template rendered once and re-rendered only when it or an asset it
+    # links to changes. Jinja's auto_reload stats the template file on
+    # get_template() and returns a new object if its mtime moved.
+    def __init__(self, env, name, assets, **context):
+        self.env = env
+        self.name = name
+        self.assets = assets
+        self.context = context
+        self._template = None
+        self._entry = None
+
+    def get(self):
+        template = self.env.get_template(self.name)
+        if self.assets.refresh() or template is not self._template:
+            html = template.render(asset_url=self.assets.url, **self.context).encode('utf-8')
+            self._entry = encode_body(html, f'"{hashlib.sha256(html).hexdigest()[:16]}"')
+            self._template = template
+        return self._entry
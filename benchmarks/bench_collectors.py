@@ -0,0 +1,110 @@
+"""Micro-benchmarks for the metric collectors.
+
+Times every get_*_info() wrapper and every read_*() collector the sampler
+uses, and measures the memory each call allocates. Results are written as
+JSON so runs from different releases can be compared.
+
+    python benchmarks/bench_collectors.py --iterations 200 --output collectors.json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import web_monitor  # noqa: E402
+from common import run_metadata, summarize  # noqa: E402
+
+V1_COLLECTORS = {
+    'get_cpu_info': web_monitor.get_cpu_info,
+    'get_memory_info': web_monitor.get_memory_info,
+    'get_disk_info': web_monitor.get_disk_info,
+    'get_network_info': web_monitor.get_network_info,
+    'get_temperature_info': web_monitor.get_temperature_info,
+    'get_system_time_info': web_monitor.get_system_time_info
+}
+
+
+def time_calls(func, iterations, warmup):
+    for _ in range(warmup):
+        func()
+    samples = []
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter_ns()
+            func()
+            samples.append((time.perf_counter_ns() - start) / 1000.0)
+    finally:
+        gc.enable()
+    return samples
+
+
+def measure_allocations(func, iterations):
+    # Peak traced memory during a call is what it allocated, including
+    # temporaries freed before returning; 'retained' is what outlived it
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = func()
+            after, peak = tracemalloc.get_traced_memory()
+            del result
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_bytes_p50': sorted(peaks)[len(peaks) // 2],
+        'alloc_bytes_max': max(peaks),
+        'retained_bytes_p50': sorted(retained)[len(retained) // 2]
+    }
+
+
+def benchmark(name, func, iterations, warmup):
+    try:
+        samples = time_calls(func, iterations, warmup)
+    except Exception as e:
+        print(f"{name}: skipped ({e})", file=sys.stderr)
+        return {'error': str(e)}
+    result = summarize(samples, unit='us')
+    result.update(measure_allocations(func, max(iterations // 10, 10)))
+    print(f"{name:24s} p50={result['p50_us']:9.1f}us  p99={result['p99_us']:9.1f}us  "
+          f"alloc={result['alloc_bytes_p50']}B")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the metric collectors')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per collector')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed calls before measuring')
+    parser.add_argument('--output', default='collectors.json', help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in V1_COLLECTORS.items():
+        results[name] = benchmark(name, func, args.iterations, args.warmup)
+    # The sampler's collectors share one CounterState, as they do in the server
+    state = web_monitor.CounterState()
+    for name, collector in web_monitor.COLLECTORS.items():
+        results[f"read_{name}"] = benchmark(f"read_{name}", lambda c=collector: c(state),
+                                            args.iterations, args.warmup)
+
+    # Sources read straight from /proc rather than through psutil
+    fast_path = sorted(web_monitor.procfs.sources) if web_monitor.procfs is not None else []
+    report = {'benchmark': 'collectors', 'meta': run_metadata(), 'iterations': args.iterations,
+              'procfs_sources': fast_path, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
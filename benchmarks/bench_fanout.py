@@ -0,0 +1,180 @@
+"""Socket.IO fan-out load test.
+
+Starts a local server, then for each client count in --clients connects that
+many Socket.IO clients and records, over --duration seconds:
+
+- emit latency: receive time minus the sample's own timestamp (p50/p99)
+- server CPU percent and resident memory, read from the server process
+
+Results are written as JSON so runs from different releases can be compared.
+
+    python benchmarks/bench_fanout.py --clients 1,10,50,100 --duration 10 --output fanout.json
+
+With --replay, the server serves a recording (see recording.file in the
+config) instead of sampling this machine, so runs are repeatable:
+
+    python benchmarks/bench_fanout.py --replay incident.smrec --replay-speed 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import psutil
+import socketio
+import yaml
+
+from common import REPO_ROOT, run_metadata, summarize
+
+
+def write_config(port, interval, replay=None, replay_speed=1.0):
+    config = {
+        'server': {'host': '127.0.0.1', 'http': {'enabled': True, 'port': port}, 'https': {'enabled': False}},
+        'monitoring': {'update_interval': interval},
+        'history': {'enabled': False}
+    }
+    if replay:
+        # Same samples every run, whatever the load on this machine
+        config['replay'] = {'file': os.path.abspath(replay), 'speed': replay_speed, 'loop': True}
+    handle, path = tempfile.mkstemp(suffix='.yaml', prefix='bench-fanout-')
+    with os.fdopen(handle, 'w') as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+async def wait_until_ready(url, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url}/api/system_info") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+class LoadClient:
+    def __init__(self, url, protocol):
+        self.url = url
+        self.protocol = protocol
+        self.latencies = []
+        self.received = 0
+        self.recording = False
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on('metrics_update', self.on_update)
+        self.sio.on('metrics_keyframe', lambda msg: self.on_update(msg['data']))
+        self.sio.on('metrics_patch', self.on_patch)
+
+    def record(self, timestamp):
+        if self.recording:
+            self.received += 1
+            if timestamp is not None:
+                self.latencies.append((time.time() - timestamp) * 1000.0)
+
+    def on_update(self, data):
+        self.record(data.get('timestamp'))
+
+    def on_patch(self, msg):
+        # Every sample has a new timestamp, so each patch sets it
+        timestamp = next((op[1] for op in msg['ops'] if op[0] == ['timestamp'] and len(op) == 2), None)
+        self.record(timestamp)
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=['websocket'],
+                               auth={'schema': 2, 'protocol': self.protocol})
+
+    async def disconnect(self):
+        await self.sio.disconnect()
+
+
+async def run_level(url, server, count, duration, protocol):
+    clients = [LoadClient(url, protocol) for _ in range(count)]
+    await asyncio.gather(*(c.connect() for c in clients))
+    # Let connection setup settle before measuring
+    await asyncio.sleep(1.0)
+    for c in clients:
+        c.recording = True
+    cpu_before = server.cpu_times()
+    start = time.monotonic()
+    rss_peak = 0
+    while time.monotonic() - start < duration:
+        rss_peak = max(rss_peak, server.memory_info().rss)
+        await asyncio.sleep(0.25)
+    elapsed = time.monotonic() - start
+    cpu_after = server.cpu_times()
+    for c in clients:
+        c.recording = False
+    await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+    latencies = [ms for c in clients for ms in c.latencies]
+    cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    result = {
+        'clients': count,
+        'duration_s': round(elapsed, 2),
+        'messages': sum(c.received for c in clients),
+        'server_cpu_percent': round(100.0 * cpu_seconds / elapsed, 1),
+        'server_rss_bytes': server.memory_info().rss,
+        'server_rss_peak_bytes': rss_peak,
+        'emit_latency': summarize(latencies, unit='ms')
+    }
+    print(f"clients={count:5d}  cpu={result['server_cpu_percent']:6.1f}%  "
+          f"p50={result['emit_latency'].get('p50_ms')}ms  p99={result['emit_latency'].get('p99_ms')}ms  "
+          f"rss={rss_peak / 2**20:.1f}MiB")
+    return result
+
+
+async def run(args):
+    config_path = write_config(args.port, args.interval, args.replay, args.replay_speed)
+    env = dict(os.environ, MONITOR_CONFIG=config_path)
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'web_monitor.py')], cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_until_ready(url)
+        server = psutil.Process(proc.pid)
+        results = []
+        for count in args.clients:
+            results.append(await run_level(url, server, count, args.duration, args.protocol))
+        return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        os.unlink(config_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test Socket.IO fan-out against a local server')
+    parser.add_argument('--clients', default='1,10,50,100',
+                        type=lambda s: [int(n) for n in s.split(',')],
+                        help='Comma-separated client counts to run, in order')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds measured per client count')
+    parser.add_argument('--interval', type=float, default=1.0, help='Server monitoring.update_interval')
+    parser.add_argument('--protocol', choices=('full', 'delta'), default='full')
+    parser.add_argument('--replay', help='Serve this sample recording instead of live samples')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay speed multiplier, 0 for max')
+    parser.add_argument('--port', type=int, default=3901, help='Port for the server under test')
+    parser.add_argument('--output', default='fanout.json', help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {'benchmark': 'fanout', 'meta': run_metadata(), 'duration': args.duration,
+              'interval': args.interval, 'protocol': args.protocol, 'replay': args.replay,
+              'replay_speed': args.replay_speed, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
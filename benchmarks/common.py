@@ -0,0 +1,49 @@
+import os
+import platform
+import subprocess
+import time
+
+import psutil
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, unit='ms'):
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        f'mean_{unit}': round(sum(values) / len(values), 3),
+        f'p50_{unit}': round(percentile(values, 50), 3),
+        f'p90_{unit}': round(percentile(values, 90), 3),
+        f'p99_{unit}': round(percentile(values, 99), 3),
+        f'max_{unit}': round(values[-1], 3)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata():
+    return {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': psutil.cpu_count(),
+        'psutil': psutil.__version__
+    }
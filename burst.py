@@ -0,0 +1,242 @@
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+
+# Columns after the timestamp and the per-core CPU columns
+DISK_COLUMNS = ('read_bytes', 'write_bytes', 'read_count', 'write_count')
+NETWORK_COLUMNS = ('bytes_sent', 'bytes_recv')
+# Reported series for the counter columns, in column order
+COUNTER_SERIES = ('disk_io.read_rate', 'disk_io.write_rate', 'disk_io.read_iops', 'disk_io.write_iops',
+                  'network.send_rate', 'network.recv_rate')
+
+
+def _values(array):
+    # NaN (no CPU ticks in an interval, or no samples) becomes None in JSON
+    return [None if math.isnan(v) else v for v in np.round(array, 2).tolist()]
+
+
+class BurstSampler:
+    """Samples raw CPU, disk and network counters many times a second for a bounded window.
+
+    Rows go into a ring preallocated as one float64 array, so sampling
+    allocates nothing per row: a monotonic timestamp, busy and total CPU
+    seconds per core, disk bytes and operations, and network bytes. Rates
+    are only worked out when the ring is read, by envelope().
+
+    Sampling runs on its own thread, outside the collector pool, and keeps
+    its own CPU time under max_overhead of one core over the burst. When
+    reads cost more than that allows, the next one is pushed back and
+    counted as throttled; the requested rate gives way, never the cap.
+    """
+
+    def __init__(self, read_cpu, read_disk, read_network, max_duration=60.0, max_rate=50.0, max_overhead=0.02,
+                 per_core=True):
+        if not 0 < max_overhead <= 1:
+            raise ValueError("max_overhead must be between 0 and 1")
+        self.read_cpu = read_cpu
+        self.read_disk = read_disk
+        self.read_network = read_network
+        self.max_duration = float(max_duration)
+        self.max_rate = float(max_rate)
+        self.max_overhead = float(max_overhead)
+        self.per_core = per_core
+        # One burst at full rate, plus the row closing its last interval
+        self.capacity = int(self.max_duration * self.max_rate) + 2
+        self.cores = 0
+        self.ring = None
+        self._allocate()
+        self.burst = None
+        self.written = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._next_id = 1
+
+    def _allocate(self):
+        cores = len(self.read_cpu()[0])
+        if cores != self.cores or self.ring is None:
+            self.cores = cores
+            self.ring = np.zeros((self.capacity, 1 + 2 * cores + len(DISK_COLUMNS) + len(NETWORK_COLUMNS)))
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration, rate):
+        # Raises ValueError for a window or rate past the configured limits
+        duration = float(duration)
+        rate = float(rate)
+        if not 0 < duration <= self.max_duration:
+            raise ValueError(f"duration must be between 0 and {self.max_duration:g} seconds")
+        if not 0 < rate <= self.max_rate:
+            raise ValueError(f"rate must be between 0 and {self.max_rate:g} Hz")
+        if self.running:
+            raise RuntimeError("A burst is already running")
+        # CPUs may have come online or gone offline since the last burst
+        self._allocate()
+        self.written = 0
+        self._stop.clear()
+        self.burst = {
+            'id': self._next_id,
+            'state': 'running',
+            'duration': duration,
+            'rate': rate,
+            'started': time.time(),
+            'cpu_time': 0.0,
+            'throttled': 0,
+            'error': None,
+            # Monotonic time of the first sample; buckets are counted from it
+            'origin': None,
+            # Converts the monotonic timestamps in the ring to epoch seconds
+            'offset': time.time() - time.monotonic()
+        }
+        self._next_id += 1
+        self._thread = threading.Thread(target=self._run, args=(self.burst,), name='burst-sampler', daemon=True)
+        self._thread.start()
+        return self.burst['id']
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, burst):
+        ring = self.ring
+        n = self.cores
+        disk = slice(1 + 2 * n, 1 + 2 * n + len(DISK_COLUMNS))
+        network = slice(disk.stop, disk.stop + len(NETWORK_COLUMNS))
+        interval = 1.0 / burst['rate']
+        started = time.monotonic()
+        end = started + burst['duration']
+        deadline = started
+        cpu_time = 0.0
+        row = 0
+        state = 'finished'
+        while True:
+            now = time.monotonic()
+            if now < deadline and self._stop.wait(deadline - now):
+                state = 'stopped'
+                break
+            cost = time.thread_time()
+            try:
+                busy, total = self.read_cpu()
+                values = ring[row % self.capacity]
+                values[0] = time.monotonic()
+                values[1:1 + n] = busy
+                values[1 + n:1 + 2 * n] = total
+                values[disk] = self.read_disk()
+                values[network] = self.read_network()
+            except Exception as e:
+                # Includes a CPU going offline mid-burst (the row no longer fits)
+                logging.error(f"Burst sampling error: {e}")
+                burst['error'] = str(e)
+                state = 'failed'
+                break
+            if not row:
+                burst['origin'] = values[0]
+            row += 1
+            self.written = row
+            cpu_time += time.thread_time() - cost
+            burst['cpu_time'] = cpu_time
+            if values[0] >= end:
+                break
+            deadline = min(deadline + interval, end)
+            # The cap: CPU time so far may not pass max_overhead of the time elapsed
+            earliest = started + cpu_time / self.max_overhead
+            if earliest > deadline:
+                deadline = earliest
+                burst['throttled'] += 1
+            # Late samples are not made up for with a catch-up run of reads
+            deadline = max(deadline, time.monotonic())
+        burst['state'] = state
+
+    def status(self):
+        if self.burst is None:
+            return {'state': 'idle'}
+        burst = self.burst
+        status = {key: value for key, value in burst.items() if key not in ('offset', 'origin')}
+        status['samples'] = self.written
+        last = self.written - 1
+        elapsed = float(self.ring[last % self.capacity, 0] - burst['origin']) if last > 0 else 0.0
+        status['elapsed'] = round(elapsed, 3)
+        status['achieved_rate'] = round(last / elapsed, 2) if elapsed else 0.0
+        # Share of one core spent sampling
+        status['overhead'] = round(burst['cpu_time'] / elapsed, 4) if elapsed else 0.0
+        status['cpu_time'] = round(burst['cpu_time'], 4)
+        status['series'] = self.series()
+        return status
+
+    def series(self):
+        names = ['cpu.percent']
+        if self.per_core:
+            names += [f"cpu.per_core.{i}" for i in range(self.cores)]
+        return names + list(COUNTER_SERIES)
+
+    def _rows(self, first, last):
+        # Rows first..last-1 by sample number, as (first, rows): the oldest
+        # are gone once the ring wraps
+        first = max(first, last - self.capacity, 0)
+        return first, self.ring.take(np.arange(first, last), axis=0, mode='wrap')
+
+    def envelope(self, first_row=0, step=1.0, final=True):
+        """Downsamples the burst from row first_row into buckets of step seconds.
+
+        Each bucket has the min, mean and max of every series over the
+        sample intervals ending in it. The mean is the counter delta over
+        the bucket, so it is exact however the extremes are spread. Buckets
+        start at the burst's first sample. Unless final, only buckets that
+        can no longer change are included, so a stream of envelopes can
+        continue from the returned row without splitting a bucket.
+
+        Returns (envelope or None, row to continue from).
+        """
+        first_row, rows = self._rows(first_row, self.written)
+        if len(rows) < 2:
+            return None, first_row
+        origin = self.burst['origin']
+        if not final:
+            boundary = origin + (rows[-1, 0] - origin) // step * step
+            rows = rows[:int(np.searchsorted(rows[:, 0], boundary, side='right'))]
+            if len(rows) < 2:
+                return None, first_row
+        n = self.cores
+        delta = np.maximum(np.diff(rows, axis=0), 0.0)
+        elapsed = delta[:, :1]
+        busy = delta[:, 1:1 + n]
+        total = delta[:, 1 + n:1 + 2 * n]
+        counters = delta[:, 1 + 2 * n:]
+        numerators = [busy.sum(axis=1, keepdims=True) * 100.0]
+        denominators = [total.sum(axis=1, keepdims=True)]
+        if self.per_core:
+            numerators.append(busy * 100.0)
+            denominators.append(total)
+        numerators.append(counters)
+        denominators.append(np.repeat(elapsed, counters.shape[1], axis=1))
+        numerator = np.hstack(numerators)
+        denominator = np.hstack(denominators)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(denominator > 0, numerator / denominator, np.nan)
+        # An interval belongs to the bucket its closing sample falls in
+        buckets = np.maximum(np.ceil((rows[1:, 0] - origin) / step) - 1, 0).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        low = np.fmin.reduceat(values, starts, axis=0)
+        high = np.fmax.reduceat(values, starts, axis=0)
+        numerator = np.add.reduceat(numerator, starts, axis=0)
+        denominator = np.add.reduceat(denominator, starts, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(denominator > 0, numerator / denominator, np.nan)
+        ends = origin + (buckets[starts] + 1) * step + self.burst['offset']
+        result = {
+            'id': self.burst['id'],
+            'step': step,
+            't': np.round(ends, 3).tolist(),
+            'samples': np.diff(np.r_[starts, len(buckets)]).tolist(),
+            'series': {
+                name: {'min': _values(low[:, i]), 'mean': _values(mean[:, i]), 'max': _values(high[:, i])}
+                for i, name in enumerate(self.series())
+            }
+        }
+        # The last row closes this envelope's final interval and opens the next one's
+        return result, first_row + len(rows) - 1
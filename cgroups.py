@@ -0,0 +1,180 @@
+import logging
+import os
+from collections import deque
+
+from procfs import ProcFile
+
+PRESSURE_RESOURCES = ('cpu', 'memory', 'io')
+_CPU_FIELDS = {b'usage_usec', b'nr_periods', b'nr_throttled', b'throttled_usec'}
+_IO_FIELDS = (b'rbytes', b'wbytes', b'rios', b'wios')
+
+
+def parse_pressure(text):
+    # "some avg10=0.12 avg60=0.05 avg300=0.01 total=123456\nfull ..." ->
+    # {'some': {'avg10': 0.12, ..., 'total': 123456}, 'full': {...}}
+    result = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        values = dict(field.split(b'=', 1) for field in fields)
+        result[kind.decode()] = {
+            'avg10': float(values[b'avg10']),
+            'avg60': float(values[b'avg60']),
+            'avg300': float(values[b'avg300']),
+            'total': int(values[b'total'])
+        }
+    return result
+
+
+def _open(path):
+    # Interface files only exist for controllers enabled on the parent
+    try:
+        return ProcFile(path, size=1024)
+    except FileNotFoundError:
+        return None
+
+
+class Cgroup:
+    FILES = ('cpu.stat', 'memory.current', 'memory.max', 'io.stat', 'cpu.pressure', 'memory.pressure', 'io.pressure')
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        for name in self.FILES:
+            f = _open(os.path.join(path, name))
+            if f is not None:
+                self.files[name] = f
+
+    def read(self):
+        # Raw counters; raises OSError once the cgroup has been removed
+        counters = {}
+        files = self.files
+        if 'cpu.stat' in files:
+            for line in files['cpu.stat'].read().splitlines():
+                key, value = line.split()
+                if key in _CPU_FIELDS:
+                    counters[key.decode()] = int(value)
+        if 'memory.current' in files:
+            counters['memory_current'] = int(files['memory.current'].read())
+        if 'memory.max' in files:
+            limit = files['memory.max'].read().strip()
+            counters['memory_max'] = None if limit == b'max' else int(limit)
+        if 'io.stat' in files:
+            totals = dict.fromkeys(_IO_FIELDS, 0)
+            # One line per device: "8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0"
+            for line in files['io.stat'].read().splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition(b'=')
+                    if key in totals:
+                        totals[key] += int(value)
+            counters.update((key.decode(), value) for key, value in totals.items())
+        pressure = {}
+        for resource in PRESSURE_RESOURCES:
+            f = files.get(f"{resource}.pressure")
+            if f is not None:
+                pressure[resource] = parse_pressure(f.read())['some']['avg10']
+        counters['pressure'] = pressure
+        return counters
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class CgroupTree:
+    """cgroup v2 groups under the configured subtrees, with their files held open.
+
+    The directory walk is cached. Each read checks nr_descendants in every
+    subtree's cgroup.stat, one small read per subtree, and walks again only
+    when a count changes or a cached group turns out to be gone. Hundreds
+    of groups therefore cost no directory scans in a steady state.
+    """
+
+    def __init__(self, root='/sys/fs/cgroup', paths=('/',), depth=2, max_groups=50):
+        self.root = os.path.normpath(root)
+        self.subtrees = [os.path.normpath(os.path.join(self.root, str(p).lstrip('/'))) for p in paths]
+        self.depth = depth
+        self.max_groups = max_groups
+        self.groups = {}
+        self.scans = 0
+        self._stat_files = {}
+        self._descendants = None
+        self._missing = set()
+        self._pressure_files = {}
+        for resource in PRESSURE_RESOURCES:
+            try:
+                self._pressure_files[resource] = ProcFile(f"/proc/pressure/{resource}", size=256)
+            except OSError:
+                # Kernel built without PSI, or booted with psi=0
+                pass
+
+    def name(self, path):
+        return '/' + os.path.relpath(path, self.root) if path != self.root else '/'
+
+    def descendants(self):
+        counts = []
+        for subtree in self.subtrees:
+            try:
+                f = self._stat_files.get(subtree)
+                if f is None:
+                    f = self._stat_files[subtree] = ProcFile(os.path.join(subtree, 'cgroup.stat'), size=512)
+                stat = dict(line.split() for line in f.read().splitlines())
+                counts.append(int(stat[b'nr_descendants']))
+            except (OSError, KeyError, ValueError) as e:
+                # Not a cgroup v2 directory, or removed; retried every read
+                f = self._stat_files.pop(subtree, None)
+                if f is not None:
+                    f.close()
+                if subtree not in self._missing:
+                    logging.warning(f"Not reading cgroups under {subtree}: not a cgroup v2 directory ({e})")
+                    self._missing.add(subtree)
+                counts.append(None)
+                continue
+            self._missing.discard(subtree)
+        return tuple(counts)
+
+    def scan(self):
+        # Breadth first, so the cap drops the deepest groups first
+        found = {}
+        queue = deque((subtree, 0) for subtree in self.subtrees if subtree in self._stat_files)
+        while queue and len(found) < self.max_groups:
+            path, level = queue.popleft()
+            if path in found:
+                continue
+            found[path] = self.name(path)
+            if level >= self.depth:
+                continue
+            try:
+                with os.scandir(path) as entries:
+                    queue.extend((entry.path, level + 1) for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+        if queue:
+            logging.warning(f"More than {self.max_groups} cgroups under {self.subtrees}, only reading the first")
+        current = {name: path for path, name in found.items()}
+        for name in set(self.groups) - set(current):
+            self.groups.pop(name).close()
+        for name, path in current.items():
+            if name not in self.groups:
+                self.groups[name] = Cgroup(path)
+        self.scans += 1
+
+    def read(self):
+        counts = self.descendants()
+        if counts != self._descendants:
+            self.scan()
+            self._descendants = counts
+        result = {}
+        for name, group in list(self.groups.items()):
+            try:
+                result[name] = group.read()
+            except OSError:
+                # Removed since the last walk, and maybe recreated at the same
+                # path (a restarted service): the held files stay dead, so drop
+                # the group and walk again on the next read to reopen it
+                self.groups.pop(name).close()
+                self._descendants = None
+        return result
+
+    def pressure(self):
+        # System-wide pressure stall information from /proc/pressure
+        return {resource: parse_pressure(f.read()) for resource, f in self._pressure_files.items()}
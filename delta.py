@@ -0,0 +1,44 @@
+# Snapshot patches: a list of ops where [path, value] sets a key and [path]
+# deletes one. Nested dicts are diffed key by key; lists are replaced whole.
+
+
+def diff_snapshot(old, new, path=()):
+    ops = []
+    for key, value in new.items():
+        if key not in old:
+            ops.append([[*path, key], value])
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            ops.extend(diff_snapshot(old[key], value, (*path, key)))
+        elif value != old[key]:
+            ops.append([[*path, key], value])
+    for key in old:
+        if key not in new:
+            ops.append([[*path, key]])
+    return ops
+
+
+def apply_patch(base, ops):
+    # Returns a new snapshot and leaves `base` intact. Only the dicts along
+    # patched paths are copied, each at most once; everything else is shared.
+    result = dict(base)
+    copied = {id(result)}
+    for op in ops:
+        path = op[0]
+        node = result
+        for key in path[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                child = {}
+            elif id(child) in copied:
+                node = child
+                continue
+            else:
+                child = dict(child)
+            copied.add(id(child))
+            node[key] = child
+            node = child
+        if len(op) > 1:
+            node[path[-1]] = op[1]
+        else:
+            node.pop(path[-1], None)
+    return result
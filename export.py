@@ -0,0 +1,85 @@
+# Encoders for streamed history exports. Each takes the export's column
+# names and turns batches of (timestamp, [value or None, ...]) rows into
+# bytes: header() once, then encode() per batch.
+import csv
+import io
+import json
+
+import numpy as np
+
+
+class NDJSONEncoder:
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+    needs_count = False
+
+    def __init__(self, metrics, count=None):
+        self.keys = ['timestamp', *metrics]
+
+    def header(self):
+        return b''
+
+    def encode(self, rows):
+        keys = self.keys
+        return ''.join(json.dumps(dict(zip(keys, (ts, *values))), separators=(',', ':')) + '\n'
+                       for ts, values in rows).encode('utf-8')
+
+
+class CSVEncoder:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+    needs_count = False
+
+    def __init__(self, metrics, count=None):
+        self.metrics = metrics
+
+    def _lines(self, rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerows(rows)
+        return buf.getvalue().encode('utf-8')
+
+    def header(self):
+        return self._lines([['timestamp', *self.metrics]])
+
+    def encode(self, rows):
+        # Missing values are written as empty fields
+        return self._lines([ts, *('' if value is None else repr(value) for value in values)] for ts, values in rows)
+
+
+class NPYEncoder:
+    # A NumPy .npy file holding a structured array with one float64 field
+    # per column, so np.load(f)['cpu.percent'] is a column. Missing values
+    # are NaN. The header has to state the row count, so the export is
+    # counted before it is streamed.
+    content_type = 'application/octet-stream'
+    extension = 'npy'
+    needs_count = True
+
+    def __init__(self, metrics, count=None):
+        self.dtype = np.dtype([(name, '<f8') for name in ('timestamp', *metrics)])
+        self.count = count
+
+    def header(self):
+        buf = io.BytesIO()
+        fields = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.count,)}
+        try:
+            np.lib.format.write_array_header_1_0(buf, fields)
+        except ValueError:
+            # Version 1.0 headers are limited to 64 KiB of field names
+            np.lib.format.write_array_header_2_0(buf, fields)
+        return buf.getvalue()
+
+    def content_length(self):
+        return len(self.header()) + self.count * self.dtype.itemsize
+
+    def encode(self, rows):
+        # Every field is a float64, so a plain 2-D array has the same layout
+        # as the structured rows; None becomes NaN
+        return np.array([(ts, *values) for ts, values in rows], dtype='<f8').tobytes()
+
+
+FORMATS = {
+    'ndjson': NDJSONEncoder,
+    'csv': CSVEncoder,
+    'npy': NPYEncoder
+}
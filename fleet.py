@@ -0,0 +1,209 @@
+import asyncio
+import hmac
+import json
+import logging
+import time
+from collections import deque
+
+import aiohttp
+from aiohttp import web
+
+from delta import diff_snapshot, apply_patch
+
+INGEST_PATH = '/fleet/ingest'
+
+
+def host_room(host_id):
+    return f"host:{host_id}"
+
+
+def group_room(group):
+    return f"group:{group}"
+
+
+class FleetAgent:
+    """Streams sampler snapshots to a hub over one persistent WebSocket.
+
+    Samples are buffered (bounded, oldest dropped first while the hub is
+    unreachable) and sent in batches. Within a connection the first sample
+    is a keyframe and the rest are patches against the previous one, so a
+    batch mostly carries the handful of fields that changed. Samples stay
+    buffered until the batch carrying them has been sent, so after a failed
+    send they go out again, from a keyframe, on the next connection.
+    """
+
+    def __init__(self, hub_url, host_id, group='default', token='', info=None,
+                 batch_interval=5.0, max_buffer=600):
+        self.url = hub_url.rstrip('/') + INGEST_PATH
+        self.host_id = host_id
+        self.group = group
+        self.token = token
+        self.info = info or {}
+        self.batch_interval = batch_interval
+        self.buffer = deque(maxlen=int(max_buffer))
+        self.sent = 0
+        self._wakeup = asyncio.Event()
+
+    def on_sample(self, ts, data):
+        # Sampler listener; runs on the event loop
+        self.buffer.append(data)
+
+    def encode_batch(self, previous):
+        # Leaves the buffer as it is; see sent_through
+        samples = []
+        for data in self.buffer:
+            if previous is None:
+                samples.append({'seq': data['seq'], 'data': data})
+            else:
+                samples.append({'seq': data['seq'], 'base': previous['seq'], 'ops': diff_snapshot(previous, data)})
+            previous = data
+        return samples, previous
+
+    def sent_through(self, seq):
+        # Drops the samples a sent batch carried. Others may have arrived
+        # during the send and pushed the oldest out, so this goes by seq
+        # rather than by count
+        while self.buffer and self.buffer[0]['seq'] <= seq:
+            self.buffer.popleft()
+
+    async def run(self):
+        headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+        backoff = 1.0
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, headers=headers, heartbeat=30, compress=15) as ws:
+                        await ws.send_json({'type': 'hello', 'host': self.host_id, 'group': self.group,
+                                            'info': self.info})
+                        logging.info(f"Connected to hub at {self.url} as {self.host_id}")
+                        backoff = 1.0
+                        previous = None
+                        while not ws.closed:
+                            await asyncio.sleep(self.batch_interval)
+                            samples, last = self.encode_batch(previous)
+                            if samples:
+                                await ws.send_str(json.dumps({'type': 'batch', 'samples': samples},
+                                                             separators=(',', ':')))
+                                self.sent_through(last['seq'])
+                                self.sent += len(samples)
+                                previous = last
+                        logging.warning(f"Hub closed the connection (code={ws.close_code})")
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, ConnectionError, OSError, asyncio.TimeoutError) as e:
+                logging.warning(f"Hub connection failed: {e}. Retrying in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+
+class FleetHub:
+    """Keeps the latest state of every agent and fans it out to Socket.IO rooms.
+
+    Each host's latest snapshot goes to the 'host:<id>' and 'group:<name>'
+    rooms as a 'host_update' event, once per received batch.
+    """
+
+    def __init__(self, sio, token=''):
+        self.sio = sio
+        self.token = token
+        self.hosts = {}
+
+    def summary(self):
+        now = time.time()
+        return {host_id: {
+            'group': h['group'],
+            'connected': h['connected'],
+            'last_seen': h['last_seen'],
+            'age': now - h['last_seen'] if h['last_seen'] else None,
+            'info': h['info'],
+            'samples': h['samples']
+        } for host_id, h in self.hosts.items()}
+
+    def update_payload(self, host_id):
+        h = self.hosts[host_id]
+        return {'host': host_id, 'group': h['group'], 'connected': h['connected'], 'data': h['latest']}
+
+    async def ingest(self, request):
+        expected = f"Bearer {self.token}"
+        if self.token and not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        ws = web.WebSocketResponse(heartbeat=30, compress=True)
+        await ws.prepare(request)
+        host_id = None
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                message = json.loads(msg.data)
+                if not isinstance(message, dict):
+                    raise ValueError("expected a JSON object")
+                if message.get('type') == 'hello':
+                    host_id = str(message['host'])
+                    host = self.hosts.setdefault(host_id, {'latest': None, 'last_seen': None, 'samples': 0})
+                    host.update(group=str(message.get('group', 'default')), info=message.get('info', {}),
+                                connected=True, previous=None)
+                    logging.info(f"Agent connected: {host_id} (group={host['group']})")
+                elif message.get('type') == 'batch' and host_id is not None:
+                    await self.apply_batch(host_id, message.get('samples', []))
+        except (ValueError, KeyError) as e:
+            logging.error(f"Bad message from agent {host_id}: {e}")
+            await ws.close(code=aiohttp.WSCloseCode.UNSUPPORTED_DATA)
+        finally:
+            if host_id is not None:
+                self.hosts[host_id]['connected'] = False
+                logging.info(f"Agent disconnected: {host_id}")
+                await self.broadcast(host_id)
+        return ws
+
+    async def apply_batch(self, host_id, samples):
+        host = self.hosts[host_id]
+        previous = host['previous']
+        if not isinstance(samples, list):
+            raise ValueError("samples must be a list")
+        for sample in samples:
+            if not isinstance(sample, dict):
+                raise ValueError("each sample must be an object")
+            if 'data' in sample:
+                if not isinstance(sample['data'], dict):
+                    raise ValueError("keyframe data must be an object")
+                previous = sample['data']
+            elif previous is not None and previous.get('seq') == sample.get('base'):
+                try:
+                    previous = apply_patch(previous, sample['ops'])
+                except (TypeError, IndexError, AttributeError) as e:
+                    raise ValueError(f"malformed patch: {e}") from e
+            else:
+                # A patch without its base can't be applied; skip until the next keyframe
+                continue
+        host['previous'] = previous
+        if previous is not None:
+            host['latest'] = previous
+            host['last_seen'] = time.time()
+            host['samples'] += len(samples)
+            await self.broadcast(host_id)
+
+    async def broadcast(self, host_id):
+        payload = self.update_payload(host_id)
+        await self.sio.emit('host_update', payload, room=host_room(host_id))
+        await self.sio.emit('host_update', payload, room=group_room(payload['group']))
+
+    async def watch(self, sid, host=None, group=None):
+        # Subscribes a Socket.IO client to one host or one group and sends
+        # the current state straight away
+        if host is not None:
+            await self.sio.enter_room(sid, host_room(host))
+            targets = [host] if host in self.hosts else []
+        elif group is not None:
+            await self.sio.enter_room(sid, group_room(group))
+            targets = [h for h, state in self.hosts.items() if state['group'] == group]
+        else:
+            return
+        for host_id in targets:
+            if self.hosts[host_id]['latest'] is not None:
+                await self.sio.emit('host_update', self.update_payload(host_id), room=sid)
+
+    async def unwatch(self, sid, host=None, group=None):
+        if host is not None:
+            await self.sio.leave_room(sid, host_room(host))
+        if group is not None:
+            await self.sio.leave_room(sid, group_room(group))
@@ -8,7 +8,7 @@ from datetime import datetime
 def get_system_info():
     """Query the system info endpoint and return formatted data"""
     try:
-        response = requests.get('http://localhost:3000/api/system_info')
+        response = requests.get('http://localhost:3000/api/snapshot')
         return response.json()
     except requests.RequestException as e:
         return {
@@ -121,12 +121,12 @@ def get_code_examples():
             'python': '''import requests
 
 # Get current system metrics (disable SSL verification for self-signed certs)
-response = requests.get('https://localhost:3000/api/system_info', verify=False)
+response = requests.get('https://localhost:3000/api/snapshot', verify=False)
 data = response.json()
 print(f"CPU Usage: {data['cpu']['percent']}%")
 print(f"Memory Used: {data['memory']['used']} of {data['memory']['total']}")''',
             'javascript': '''// Using Fetch API
-fetch('https://localhost:3000/api/system_info')
+fetch('https://localhost:3000/api/snapshot')
   .then(response => response.json())
   .then(data => {
     console.log(`CPU Usage: ${data.cpu.percent}%`);
@@ -141,7 +141,7 @@ socket.on('system_update', (data) => {
     console.log('System metrics updated:', data);
 });''',
             'curl': '''# Get current system metrics (ignore SSL verification for self-signed certs)
-curl -k https://localhost:3000/api/system_info'''
+curl -k https://localhost:3000/api/snapshot'''
         },
         'use_cases': {
             'cpu': '''if data['cpu']['percent'] > 80:
@@ -198,8 +198,14 @@ This document provides details about the System Monitor API endpoints and their
 
 ## API Endpoints
 
-### GET /api/system_info
-Returns real-time system metrics including CPU, memory, disk, network, temperature, and system time information.
+### GET /api/snapshot
+Returns the latest real-time system metrics including CPU, memory, disk, network, temperature, and system time information. The sample comes from the server's shared sampler, so polling this endpoint never triggers extra collection.
+
+Responses carry an `ETag` that changes with every new sample. Send it back in `If-None-Match` to get an empty `304 Not Modified` until a newer sample exists. Clients sending `Accept-Encoding: gzip` get a body that was compressed once per sample.
+
+```bash
+curl -k --compressed -H 'If-None-Match: "66f0a1b2-1024-v1"' https://localhost:3000/api/snapshot
+```
 
 #### Response Format
 The response is a JSON object containing the following main sections:
@@ -297,6 +303,290 @@ Array of temperature sensors with:
 - `boot_time`: System boot timestamp
 - `uptime`: System uptime duration
 
+### GET /api/system_info
+Returns static platform information, gathered once at startup.
+
+```json
+{{
+    "os": "Linux 6.8.0",
+    "hostname": "web-01",
+    "cpu_model": "x86_64",
+    "cores": 8,
+    "physical_cores": 4,
+    "python_version": "3.11.7"
+}}
+```
+
+### GET /api/v2/metrics
+Returns the latest sample in schema v2, with the same `ETag`, `If-None-Match` and gzip handling as `/api/snapshot`. Values are typed numbers rather than preformatted strings, so they can be stored, compared and exported directly; formatting is left to the client.
+
+- `version`: Schema version (`2`)
+- `timestamp`: Unix time the sample was taken
+- `seq`: Sample sequence number
+- `cpu`: `percent`, `load_1`, `load_5`, `load_15` as floats, plus:
+  - `times_percent`: Share of CPU time spent in `user`, `system`, `iowait`, `irq`, `softirq` and `steal` (fields the platform doesn't report are omitted)
+  - `cores`: Summary across logical cores: `count`, `max`, `max_core` (index of the busiest core), `stddev`, and `busy`, the number of cores at or above `busy_threshold` percent
+  - `per_core`: Busy percent for each logical core (omitted when `monitoring.metrics.cpu.per_core` is false)
+- `memory`: `total`, `used`, `available`, `swap_total`, `swap_used` in bytes; `percent`, `swap_percent`
+- `disk`: Array of `device`, `mountpoint`, `fstype`, with `total`, `used`, `free` in bytes and `percent`
+- `network`: `bytes_sent`, `bytes_recv` totals in bytes; `send_rate`, `recv_rate` in bytes per second; `interfaces` maps each NIC to the same fields plus `packets_sent_rate`, `packets_recv_rate` and the `errin`, `errout`, `dropin`, `dropout` totals
+- `disk_io`: Maps each block device to `read_bytes`, `write_bytes` totals, `read_rate`, `write_rate` in bytes per second, `read_iops`, `write_iops`, and `busy_percent` where the platform reports busy time
+
+All rates are computed from the real elapsed time between two readings of the same counters, so they are correct whatever the sampling interval or the number of clients.
+- `temperature`: Array of `name`, `current`, `high`, `critical` in °C
+- `system_time`: `boot_time` as a Unix timestamp and `uptime` in seconds
+- `processes`: `count` of running processes and the top entries by CPU (`top_cpu`), resident memory (`top_memory`) and disk I/O rate (`top_io`). Each entry has `pid`, `name`, `username`, `cpu_percent`, `rss` in bytes and `io_rate` in bytes per second
+- `cgroups` (Linux, only when enabled): `pressure` maps `cpu`, `memory` and `io` to the `some` and `full` lines of `/proc/pressure`. Each line has `avg10`, `avg60` and `avg300` in percent, the cumulative `total` stall time in microseconds, and `percent`, the share of time stalled since the previous sample. `groups` maps each cgroup path to:
+  - `cpu`: `usage_percent` (percent of one CPU), plus `throttled_percent` (share of CFS periods throttled), `throttled_time_rate` (seconds throttled per second) and the `nr_throttled` total when the cpu controller is enabled
+  - `memory`: `current` and `max` in bytes (`max` is null when unlimited), and `percent` of the limit
+  - `io`: `read_rate`, `write_rate` in bytes per second, `read_iops`, `write_iops`
+  - `pressure`: the group's own `some avg10` for `cpu`, `memory` and `io`
+
+  Sections are omitted for controllers that aren't enabled on the group.
+- `stale`: Collectors whose values are left over from an earlier sample because the latest read timed out
+
+On error, a section keeps its numeric fields (as zeros) and adds an `error` message.
+
+```json
+{{
+    "version": 2,
+    "timestamp": 1745236800.25,
+    "seq": 1024,
+    "cpu": {{"percent": 35.2, "load_1": 1.25, "load_5": 1.15, "load_15": 0.95}},
+    "memory": {{"total": 17179869184, "used": 9126805504, "available": 8053063680, "percent": 53.1,
+               "swap_total": 4294967296, "swap_used": 536870912, "swap_percent": 12.5}},
+    "network": {{"bytes_sent": 1342177280, "bytes_recv": 2684354560, "send_rate": 2031616.0, "recv_rate": 2922905.6}},
+    "system_time": {{"boot_time": 1744624800.0, "uptime": 612000.25}},
+    "stale": []
+}}
+```
+
+Socket.IO clients get the same payload by connecting with `auth: {{ schema: 2 }}`, which switches the events to `metrics_update`, `metrics_keyframe` and `metrics_patch`.
+
+### GET /metrics
+Prometheus exposition of the latest sample (text format 0.0.4). Every family is prefixed with `sysmon_` and typed as a gauge or, for monotonically increasing byte and error totals, a counter. Labels identify the instance: `mountpoint`, `device` and `fstype` for filesystems, `device` for disk I/O, `interface` for network, `sensor` for temperatures, `core` and `mode` for CPU.
+
+The text is rendered once per sample and cached, so concurrent scrapers only cost a memory copy. A scrape also keeps the sampler running while no dashboard is connected.
+
+```yaml
+scrape_configs:
+  - job_name: sysmon
+    static_configs:
+      - targets: ['localhost:3000']
+```
+
+### GET /api/history
+Returns recorded history for one or more metrics. Without a `metric` parameter it lists the metric names that can be queried.
+
+Query parameters:
+- `metric`: Flattened metric name such as `cpu.percent` or `disk./.percent` (repeatable)
+- `start` / `end`: Unix timestamps bounding the range (`end` defaults to now)
+- `range`: Seconds before `end` to start from when `start` is omitted (default 3600)
+- `points`: Maximum number of points per series (default 500)
+
+The server answers from the finest resolution that fits within `points`: raw samples, or 10s, 1m and 1h rollups. Each point is `[timestamp, min, avg, max]`; raw samples repeat the value three times.
+
+```json
+{{
+    "start": 1745236800.0,
+    "end": 1745240400.0,
+    "resolution": 10,
+    "series": {{
+        "cpu.percent": [[1745236800, 12.1, 18.4, 35.0], [1745236810, 10.3, 15.2, 22.8]]
+    }}
+}}
+```
+
+### GET /api/history/export
+Streams stored history for a time range as a file download, one row per sample timestamp and one column per metric. Rows are read from the database in batches of 1000 and written as they are read, so server memory does not grow with the size of the range. Raw exports end with the samples not yet flushed to disk.
+
+Query parameters:
+- `metric`: Flattened metric name, or a shell-style pattern such as `disk.*` matched against the latest sample (repeatable; default: every metric)
+- `start` / `end` / `range`: As for `/api/history`
+- `format`: `ndjson` (default), `csv` or `npy`
+- `resolution`: `0` for raw samples (default), or `10`, `60` or `3600` for the mean of each rollup bucket
+
+Missing values are `null` in NDJSON, empty in CSV and NaN in `.npy`. The `.npy` file holds a NumPy structured array with a float64 field per column. Its header must state the row count, so the server counts the rows first and the response has a `Content-Length`.
+
+```bash
+curl -o day.csv "http://localhost:3000/api/history/export?metric=cpu.percent&metric=memory.percent&range=86400&format=csv"
+curl -o day.npy "http://localhost:3000/api/history/export?metric=cpu.*&range=86400&format=npy"
+python -c "import numpy as np; a = np.load('day.npy'); print(a['cpu.percent'].mean())"
+```
+
+```json
+{{"timestamp":1745236800.0,"cpu.percent":12.1,"memory.percent":53.1}}
+{{"timestamp":1745236801.0,"cpu.percent":14.8,"memory.percent":53.2}}
+```
+
+### GET /api/quantiles
+Percentiles, mean, min and max of flattened metrics over a recent range, answered from streaming quantile sketches rather than raw samples. Without a `metric` parameter it lists the metrics that have sketches.
+
+Query parameters:
+- `metric`: Flattened metric name or shell-style pattern, as for `/api/history/export` (repeatable)
+- `range`: How far back to look, in seconds or as a duration such as `15m`, `24h` or `7d` (default 3600)
+- `q`: Comma-separated quantiles between 0 and 1 (default `0.5,0.9,0.95,0.99`)
+- `sketch`: `1` to include each merged sketch, for merging with sketches from other hosts
+
+Each metric's samples go into a DDSketch per window: by default one per minute for the last hour and one per hour for the last week. Every quantile is within `relative_accuracy` (1%) of the true value. A query uses the finest windows that reach back far enough, so `since` is the start of the oldest window used and can be up to one window earlier than `range` asks for. `ewma` holds exponentially weighted moving averages with the configured half-lives. Repeated queries take tens of microseconds.
+
+```json
+{{
+    "range": 86400.0,
+    "series": {{
+        "cpu.percent": {{
+            "resolution": 3600.0,
+            "since": 1745150400.0,
+            "count": 86412,
+            "min": 0.5, "max": 100.0, "mean": 18.2,
+            "quantiles": {{"0.5": 12.9, "0.9": 41.2, "0.95": 62.8, "0.99": 97.1}},
+            "ewma": {{"1m": 15.1, "5m": 16.8, "15m": 17.4}}
+        }}
+    }}
+}}
+```
+
+Sketches returned with `sketch=1` merge exactly, in Python:
+
+```python
+from sketches import DDSketch
+merged = DDSketch.from_dict(host_a['series']['cpu.percent']['sketch'])
+merged.merge(DDSketch.from_dict(host_b['series']['cpu.percent']['sketch']))
+print(merged.quantile(0.99))
+```
+
+### POST /api/burst
+Starts a burst: raw CPU, per-core, disk and network counters sampled many times a second for a bounded window, to catch the sub-second spikes the 1-second sampler averages away. Parameters go in a JSON body or the query string:
+- `duration`: Window length, in seconds or as a duration such as `30s` (default 30, at most `burst.max_duration`)
+- `rate`: Samples per second (default 20, at most `burst.max_rate`)
+
+The response is the burst's status, as under `burst` below. Returns 409 while another burst is running and 400 for a window or rate past the limits.
+
+The sampler runs on its own thread and its CPU time is capped at `burst.max_overhead` of one core (2% by default). Reads that would go over are delayed and counted in `throttled`, so `achieved_rate` can fall below `rate`.
+
+### GET /api/burst
+The current or last burst, downsampled into `points` buckets (default 300, at most 10000) over its window. Each series has the min and max over the sample intervals in a bucket, and the mean from the counter delta across the bucket. `samples` is the number of intervals per bucket, and `t` is each bucket's end. CPU series are percentages and the others are per second. Values are `null` where the kernel counted no CPU time in an interval.
+
+```json
+{{
+    "burst": {{
+        "id": 3, "state": "finished", "duration": 30.0, "rate": 20.0, "started": 1745237145.02,
+        "samples": 601, "elapsed": 30.0, "achieved_rate": 20.0,
+        "cpu_time": 0.24, "overhead": 0.008, "throttled": 0, "error": null,
+        "series": ["cpu.percent", "cpu.per_core.0", "cpu.per_core.1", "disk_io.read_rate", "disk_io.write_rate",
+                   "disk_io.read_iops", "disk_io.write_iops", "network.send_rate", "network.recv_rate"]
+    }},
+    "envelope": {{
+        "id": 3,
+        "step": 0.1,
+        "t": [1745237145.12, 1745237145.22],
+        "samples": [2, 2],
+        "series": {{
+            "cpu.percent": {{"min": [5.0, 10.0], "mean": [7.5, 52.5], "max": [10.0, 95.0]}},
+            "network.recv_rate": {{"min": [1200.0, 0.0], "mean": [1530.5, 880.0], "max": [1861.0, 1760.0]}}
+        }}
+    }}
+}}
+```
+
+`state` is `running`, `finished`, `stopped` or `failed`, with the reason in `error`. Per-core series are left out when `monitoring.metrics.cpu.per_core` is off.
+
+### DELETE /api/burst
+Stops the running burst. The response is its status, with `state` set to `stopped`.
+
+### GET /api/internal
+Returns the monitor's own instrumentation, to show whether a slowdown comes from the collectors (psutil), serialization or the network. All durations are in milliseconds.
+
+- `collector.<name>`: run time of each collector, measured in its worker thread
+- `tick`: a whole sampler tick, covering collection and emit
+- `serialize`: JSON encoding of each Socket.IO packet
+- `emit`: fan-out of one tick's frames to every client
+- `loop_lag`: how late the event loop wakes up from a `loop_lag_interval` sleep
+- `clients`: connected clients, recorded once per tick (a count, not a duration)
+
+Each histogram reports `count`, `mean`, `max` and `last` since startup. `recent` gives percentiles over the last 256 observations. `buckets` holds cumulative counts per upper bound. `sampler` lists collectors currently serving stale data and any still running past their deadline. When replaying a recording, `sampler.replay` gives the file, speed, samples replayed so far and the recorded timestamp of the current one.
+
+```json
+{{
+    "uptime": 3600.2,
+    "histograms": {{
+        "collector.processes": {{
+            "count": 1800, "mean": 31.2, "max": 95.1, "last": 30.4,
+            "recent": {{"count": 256, "p50": 30.9, "p90": 38.2, "p99": 61.0}},
+            "buckets": [[0.05, 0], [0.1, 0], ["...", 0], ["+Inf", 1800]]
+        }}
+    }},
+    "sampler": {{"interval": 1.0, "seq": 3600, "clients": 2, "subscriptions": 0, "stale": [], "overrunning": []}}
+}}
+```
+
+Set `instrumentation.panel: true` to show these histograms as a panel on the dashboard.
+
+With `server.workers` above 1, the response describes the worker process that answered, and `sampler` includes its `worker` index. The sampler process's own histograms, including the collector timings, are under `sampler_process` and are refreshed every 5 seconds.
+
+### GET /api/alerts
+Returns the configured alert rules, the alerts currently firing and the most recent transitions. Rules are defined under `alerts.rules` in config.yaml and evaluated on the server against every sample:
+
+```yaml
+alerts:
+  rules:
+    - "avg cpu.percent over 5m > 80"
+    - name: hot_sensor
+      expr: "temperature.*.current > high for 30s"
+      severity: critical
+    - "disk.*.percent > 85"
+```
+
+An expression has the form `[avg|min|max|sum] <metric> [over <duration>] <op> <threshold> [for <duration>]`:
+
+- The metric uses the flattened names from `/api/history`. `*` matches any mountpoint, sensor or interface.
+- The threshold is a number or a field name. A field such as `high` is read from next to each matched metric.
+- `over` aggregates a sliding window. `for` requires the condition to hold that long before the alert fires.
+- A series that is missing from the samples for `alerts.missing_after` (default 30s) resolves and is forgotten. Examples are an unmounted disk, a removed sensor, or a collector serving stale values.
+
+Only changes of state are reported. An alert fires once and resolves once, as an `alert` Socket.IO event:
+
+```json
+{{
+    "rule": "hot_sensor",
+    "series": "temperature.coretemp: Package id 0.current",
+    "state": "firing",
+    "severity": "critical",
+    "expr": "temperature.*.current > high for 30s",
+    "value": 86.0,
+    "threshold": 80.0,
+    "since": 1745240400.0,
+    "timestamp": 1745240400.0
+}}
+```
+
+When history is enabled, the events are also stored. Pass `start`/`end` or `range` (seconds, default 86400) to get them back under `events`.
+
+### GET /api/clients
+Returns delivery statistics for every connected Socket.IO client.
+
+Slow consumers are handled with backpressure. While more than `monitoring.max_pending_frames` frames are still queued for a client, it is skipped and those frames count as `dropped`. Once it catches up, the next frame it gets is the latest one; delta clients get a fresh keyframe. A client that stays behind for longer than `monitoring.stall_timeout` seconds is disconnected.
+
+```json
+{{
+    "max_pending_frames": 2,
+    "stall_timeout": 30.0,
+    "clients": {{
+        "CM3yvz0wOz6HBEeiAAAB": {{
+            "schema": 2,
+            "protocol": "delta",
+            "sent": 120,
+            "dropped": 6,
+            "queued": 2,
+            "lagging_for": 4.0,
+            "subscription": {{"metrics": ["cpu"], "interval": 5.0}}
+        }}
+    }}
+}}
+```
+
+`subscription` is only present for clients that used the `subscribe` event.
+
 ## WebSocket Events
 
 The API also supports real-time updates via WebSocket (Socket.IO):
@@ -310,6 +600,73 @@ socket.on('system_update', (data) => {{
 }});
 ```
 
+### Delta protocol
+Clients can opt in to receiving only the fields that changed by connecting with `auth: {{ protocol: 'delta' }}`.
+
+- `system_keyframe`: `{{ "seq": 42, "data": {{ ...full system_update payload... }} }}`, sent on connect and every `monitoring.keyframe_interval` ticks
+- `system_patch`: `{{ "seq": 43, "base": 42, "ops": [[["cpu", "percent"], 12.5], [["network", "error"]]] }}`. Each op is `[path, value]` to set a field or `[path]` to delete it; lists are replaced whole
+- `request_keyframe`: emit this if a patch's `base` does not match the last applied `seq`, and the server will resend a keyframe
+
+```javascript
+const socket = io({{ auth: {{ protocol: 'delta' }} }});
+socket.on('system_keyframe', (msg) => {{ state = msg.data; seq = msg.seq; }});
+socket.on('system_patch', (msg) => {{
+    if (msg.base !== seq) {{ socket.emit('request_keyframe'); return; }}
+    applyPatch(state, msg.ops);
+    seq = msg.seq;
+}});
+```
+
+### Subscriptions
+By default every client receives every metric at the global interval. A client can narrow that with the `subscribe` event, and each client then gets only its own metric groups at its own cadence. Collectors that no client needs do not run at all. Exceptions: the dashboard's unsubscribed clients, HTTP polling, sample recording and fleet agents keep every collector running, and alert rules keep the groups their metrics belong to running. History and quantile sketches record whatever is collected for the others, and history also samples every group each `history.background_interval` seconds.
+
+- `subscribe`: `{{ "metrics": ["cpu", "memory"], "interval": 5 }}`. Valid groups are `cpu`, `memory`, `disk`, `network`, `temperature`, `system_time`, `processes`, `disk_io` and `cgroups`, limited to the ones enabled in the config. `interval` is the minimum number of seconds between updates; it is rounded up to the sampler tick. The acknowledgement is `{{ "ok": true, "metrics": [...], "interval": 5.0 }}`, or `{{ "error": "..." }}`
+- `unsubscribe`: go back to every metric at the global interval
+
+Subscribed clients keep their schema and protocol. A delta client receives a keyframe of its subset right after subscribing, then patches between its own updates.
+
+```javascript
+const socket = io({{ auth: {{ schema: 2 }} }});
+socket.on('connect', () => {{
+    socket.emit('subscribe', {{ metrics: ['cpu'], interval: 5 }}, (ack) => console.log(ack));
+}});
+socket.on('metrics_update', (data) => console.log(data.cpu.percent));
+```
+
+### Quantiles
+- `quantiles`: `{{ "metrics": ["cpu.percent", "disk.*.percent"], "q": [0.5, 0.99], "range": "24h" }}`. The acknowledgement is the same object `/api/quantiles` returns, or `{{ "error": "..." }}`
+
+```javascript
+socket.emit('quantiles', {{ metrics: ['cpu.percent'], q: [0.95], range: '24h' }},
+    (ack) => console.log(ack.series['cpu.percent'].quantiles['0.95']));
+```
+
+### Burst sampling
+- `burst`: `{{ "duration": 30, "rate": 20 }}` (both optional) starts a burst, or joins the one already running. The acknowledgement is its status, as in `/api/burst`, with `"joined": true` when joining, or `{{ "error": "..." }}`
+- `burst_data`: sent every second while a burst runs to clients that started or joined one. It holds the envelope of the buckets completed since the last one, `burst.resolution` seconds each (0.25 by default), in the same form as `envelope` in `/api/burst`
+- `burst_complete`: the final status, after the last `burst_data`
+
+```javascript
+socket.emit('burst', {{ duration: 30, rate: 20 }}, (ack) => console.log(ack.state));
+socket.on('burst_data', (env) => {{
+    env.t.forEach((t, i) => console.log(t, env.series['cpu.percent'].max[i]));
+}});
+```
+
+### Fleet events (hub mode)
+- `watch`: emit `{{ "host": "web-01" }}` or `{{ "group": "web" }}` to subscribe; the current state of matching hosts is sent immediately
+- `unwatch`: same payload, to unsubscribe
+- `host_update`: `{{ "host": "web-01", "group": "web", "connected": true, "data": {{ ...schema v2 sample... }} }}`, sent whenever a batch arrives from the agent and when it disconnects
+
+`GET /api/fleet` lists every known host with its `group`, `connected` flag, `last_seen` time, static `info` and the number of samples received.
+
+```javascript
+socket.emit('watch', {{ group: 'web' }});
+socket.on('host_update', (msg) => {{
+    console.log(`${{msg.host}}: CPU ${{msg.data.cpu.percent}}%`);
+}});
+```
+
 ## Error Handling
 
 If the server is unavailable or encounters an error, the API will return an appropriate HTTP status code and error message.
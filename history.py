@@ -0,0 +1,290 @@
+import heapq
+import math
+import sqlite3
+import time
+from collections import deque
+from itertools import groupby, islice
+from pathlib import Path
+
+# Rollup resolutions in seconds, finest first. Resolution 0 is the raw samples table.
+ROLLUPS = {10: 'rollup_10s', 60: 'rollup_1m', 3600: 'rollup_1h'}
+
+DEFAULT_RETENTION = {
+    'raw': 6 * 3600,
+    '10s': 2 * 86400,
+    '1m': 30 * 86400,
+    '1h': 365 * 86400
+}
+
+_RETENTION_KEYS = {0: 'raw', 10: '10s', 60: '1m', 3600: '1h'}
+
+# List entries are keyed by the first of these fields they carry
+_LIST_KEYS = ('mountpoint', 'name', 'device', 'pid')
+
+# Snapshot bookkeeping fields that aren't metrics
+_SKIP_KEYS = ('version', 'timestamp', 'seq')
+
+# Numeric fields that are settings, limits or identifiers rather than
+# measurements. History leaves them out; alert rules still compare against
+# limits such as 'high'.
+_NON_METRIC_FIELDS = ('busy_threshold', 'max_core', 'boot_time', 'high', 'critical')
+
+# Per-process tables churn with every PID, so only their totals are recorded
+_TABLE_KEYS = ('top_cpu', 'top_memory', 'top_io')
+
+
+def flatten_snapshot(data, prefix='', skip=()):
+    """Flatten a v2 sampler snapshot into {'cpu.percent': 12.5, 'disk./.used': 1.2e10, ...}
+
+    Lists of plain values such as cpu.per_core are left out, so the number
+    of series stays the same however many cores the host has; cpu.cores
+    summarises them instead. Numeric fields named in `skip` are left out
+    at any depth.
+    """
+    flat = {}
+    if isinstance(data, dict):
+        items = [(k, v) for k, v in data.items()
+                 if k not in _TABLE_KEYS and (prefix or k not in _SKIP_KEYS)]
+    elif isinstance(data, list):
+        items = []
+        for entry in data:
+            if isinstance(entry, dict):
+                key = next((entry[k] for k in _LIST_KEYS if k in entry), None)
+                if key is not None:
+                    items.append((key, entry))
+    else:
+        return flat
+    for key, value in items:
+        name = f"{prefix}{key}"
+        if isinstance(value, bool) or value is None or isinstance(value, str):
+            continue
+        if isinstance(value, (int, float)):
+            if math.isfinite(value) and key not in skip:
+                flat[name] = float(value)
+        else:
+            flat.update(flatten_snapshot(value, f"{name}.", skip))
+    return flat
+
+
+class HistoryStore:
+    """Recent raw samples in memory, backed by an append-only SQLite store with rollups.
+
+    append() is cheap and runs on the event loop; flush(), prune() and the
+    query_db() block and are meant to run in a single worker
+    thread, which also serializes access to the connection.
+
+    A readonly store keeps its own ring but never writes: it is used by
+    serving processes while another process owns the database.
+    """
+
+    def __init__(self, path, memory_samples=3600, retention=None, sample_interval=1.0, readonly=False):
+        self.path = path
+        self.ring = deque(maxlen=int(memory_samples))
+        self.retention = dict(DEFAULT_RETENTION)
+        self.retention.update(retention or {})
+        self.sample_interval = sample_interval
+        self.readonly = readonly
+        self._pending = []
+        if readonly:
+            self._db = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS samples ('
+                         'ts REAL NOT NULL, metric TEXT NOT NULL, value REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS samples_metric_ts ON samples (metric, ts)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS alert_events ('
+                         'ts REAL NOT NULL, rule TEXT NOT NULL, series TEXT NOT NULL, state TEXT NOT NULL, '
+                         'severity TEXT, value REAL, threshold REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS alert_events_ts ON alert_events (ts)')
+        for table in ROLLUPS.values():
+            self._db.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                             'metric TEXT NOT NULL, bucket INTEGER NOT NULL, '
+                             'min REAL NOT NULL, max REAL NOT NULL, sum REAL NOT NULL, count INTEGER NOT NULL, '
+                             'PRIMARY KEY (metric, bucket)) WITHOUT ROWID')
+        self._db.commit()
+
+    def append(self, ts, data):
+        flat = flatten_snapshot(data, skip=_NON_METRIC_FIELDS)
+        self.ring.append((ts, flat))
+        if not self.readonly:
+            self._pending.append((ts, flat))
+        return flat
+
+    def take_pending(self):
+        # Called on the event loop; the returned batch is handed to flush()
+        batch, self._pending = self._pending, []
+        return batch
+
+    def flush(self, batch):
+        if not batch:
+            return 0
+        rows = [(ts, metric, value) for ts, flat in batch for metric, value in flat.items()]
+        buckets = {}
+        for step in ROLLUPS:
+            agg = buckets.setdefault(step, {})
+            for ts, metric, value in rows:
+                key = (metric, int(ts // step) * step)
+                cur = agg.get(key)
+                if cur is None:
+                    agg[key] = [value, value, value, 1]
+                else:
+                    if value < cur[0]:
+                        cur[0] = value
+                    if value > cur[1]:
+                        cur[1] = value
+                    cur[2] += value
+                    cur[3] += 1
+        with self._db:
+            self._db.executemany('INSERT INTO samples (ts, metric, value) VALUES (?, ?, ?)', rows)
+            for step, table in ROLLUPS.items():
+                self._db.executemany(
+                    f'INSERT INTO {table} (metric, bucket, min, max, sum, count) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (metric, bucket) DO UPDATE SET '
+                    'min = MIN(min, excluded.min), max = MAX(max, excluded.max), '
+                    'sum = sum + excluded.sum, count = count + excluded.count',
+                    [(m, b, v[0], v[1], v[2], v[3]) for (m, b), v in buckets[step].items()]
+                )
+        return len(rows)
+
+    def record_events(self, events):
+        # Alert transitions are rare and worth keeping, so they are written
+        # straight away rather than batched with samples
+        with self._db:
+            self._db.executemany(
+                'INSERT INTO alert_events (ts, rule, series, state, severity, value, threshold) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(e['timestamp'], e['rule'], e['series'], e['state'], e['severity'], e['value'], e['threshold'])
+                 for e in events]
+            )
+
+    def query_events(self, start, end):
+        cur = self._db.execute('SELECT ts, rule, series, state, severity, value, threshold FROM alert_events '
+                               'WHERE ts BETWEEN ? AND ? ORDER BY ts', (start, end))
+        return [dict(zip(('timestamp', 'rule', 'series', 'state', 'severity', 'value', 'threshold'), row))
+                for row in cur]
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        with self._db:
+            self._db.execute('DELETE FROM samples WHERE ts < ?', (now - self.retention['raw'],))
+            # Alert events live as long as the coarsest rollup
+            self._db.execute('DELETE FROM alert_events WHERE ts < ?', (now - self.retention['1h'],))
+            for step, table in ROLLUPS.items():
+                cutoff = now - self.retention[_RETENTION_KEYS[step]]
+                self._db.execute(f'DELETE FROM {table} WHERE bucket < ?', (cutoff,))
+
+    def metrics(self):
+        return sorted(self.ring[-1][1]) if self.ring else []
+
+    def choose_resolution(self, start, end, max_points, now=None):
+        # Finest resolution that both still holds data for `start` and keeps
+        # the result under max_points; falls back to the coarsest rollup
+        now = time.time() if now is None else now
+        span = max(end - start, 0)
+        for step in (0, *ROLLUPS):
+            if start < now - self.retention[_RETENTION_KEYS[step]]:
+                continue
+            if span / (step or self.sample_interval) <= max_points:
+                return step
+        return max(ROLLUPS)
+
+    def oldest_in_memory(self):
+        return self.ring[0][0] if self.ring else None
+
+    def query_memory(self, metric, start, end):
+        # Raw points straight from the ring buffer, including ones not yet flushed
+        return [[ts, v, v, v] for ts, flat in self.ring
+                if start <= ts <= end and (v := flat.get(metric)) is not None]
+
+    def query_db(self, metric, start, end, step):
+        if step == 0:
+            cur = self._db.execute('SELECT ts, value, value, value FROM samples '
+                                   'WHERE metric = ? AND ts BETWEEN ? AND ? ORDER BY ts',
+                                   (metric, start, end))
+        else:
+            cur = self._db.execute(f'SELECT bucket, min, sum / count, max FROM {ROLLUPS[step]} '
+                                   'WHERE metric = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+                                   (metric, int(start // step) * step, end))
+        return [list(row) for row in cur]
+
+    def close(self):
+        self._db.close()
+
+
+class HistoryExport:
+    """Rows for a set of metrics over a time range, fetched in bounded batches.
+
+    The export reads through its own read-only connection inside one read
+    transaction, so a slow client sees a consistent snapshot and never
+    holds up flushes. Each metric gets a cursor that walks the (metric, ts)
+    index in time order. The cursors are merged into wide rows of
+    (ts, [value or None per metric]), so SQLite never sorts and memory
+    stays proportional to the batch size, not the range.
+
+    Raw exports finish with the samples still waiting in the store's
+    memory ring for their flush. Like the store, every method except the
+    constructor blocks and belongs on the history thread.
+    """
+
+    def __init__(self, store, metrics, start, end, step=0):
+        self.store = store
+        self.metrics = list(metrics)
+        self.start = start
+        self.end = end
+        self.step = step
+        self._db = None
+        self._rows = None
+        # Copied here, on the event loop that appends to the ring
+        self._tail = [(ts, flat) for ts, flat in store.ring if start <= ts <= end] if step == 0 else []
+
+    def open(self):
+        self._db = sqlite3.connect(f"{Path(self.store.path).absolute().as_uri()}?mode=ro", uri=True,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute('BEGIN')
+        # Ring samples newer than anything in this snapshot haven't been flushed
+        cutoff = None
+        if self._tail:
+            for metric in self.metrics:
+                (last,) = self._db.execute('SELECT MAX(ts) FROM samples WHERE metric = ?', (metric,)).fetchone()
+                if last is not None and (cutoff is None or last > cutoff):
+                    cutoff = last
+        self._tail = [(ts, flat) for ts, flat in self._tail if cutoff is None or ts > cutoff]
+        self._rows = self._merge()
+
+    def _cursor(self, index, metric):
+        if self.step == 0:
+            cur = self._db.execute('SELECT ts, value FROM samples WHERE metric = ? AND ts BETWEEN ? AND ? '
+                                   'ORDER BY ts', (metric, self.start, self.end))
+        else:
+            cur = self._db.execute(f'SELECT bucket, sum / count FROM {ROLLUPS[self.step]} '
+                                   'WHERE metric = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+                                   (metric, int(self.start // self.step) * self.step, self.end))
+        return ((ts, index, value) for ts, value in cur)
+
+    def _merge(self):
+        width = len(self.metrics)
+        merged = heapq.merge(*(self._cursor(i, metric) for i, metric in enumerate(self.metrics)))
+        for ts, group in groupby(merged, key=lambda row: row[0]):
+            values = [None] * width
+            for _, index, value in group:
+                values[index] = value
+            yield ts, values
+        for ts, flat in self._tail:
+            values = [flat.get(metric) for metric in self.metrics]
+            if any(value is not None for value in values):
+                yield ts, values
+
+    def count(self):
+        # Rows the export will produce; costs a second pass over the range
+        return sum(1 for _ in self._merge())
+
+    def fetch(self, batch=1000):
+        # Up to `batch` rows; an empty list once the range is exhausted
+        return list(islice(self._rows, batch))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,118 @@
+import asyncio
+import bisect
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Bucket upper bounds. Durations are in milliseconds.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Histogram:
+    """Fixed-bucket histogram since startup, plus the most recent raw values.
+
+    observe() is O(log buckets); the recent window gives exact percentiles
+    for "what is it doing now" without keeping every observation.
+    """
+
+    def __init__(self, bounds=DURATION_BUCKETS, recent=256):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.recent.append(value)
+
+    def to_dict(self):
+        result = {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 3) if self.count else None,
+            'max': round(self.max, 3) if self.max is not None else None,
+            'last': round(self.recent[-1], 3) if self.recent else None
+        }
+        if self.recent:
+            recent = sorted(self.recent)
+            result['recent'] = {
+                'count': len(recent),
+                'p50': round(_percentile(recent, 0.50), 3),
+                'p90': round(_percentile(recent, 0.90), 3),
+                'p99': round(_percentile(recent, 0.99), 3)
+            }
+        # Cumulative counts per upper bound, as in Prometheus histograms
+        buckets = []
+        total = 0
+        for bound, count in zip((*self.bounds, '+Inf'), self.counts):
+            total += count
+            buckets.append([bound, total])
+        result['buckets'] = buckets
+        return result
+
+
+class Instruments:
+    """Named histograms for the monitor's own costs, all observed on the event loop."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {}
+
+    def histogram(self, name, bounds=DURATION_BUCKETS):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram(bounds)
+        return hist
+
+    def observe(self, name, value, bounds=DURATION_BUCKETS):
+        self.histogram(name, bounds).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000.0)
+
+    def to_dict(self):
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'histograms': {name: hist.to_dict() for name, hist in sorted(self.histograms.items())}
+        }
+
+
+class TimedJSON:
+    # Drop-in for the json module that Socket.IO uses to encode packets, so
+    # payload serialization is measured separately from the send itself
+    def __init__(self, instruments, name='serialize'):
+        self.instruments = instruments
+        self.name = name
+
+    def dumps(self, *args, **kwargs):
+        with self.instruments.timer(self.name):
+            return json.dumps(*args, **kwargs)
+
+    def loads(self, *args, **kwargs):
+        return json.loads(*args, **kwargs)
+
+
+async def watch_loop_lag(instruments, interval=0.5, name='loop_lag'):
+    # A sleep that wakes late means something blocked the event loop for
+    # the difference
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        instruments.observe(name, max(0.0, loop.time() - start - interval) * 1000.0)
@@ -0,0 +1,147 @@
+import logging
+import os
+import sys
+import threading
+from collections import namedtuple
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+SECTOR_SIZE = 512
+
+# Same field names as psutil's counters, limited to what the collectors read
+NetIO = namedtuple('NetIO', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+DiskIO = namedtuple('DiskIO', 'read_count write_count read_bytes write_bytes busy_time')
+
+
+def usage_percent(used, total):
+    return round(used / total * 100.0, 1) if total else 0.0
+
+
+class ProcFile:
+    # A /proc (or sysfs/cgroupfs) file opened once and re-read from offset 0
+    # on every call. The kernel regenerates the contents on each read at
+    # offset 0, so no seek or reopen is needed; the buffer grows until a
+    # read fits.
+    def __init__(self, path, size=8192):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.buf = bytearray(size)
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            while True:
+                n = os.preadv(self.fd, [self.buf], 0)
+                if n < len(self.buf):
+                    return bytes(memoryview(self.buf)[:n])
+                self.buf = bytearray(len(self.buf) * 2)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ProcFS:
+    """Linux collectors that read /proc directly instead of through psutil.
+
+    Each method returns the same values as the psutil call it replaces, but
+    parses only the fields the collectors use. probe() opens every file and
+    parses it once; a source that fails is left out of `sources` so the
+    caller falls back to psutil for it alone.
+    """
+
+    # source name -> (/proc file, method)
+    SOURCES = {
+        'cpu_times': ('stat', 'cpu_times'),
+        'memory': ('meminfo', 'memory'),
+        'net_io_counters': ('net/dev', 'net_io_counters'),
+        'disk_io_counters': ('diskstats', 'disk_io_counters')
+    }
+
+    def __init__(self, root='/proc', cpu_fields=10):
+        self.root = root
+        self.cpu_fields = cpu_fields
+        self.files = {}
+        self.sources = set()
+
+    @classmethod
+    def probe(cls, root='/proc', cpu_fields=10):
+        if not sys.platform.startswith('linux') or not hasattr(os, 'preadv'):
+            return None
+        procfs = cls(root, cpu_fields)
+        for source, (name, method) in cls.SOURCES.items():
+            try:
+                procfs.files[name] = ProcFile(f"{root}/{name}")
+                getattr(procfs, method)()
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                logging.warning(f"/proc fast path unavailable for {source} ({e}), using psutil")
+                if name in procfs.files:
+                    procfs.files.pop(name).close()
+                continue
+            procfs.sources.add(source)
+        return procfs
+
+    def cpu_times(self):
+        # psutil.cpu_times(percpu=True): one row of seconds per online CPU
+        n = self.cpu_fields + 1
+        return [[int(v) / CLOCK_TICKS for v in line.split()[1:n]]
+                for line in self.files['stat'].read().splitlines() if line.startswith(b'cpu') and line[3:4] != b' ']
+
+    def memory(self):
+        # psutil.virtual_memory() and swap_memory() from a single read. Only
+        # kernels with MemAvailable (3.14+) are supported here.
+        wanted = {b'MemTotal:', b'MemFree:', b'MemAvailable:', b'SwapTotal:', b'SwapFree:'}
+        mems = {}
+        for line in self.files['meminfo'].read().splitlines():
+            key, _, rest = line.partition(b' ')
+            if key in wanted:
+                mems[key] = int(rest.split()[0]) * 1024
+        total = mems[b'MemTotal:']
+        available = mems[b'MemAvailable:']
+        if available == 0:
+            raise ValueError("MemAvailable is 0")
+        if available > total:
+            # Inside some containers; psutil reports free memory then
+            available = mems[b'MemFree:']
+        swap_total = mems[b'SwapTotal:']
+        swap_used = swap_total - mems[b'SwapFree:']
+        return {
+            'total': total,
+            'used': total - available,
+            'available': available,
+            'percent': usage_percent(total - available, total),
+            'swap_total': swap_total,
+            'swap_used': swap_used,
+            'swap_percent': usage_percent(swap_used, swap_total)
+        }
+
+    def net_io_counters(self):
+        # (psutil.net_io_counters(), psutil.net_io_counters(pernic=True)),
+        # without psutil's compensation for counters that wrap
+        pernic = {}
+        for line in self.files['net/dev'].read().splitlines()[2:]:
+            colon = line.rfind(b':')
+            fields = line[colon + 1:].split()
+            pernic[line[:colon].strip().decode()] = NetIO(
+                int(fields[8]), int(fields[0]), int(fields[9]), int(fields[1]),
+                int(fields[2]), int(fields[10]), int(fields[3]), int(fields[11]))
+        return NetIO(*map(sum, zip(*pernic.values()))) if pernic else NetIO(0, 0, 0, 0, 0, 0, 0, 0), pernic
+
+    def disk_io_counters(self):
+        # psutil.disk_io_counters(perdisk=True) on Linux 2.6+
+        disks = {}
+        for line in self.files['diskstats'].read().splitlines():
+            fields = line.split()
+            if len(fields) == 14 or len(fields) >= 18:
+                disks[fields[2].decode()] = DiskIO(int(fields[3]), int(fields[7]), int(fields[5]) * SECTOR_SIZE,
+                                                   int(fields[9]) * SECTOR_SIZE, int(fields[12]))
+            elif len(fields) == 7:
+                # Partition on old kernels: no timing fields
+                disks[fields[2].decode()] = DiskIO(int(fields[3]), int(fields[5]), int(fields[4]) * SECTOR_SIZE,
+                                                   int(fields[6]) * SECTOR_SIZE, 0)
+            else:
+                raise ValueError(f"Unexpected /proc/diskstats line {line!r}")
+        return disks
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
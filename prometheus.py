@@ -0,0 +1,154 @@
+# Prometheus text exposition (format 0.0.4) of a v2 sampler snapshot
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFIX = 'sysmon'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text, samples):
+        # samples is a list of (labels dict, value); None values are skipped
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        name = f"{PREFIX}_{name}"
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if labels:
+                label_str = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                self.lines.append(f"{name}{{{label_str}}} {_format_value(value)}")
+            else:
+                self.lines.append(f"{name} {_format_value(value)}")
+
+    def render(self):
+        return ('\n'.join(self.lines) + '\n').encode('utf-8')
+
+
+def render_metrics(snapshot):
+    """Render a v2 snapshot as Prometheus exposition text (bytes)."""
+    w = _Writer()
+    w.family('sample_timestamp_seconds', 'gauge', 'Unix time the sample was taken.',
+             [({}, snapshot.get('timestamp'))])
+
+    cpu = snapshot.get('cpu')
+    if cpu:
+        w.family('cpu_usage_percent', 'gauge', 'CPU busy percent across all cores.', [({}, cpu['percent'])])
+        w.family('cpu_load_average', 'gauge', 'System load average.',
+                 [({'period': p}, cpu[f'load_{p}']) for p in ('1', '5', '15')])
+        w.family('cpu_time_percent', 'gauge', 'Share of CPU time by mode.',
+                 [({'mode': mode}, value) for mode, value in cpu.get('times_percent', {}).items()])
+        cores = cpu.get('cores')
+        if cores:
+            w.family('cpu_cores', 'gauge', 'Number of logical cores.', [({}, cores['count'])])
+            w.family('cpu_core_max_percent', 'gauge', 'Busy percent of the busiest core.', [({}, cores['max'])])
+            w.family('cpu_core_stddev_percent', 'gauge', 'Standard deviation of per-core busy percent.',
+                     [({}, cores['stddev'])])
+            w.family('cpu_cores_busy', 'gauge', 'Cores at or above the busy threshold.',
+                     [({'threshold': cores['busy_threshold']}, cores['busy'])])
+        w.family('cpu_core_usage_percent', 'gauge', 'Busy percent per logical core.',
+                 [({'core': i}, value) for i, value in enumerate(cpu.get('per_core', []))])
+
+    memory = snapshot.get('memory')
+    if memory:
+        w.family('memory_bytes', 'gauge', 'Physical memory by state.',
+                 [({'state': k}, memory[k]) for k in ('total', 'used', 'available')])
+        w.family('memory_usage_percent', 'gauge', 'Physical memory in use.', [({}, memory['percent'])])
+        w.family('swap_bytes', 'gauge', 'Swap space by state.',
+                 [({'state': 'total'}, memory['swap_total']), ({'state': 'used'}, memory['swap_used'])])
+        w.family('swap_usage_percent', 'gauge', 'Swap space in use.', [({}, memory['swap_percent'])])
+
+    disks = snapshot.get('disk')
+    if disks:
+        def fs_labels(d):
+            return {'device': d['device'], 'mountpoint': d['mountpoint'], 'fstype': d.get('fstype', '')}
+        w.family('filesystem_size_bytes', 'gauge', 'Filesystem size.', [(fs_labels(d), d['total']) for d in disks])
+        w.family('filesystem_used_bytes', 'gauge', 'Filesystem space used.', [(fs_labels(d), d['used']) for d in disks])
+        w.family('filesystem_free_bytes', 'gauge', 'Filesystem space free.', [(fs_labels(d), d.get('free')) for d in disks])
+        w.family('filesystem_usage_percent', 'gauge', 'Filesystem space used.',
+                 [(fs_labels(d), d['percent']) for d in disks])
+
+    disk_io = snapshot.get('disk_io')
+    if disk_io:
+        for field, kind, help_text in (
+                ('read_bytes', 'counter', 'Bytes read from the device.'),
+                ('write_bytes', 'counter', 'Bytes written to the device.')):
+            w.family(f'disk_{field}_total', kind, help_text,
+                     [({'device': dev}, io[field]) for dev, io in disk_io.items()])
+        w.family('disk_busy_percent', 'gauge', 'Share of time the device was busy.',
+                 [({'device': dev}, io.get('busy_percent')) for dev, io in disk_io.items()])
+
+    network = snapshot.get('network')
+    if network:
+        interfaces = network.get('interfaces', {})
+        w.family('network_sent_bytes_total', 'counter', 'Bytes sent per interface.',
+                 [({'interface': nic}, n['bytes_sent']) for nic, n in interfaces.items()])
+        w.family('network_received_bytes_total', 'counter', 'Bytes received per interface.',
+                 [({'interface': nic}, n['bytes_recv']) for nic, n in interfaces.items()])
+        w.family('network_errors_total', 'counter', 'Interface errors by direction.',
+                 [({'interface': nic, 'direction': d}, n[f'err{d}']) for nic, n in interfaces.items()
+                  for d in ('in', 'out')])
+        w.family('network_drops_total', 'counter', 'Dropped packets by direction.',
+                 [({'interface': nic, 'direction': d}, n[f'drop{d}']) for nic, n in interfaces.items()
+                  for d in ('in', 'out')])
+
+    temperatures = snapshot.get('temperature')
+    if temperatures:
+        w.family('temperature_celsius', 'gauge', 'Current sensor temperature.',
+                 [({'sensor': t['name']}, t['current']) for t in temperatures])
+        w.family('temperature_high_celsius', 'gauge', 'Sensor high threshold.',
+                 [({'sensor': t['name']}, t['high']) for t in temperatures])
+        w.family('temperature_critical_celsius', 'gauge', 'Sensor critical threshold.',
+                 [({'sensor': t['name']}, t['critical']) for t in temperatures])
+
+    system_time = snapshot.get('system_time')
+    if system_time and 'error' not in system_time:
+        w.family('boot_time_seconds', 'gauge', 'Unix time the system booted.', [({}, system_time['boot_time'])])
+
+    processes = snapshot.get('processes')
+    if processes:
+        w.family('processes', 'gauge', 'Number of running processes.', [({}, processes['count'])])
+
+    cgroups = snapshot.get('cgroups')
+    if cgroups:
+        pressure = cgroups.get('pressure', {})
+        w.family('pressure_stall_percent', 'gauge', 'Share of time tasks were stalled on a resource (PSI avg10).',
+                 [({'resource': resource, 'kind': kind}, values['avg10'])
+                  for resource, kinds in pressure.items() for kind, values in kinds.items()])
+        w.family('pressure_stall_seconds_total', 'counter', 'Total time tasks were stalled on a resource.',
+                 [({'resource': resource, 'kind': kind}, values['total'] / 1e6)
+                  for resource, kinds in pressure.items() for kind, values in kinds.items()])
+        groups = cgroups.get('groups', {})
+        w.family('cgroup_cpu_usage_percent', 'gauge', 'CPU used by the cgroup, in percent of one CPU.',
+                 [({'cgroup': name}, g['cpu']['usage_percent']) for name, g in groups.items() if 'cpu' in g])
+        w.family('cgroup_cpu_throttled_percent', 'gauge', 'Share of CFS periods in which the cgroup was throttled.',
+                 [({'cgroup': name}, g['cpu'].get('throttled_percent')) for name, g in groups.items() if 'cpu' in g])
+        w.family('cgroup_memory_bytes', 'gauge', 'Memory charged to the cgroup.',
+                 [({'cgroup': name}, g['memory']['current']) for name, g in groups.items() if 'memory' in g])
+        w.family('cgroup_memory_limit_bytes', 'gauge', 'Memory limit of the cgroup (memory.max).',
+                 [({'cgroup': name}, g['memory']['max']) for name, g in groups.items() if 'memory' in g])
+        w.family('cgroup_pressure_stall_percent', 'gauge', 'Share of time some tasks in the cgroup were stalled (avg10).',
+                 [({'cgroup': name, 'resource': resource}, value)
+                  for name, g in groups.items() for resource, value in g['pressure'].items()])
+
+    w.family('collector_stale', 'gauge', 'Whether a collector is serving a stale value.',
+             [({'collector': name}, 1) for name in snapshot.get('stale', [])])
+    return w.render()
@@ -0,0 +1,137 @@
+import bisect
+import json
+import os
+import struct
+import zlib
+
+from delta import diff_snapshot, apply_patch
+
+# File layout: MAGIC, a length-prefixed JSON header, then records. Each
+# record is a fixed header (payload length, kind, sample timestamp) followed
+# by a zlib-compressed JSON payload: a whole snapshot for a keyframe, or a
+# diff_snapshot() patch against the previous sample.
+MAGIC = b'SMREC\x01'
+_LENGTH = struct.Struct('<I')
+_RECORD = struct.Struct('<IBd')
+KEYFRAME = 0
+PATCH = 1
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def _decode(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+class SampleRecorder:
+    """Appends every sampler snapshot to a recording file.
+
+    Used as a sampler listener. A keyframe is written every
+    `keyframe_interval` samples, and the first sample after opening is
+    always one, so a reader can start at any keyframe and appending to an
+    existing recording never depends on state from an earlier run.
+    """
+
+    def __init__(self, path, keyframe_interval=60, header=None):
+        self.path = path
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.records = 0
+        self._previous = None
+        self._since_keyframe = 0
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a sample recording")
+        self._file = open(path, 'ab')
+        if not exists:
+            meta = json.dumps(header or {}, separators=(',', ':')).encode('utf-8')
+            self._file.write(MAGIC + _LENGTH.pack(len(meta)) + meta)
+
+    def on_sample(self, ts, data):
+        if self._previous is None or self._since_keyframe >= self.keyframe_interval:
+            kind, payload = KEYFRAME, _encode(data)
+            self._since_keyframe = 0
+        else:
+            kind, payload = PATCH, _encode(diff_snapshot(self._previous, data))
+        self._file.write(_RECORD.pack(len(payload), kind, ts) + payload)
+        # One write per sample; a crash loses at most the record being written
+        self._file.flush()
+        self._previous = data
+        self._since_keyframe += 1
+        self.records += 1
+
+    def close(self):
+        self._file.close()
+
+
+class SampleReader:
+    """Reads a recording back as (timestamp, snapshot) pairs.
+
+    build_index() scans only the record headers and keeps the offset and
+    timestamp of every keyframe, so samples(start) can seek straight to the
+    keyframe at or before `start`. A truncated final record, as left by a
+    crash, ends the stream.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a sample recording")
+        (length,) = _LENGTH.unpack(self._file.read(_LENGTH.size))
+        self.header = json.loads(self._file.read(length))
+        self.data_offset = self._file.tell()
+        self.index = None
+
+    def build_index(self):
+        # Only record headers are read; payloads are skipped over
+        self.index = []
+        f = self._file
+        offset = self.data_offset
+        while True:
+            f.seek(offset)
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return self.index
+            length, kind, ts = _RECORD.unpack(head)
+            if kind == KEYFRAME:
+                self.index.append((ts, offset))
+            offset += _RECORD.size + length
+
+    def samples(self, start=None):
+        offset = self.data_offset
+        if start is not None:
+            if self.index is None:
+                self.build_index()
+            i = bisect.bisect_right(self.index, (start, float('inf'))) - 1
+            if i >= 0:
+                offset = self.index[i][1]
+        f = self._file
+        data = None
+        position = offset
+        while True:
+            f.seek(position)
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            length, kind, ts = _RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            position += _RECORD.size + length
+            if kind == KEYFRAME:
+                data = _decode(payload)
+            elif data is None:
+                # A patch with no keyframe before it can't be applied
+                continue
+            else:
+                data = apply_patch(data, _decode(payload))
+            if start is None or ts >= start:
+                yield ts, data
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,87 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+# Segment layout: a seqlock counter and payload length, one demand slot per
+# worker, then the latest encoded payload
+_HEADER = struct.Struct('<QI4x')
+_SLOT = struct.Struct('<d')
+DEFAULT_SIZE = 4 * 1024 * 1024
+
+
+class SegmentFull(ValueError):
+    pass
+
+
+class SampleSegment:
+    """One writer publishes the latest payload; any number of processes read it.
+
+    The writer bumps the sequence counter to an odd value, copies the payload
+    in, then bumps it to even again. A reader copies the payload out and keeps
+    it only if the counter was even and unchanged across the copy, so it never
+    sees a half-written payload and the writer never waits on readers.
+
+    Each worker also owns a slot holding the time until which it wants
+    samples, so the writer can idle when nobody is connected anywhere.
+    """
+
+    def __init__(self, shm, workers, owner=False):
+        self.shm = shm
+        self.workers = workers
+        self.owner = owner
+        self.buf = shm.buf
+        self.data_offset = _HEADER.size + _SLOT.size * workers
+        self.capacity = shm.size - self.data_offset
+        self.seq = 0
+
+    @classmethod
+    def create(cls, workers, size=DEFAULT_SIZE):
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shm.buf[:_HEADER.size + _SLOT.size * workers] = bytes(_HEADER.size + _SLOT.size * workers)
+        return cls(shm, workers, owner=True)
+
+    @classmethod
+    def attach(cls, name, workers):
+        return cls(shared_memory.SharedMemory(name=name), workers)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, payload):
+        if len(payload) > self.capacity:
+            raise SegmentFull(f"Payload of {len(payload)} bytes exceeds segment capacity of {self.capacity}")
+        seq = self.seq + 1
+        _HEADER.pack_into(self.buf, 0, seq, 0)
+        self.buf[self.data_offset:self.data_offset + len(payload)] = payload
+        self.seq = seq + 1
+        _HEADER.pack_into(self.buf, 0, self.seq, len(payload))
+        return self.seq
+
+    def read(self, last_seq=0, retries=100):
+        # Returns (seq, payload), with payload None if nothing new since last_seq
+        for _ in range(retries):
+            seq, length = _HEADER.unpack_from(self.buf, 0)
+            if seq == last_seq:
+                return seq, None
+            if seq % 2:
+                # Mid-write; the writer holds the odd value only for one copy
+                time.sleep(0)
+                continue
+            payload = bytes(self.buf[self.data_offset:self.data_offset + length])
+            if _HEADER.unpack_from(self.buf, 0)[0] == seq:
+                return seq, payload
+        return last_seq, None
+
+    def set_demand(self, worker, until):
+        _SLOT.pack_into(self.buf, _HEADER.size + _SLOT.size * worker, until)
+
+    def demand_until(self):
+        return max((_SLOT.unpack_from(self.buf, _HEADER.size + _SLOT.size * i)[0] for i in range(self.workers)),
+                   default=0.0)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
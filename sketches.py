@@ -0,0 +1,364 @@
+import bisect
+import math
+import time
+from collections import deque
+from fnmatch import fnmatch
+from itertools import accumulate
+
+# Magnitudes below this land in the zero bin
+MIN_VALUE = 1e-9
+
+
+class _Store:
+    # Bin counts for indexes offset .. offset + len(counts) - 1. Once the
+    # span would pass max_bins, the lowest bins are collapsed into the
+    # lowest one kept, so memory is fixed. Only quantiles that fall among
+    # the smallest magnitudes lose accuracy (they are overestimated). A
+    # plain list, since single increments dominate and are cheapest there.
+    def __init__(self, max_bins):
+        self.max_bins = max_bins
+        self.offset = 0
+        self.counts = []
+        self.total = 0
+
+    def _extend(self, lo, hi):
+        counts = self.counts
+        if not counts:
+            self.offset = max(lo, hi - self.max_bins + 1)
+            self.counts = [0] * (hi - self.offset + 1)
+            return
+        top = self.offset + len(counts) - 1
+        lo = max(min(lo, self.offset), max(hi, top) - self.max_bins + 1)
+        if lo > self.offset:
+            # Everything below lo goes into bin lo
+            cut = lo - self.offset
+            counts = [sum(counts[:cut + 1])] + counts[cut + 1:]
+            top = max(top, lo)
+        else:
+            counts = [0] * (self.offset - lo) + counts
+        self.counts = counts + [0] * (hi - top)
+        self.offset = lo
+
+    @staticmethod
+    def _add_counts(counts, lo, offset, src):
+        # Adds src (starting at index offset) into counts (starting at lo);
+        # anything below lo goes into the first bin
+        if not src:
+            return
+        start = offset - lo
+        if start < 0:
+            counts[0] += sum(src[:-start])
+            src = src[-start:]
+            start = 0
+        end = start + len(src)
+        counts[start:end] = [a + b for a, b in zip(counts[start:end], src)]
+
+    def add(self, index, count=1):
+        i = index - self.offset
+        if i < 0 or i >= len(self.counts):
+            self._extend(index, index)
+            i = max(index - self.offset, 0)
+        self.counts[i] += count
+        self.total += count
+
+    def merge(self, other):
+        if not other.total:
+            return
+        other_hi = other.offset + len(other.counts) - 1
+        if other.offset < self.offset or other_hi >= self.offset + len(self.counts):
+            self._extend(other.offset, other_hi)
+        self._add_counts(self.counts, self.offset, other.offset, other.counts)
+        self.total += other.total
+
+    def index_at_rank(self, rank, reverse=False):
+        counts = self.counts[::-1] if reverse else self.counts
+        i = min(bisect.bisect_right(list(accumulate(counts)), rank), len(counts) - 1)
+        return self.offset + (len(counts) - 1 - i if reverse else i)
+
+    def copy(self):
+        store = _Store(self.max_bins)
+        store.offset = self.offset
+        store.counts = self.counts.copy()
+        store.total = self.total
+        return store
+
+    def to_dict(self):
+        return {'offset': self.offset, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data, max_bins):
+        store = cls(max_bins)
+        store.offset = int(data['offset'])
+        store.counts = [int(count) for count in data['counts']]
+        store.total = sum(store.counts)
+        return store
+
+
+class DDSketch:
+    """Quantile sketch with a relative error bound (DDSketch).
+
+    Values fall into logarithmic bins of ratio gamma, so every quantile is
+    within relative_accuracy of the true value, however skewed the data.
+    Two sketches with the same accuracy merge by adding bin counts, which
+    loses nothing: the merge equals a sketch of both inputs. At most
+    max_bins bins are kept per sign, so the size is fixed.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=512):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = int(max_bins)
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = _Store(self.max_bins)
+        self.negative = _Store(self.max_bins)
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index):
+        # The point in bin (gamma^(i-1), gamma^i] with the smallest relative error to both ends
+        return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def add(self, value, count=1):
+        if value > MIN_VALUE:
+            self.positive.add(self._index(value), count)
+        elif value < -MIN_VALUE:
+            self.negative.add(self._index(-value), count)
+        else:
+            self.zero += count
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f"Cannot merge sketches with relative accuracy {other.relative_accuracy} "
+                             f"and {self.relative_accuracy}")
+        if not other.count:
+            return self
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.negative.total:
+            # Most negative first
+            value = -self._value(self.negative.index_at_rank(rank, reverse=True))
+        elif rank < self.negative.total + self.zero:
+            value = 0.0
+        else:
+            value = self._value(self.positive.index_at_rank(rank - self.negative.total - self.zero))
+        # The extremes are exact
+        return min(max(value, self.min), self.max)
+
+    def copy(self):
+        sketch = DDSketch.__new__(DDSketch)
+        sketch.__dict__.update(self.__dict__)
+        sketch.positive = self.positive.copy()
+        sketch.negative = self.negative.copy()
+        return sketch
+
+    def summary(self, quantiles):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count,
+            'quantiles': {str(q): self.quantile(q) for q in quantiles}
+        }
+
+    def to_dict(self):
+        # JSON-safe; from_dict() restores a sketch that merges exactly
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_bins': self.max_bins,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'zero': self.zero,
+            'positive': self.positive.to_dict(),
+            'negative': self.negative.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(float(data['relative_accuracy']), int(data['max_bins']))
+        sketch.positive = _Store.from_dict(data['positive'], sketch.max_bins)
+        sketch.negative = _Store.from_dict(data['negative'], sketch.max_bins)
+        sketch.zero = int(data['zero'])
+        sketch.count = int(data['count'])
+        sketch.sum = float(data['sum'])
+        if sketch.count:
+            sketch.min = float(data['min'])
+            sketch.max = float(data['max'])
+        return sketch
+
+
+class _Series:
+    def __init__(self, tiers, halflives):
+        # Per tier: closed windows as (start, sketch), and the open one
+        self.closed = [deque(maxlen=keep) for _, keep in tiers]
+        self.current = [None] * len(tiers)
+        self.ewma = [None] * len(halflives)
+        self.last_seen = None
+
+
+class SketchStore:
+    """Per-metric quantile sketches rolled in fixed windows, plus EWMAs.
+
+    `tiers` is a list of (step seconds, windows kept), finest first, for
+    example [(60, 60), (3600, 168)]: an hour of minutes and a week of hours.
+    Samples go into the open window of the finest tier. A closed window is
+    merged into the open window of the next tier, so each sample is added
+    once and each coarser window is exactly the merge of its finer ones.
+
+    A query over the last N seconds uses the finest tier reaching that far
+    back. It merges that tier's closed windows in range with every open
+    window. The merged closed windows are cached until the next roll, so a
+    repeated query costs a copy, a few merges and a cumulative sum.
+
+    Each EWMA has a half-life in seconds. A sample's weight depends on the
+    time since the metric's previous sample, so collectors on different
+    intervals decay at the same rate.
+    """
+
+    def __init__(self, tiers, relative_accuracy=0.01, max_bins=512, halflives=(), metrics=('*',),
+                 max_series=1000):
+        self.tiers = sorted((float(step), int(keep)) for step, keep in tiers)
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.taus = [halflife / math.log(2) for halflife in halflives]
+        self.patterns = list(metrics)
+        self.max_series = max_series
+        self.series = {}
+        self.span = max(step * keep for step, keep in self.tiers)
+        self.rolls = 0
+        self._ignored = set()
+        self._cache = {}
+        # EWMA weights by time since the previous sample; nearly every
+        # metric shares its collector's interval
+        self._alphas = {}
+
+    def _new_sketch(self):
+        return DDSketch(self.relative_accuracy, self.max_bins)
+
+    def _open_window(self, series, level, ts):
+        step = self.tiers[level][0]
+        start = ts // step * step
+        current = series.current[level]
+        if current is not None and current[0] == start:
+            return current[1]
+        if current is not None:
+            series.closed[level].append(current)
+            if level + 1 < len(self.tiers):
+                self._open_window(series, level + 1, current[0]).merge(current[1])
+            self.rolls += 1
+            self._cache.clear()
+        sketch = self._new_sketch()
+        series.current[level] = (start, sketch)
+        return sketch
+
+    def _series_for(self, metric):
+        if metric in self._ignored:
+            return None
+        if len(self.series) >= self.max_series or not any(fnmatch(metric, p) for p in self.patterns):
+            self._ignored.add(metric)
+            return None
+        series = self.series[metric] = _Series(self.tiers, self.taus)
+        return series
+
+    def _weights(self, elapsed):
+        alphas = self._alphas.get(elapsed)
+        if alphas is None:
+            if len(self._alphas) > 1000:
+                self._alphas.clear()
+            alphas = self._alphas[elapsed] = [1.0 - math.exp(-max(elapsed, 0.0) / tau) for tau in self.taus]
+        return alphas
+
+    def add(self, ts, flat):
+        rolls = self.rolls
+        step = self.tiers[0][0]
+        start = ts // step * step
+        for metric, value in flat.items():
+            series = self.series.get(metric) or self._series_for(metric)
+            if series is None:
+                continue
+            current = series.current[0]
+            if current is not None and current[0] == start:
+                current[1].add(value)
+            else:
+                self._open_window(series, 0, ts).add(value)
+            ewma = series.ewma
+            if series.last_seen is None:
+                ewma[:] = [value] * len(ewma)
+            elif ewma:
+                for i, alpha in enumerate(self._weights(round(ts - series.last_seen, 2))):
+                    ewma[i] += alpha * (value - ewma[i])
+            series.last_seen = ts
+        if self.rolls != rolls:
+            self.prune(ts)
+
+    def prune(self, now):
+        # Series unseen for longer than every window they could appear in
+        for metric in [m for m, s in self.series.items() if s.last_seen < now - self.span]:
+            del self.series[metric]
+        self._ignored.clear()
+
+    def metrics(self):
+        return sorted(self.series)
+
+    def window(self, metric, seconds, now=None):
+        # Returns (merged sketch, tier step, start of the oldest window used)
+        series = self.series.get(metric)
+        if series is None:
+            return None, None, None
+        now = time.time() if now is None else now
+        since = now - seconds
+        level = next((i for i, (step, keep) in enumerate(self.tiers) if step * keep >= seconds),
+                     len(self.tiers) - 1)
+        step = self.tiers[level][0]
+        key = (metric, level, since // step)
+        merged = self._cache.get(key)
+        if merged is None:
+            merged = self._new_sketch()
+            for start, sketch in series.closed[level]:
+                if start + step > since:
+                    merged.merge(sketch)
+            self._cache[key] = merged
+        merged = merged.copy()
+        # Open windows of finer tiers haven't been rolled into this one yet
+        current = [c for i, c in enumerate(series.current[:level + 1])
+                   if c is not None and c[0] + self.tiers[i][0] > since]
+        for _, sketch in current:
+            merged.merge(sketch)
+        oldest = next((start for start, _ in series.closed[level] if start + step > since), None)
+        if oldest is None:
+            oldest = min((start for start, _ in current), default=None)
+        return merged, step, oldest
+
+    def ewma(self, metric):
+        series = self.series.get(metric)
+        if series is None:
+            return None
+        return list(series.ewma)
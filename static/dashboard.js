@@ -0,0 +1,291 @@
+document.addEventListener('DOMContentLoaded', () => {
+    const connBadge = document.getElementById('conn-status');
+    const cpuBar = document.getElementById('cpu-bar');
+    const load1 = document.getElementById('load-1');
+    const load5 = document.getElementById('load-5');
+    const load15 = document.getElementById('load-15');
+    const cpuMaxCore = document.getElementById('cpu-max-core');
+    const cpuBusyThreshold = document.getElementById('cpu-busy-threshold');
+    const cpuBusy = document.getElementById('cpu-busy');
+    const cpuCount = document.getElementById('cpu-count');
+    const cpuIowait = document.getElementById('cpu-iowait');
+    const cpuSteal = document.getElementById('cpu-steal');
+    const memBar = document.getElementById('mem-bar');
+    const memUsed = document.getElementById('mem-used');
+    const memTotal = document.getElementById('mem-total');
+    const swapBar = document.getElementById('swap-bar');
+    const swapUsed = document.getElementById('swap-used');
+    const swapTotal = document.getElementById('swap-total');
+    const diskContainer = document.getElementById('disk-container');
+    const diskIoContainer = document.getElementById('disk-io-container');
+    const netSent = document.getElementById('net-sent');
+    const netRecv = document.getElementById('net-recv');
+    const netSendRate = document.getElementById('net-send-rate');
+    const netRecvRate = document.getElementById('net-recv-rate');
+    const tempContainer = document.getElementById('temp-container');
+    const systemUptime = document.getElementById('system-uptime');
+    const systemBootTime = document.getElementById('system-boot-time');
+    const staticInfo = document.getElementById('static-info');
+    const procCount = document.getElementById('proc-count');
+    const procTable = document.getElementById('proc-table');
+    const psiSummary = document.getElementById('psi-summary');
+    const cgroupTable = document.getElementById('cgroup-table');
+
+    // Fetch static info
+    fetch('/api/system_info')
+        .then(res => res.json())
+        .then(data => {
+            staticInfo.textContent =
+                `OS: ${data.os}\nHost: ${data.hostname}\nCPU: ${data.cpu_model}\nCores: ${data.cores}`;
+        }).catch(err => {
+            staticInfo.textContent = `Error: ${err}`;
+        });
+
+    // Where the monitor's own time goes: collectors, ticks, JSON, emits, loop lag.
+    // The panel is only rendered when instrumentation.panel is enabled.
+    const internalsTable = document.getElementById('internals-table');
+    function refreshInternals() {
+        fetch('/api/internal')
+            .then(res => res.json())
+            .then(data => {
+                internalsTable.innerHTML = Object.entries(data.histograms).map(([name, h]) => {
+                    const r = h.recent || {};
+                    return `<tr><td>${escapeHtml(name)}</td><td>${h.last ?? ''}</td><td>${r.p50 ?? ''}</td><td>${r.p90 ?? ''}</td>
+                            <td>${r.p99 ?? ''}</td><td>${h.max ?? ''}</td><td>${h.count}</td></tr>`;
+                }).join('');
+            }).catch(() => {});
+    }
+    if (internalsTable) {
+        refreshInternals();
+        setInterval(refreshInternals, 5000);
+    }
+
+    // Firing alerts, keyed by rule and series; the server only sends changes
+    const alertsContainer = document.getElementById('alerts');
+    const activeAlerts = new Map();
+    function renderAlerts() {
+        alertsContainer.innerHTML = Array.from(activeAlerts.values()).map(a =>
+            `<div class="alert alert-${a.severity === 'critical' ? 'danger' : 'warning'} py-1 mb-1">
+             <strong>${escapeHtml(a.rule)}</strong>: ${escapeHtml(a.series)} = ${escapeHtml(a.value)}
+             (threshold ${escapeHtml(a.threshold)})</div>`).join('');
+    }
+    fetch('/api/alerts')
+        .then(res => res.json())
+        .then(data => {
+            data.active.forEach(a => activeAlerts.set(`${a.rule}|${a.series}`, a));
+            renderAlerts();
+        }).catch(() => {});
+
+    // Schema 2 sends typed numbers, formatted here; the delta protocol sends
+    // a keyframe on connect, then only changed fields
+    const socket = io({ auth: { schema: 2, protocol: 'delta' } });
+    let state = null;
+    let stateSeq = null;
+
+    socket.on('connect', () => {
+        connBadge.textContent = 'Connected';
+        connBadge.classList.replace('bg-danger', 'bg-success');
+    });
+    socket.on('disconnect', () => {
+        connBadge.textContent = 'Disconnected';
+        connBadge.classList.replace('bg-success', 'bg-danger');
+        // Reset metrics
+        cpuBar.style.width = '0%'; cpuBar.textContent = '0%';
+        load1.textContent = 'N/A'; load5.textContent = 'N/A'; load15.textContent = 'N/A';
+        memBar.style.width = '0%'; memBar.textContent = '0%';
+        memUsed.textContent = 'N/A'; memTotal.textContent = 'N/A';
+        diskContainer.textContent = 'Loading...';
+        netSent.textContent = 'N/A'; netRecv.textContent = 'N/A';
+        netSendRate.textContent = 'N/A'; netRecvRate.textContent = 'N/A';
+        state = null;
+        stateSeq = null;
+    });
+    socket.on('alert', a => {
+        if (a.state === 'firing') {
+            activeAlerts.set(`${a.rule}|${a.series}`, a);
+        } else {
+            activeAlerts.delete(`${a.rule}|${a.series}`);
+        }
+        renderAlerts();
+    });
+    socket.on('metrics_update', render);
+    socket.on('metrics_keyframe', msg => {
+        state = msg.data;
+        stateSeq = msg.seq;
+        render(state);
+    });
+    socket.on('metrics_patch', msg => {
+        if (state === null) {
+            return;
+        }
+        if (msg.base !== stateSeq) {
+            // Missed a patch; drop state and wait for a fresh keyframe
+            state = null;
+            socket.emit('request_keyframe');
+            return;
+        }
+        applyPatch(state, msg.ops);
+        stateSeq = msg.seq;
+        render(state);
+    });
+
+    function applyPatch(target, ops) {
+        ops.forEach(op => {
+            const path = op[0];
+            let node = target;
+            for (let i = 0; i < path.length - 1; i++) {
+                if (typeof node[path[i]] !== 'object' || node[path[i]] === null) {
+                    node[path[i]] = {};
+                }
+                node = node[path[i]];
+            }
+            const key = path[path.length - 1];
+            if (op.length > 1) {
+                node[key] = op[1];
+            } else {
+                delete node[key];
+            }
+        });
+    }
+
+    function render(data) {
+        // CPU
+        if (data.cpu) {
+            updateBar(cpuBar, data.cpu.percent);
+            // Load Average
+            load1.textContent = data.cpu.load_1.toFixed(2);
+            load5.textContent = data.cpu.load_5.toFixed(2);
+            load15.textContent = data.cpu.load_15.toFixed(2);
+            if (data.cpu.cores) {
+                cpuMaxCore.textContent = `#${data.cpu.cores.max_core} at ${data.cpu.cores.max}%`;
+                cpuBusyThreshold.textContent = data.cpu.cores.busy_threshold;
+                cpuBusy.textContent = data.cpu.cores.busy;
+                cpuCount.textContent = data.cpu.cores.count;
+            }
+            if (data.cpu.times_percent) {
+                cpuIowait.textContent = data.cpu.times_percent.iowait ?? 'N/A';
+                cpuSteal.textContent = data.cpu.times_percent.steal ?? 'N/A';
+            }
+        }
+        // Memory
+        if (data.memory) {
+            memUsed.textContent = formatGB(data.memory.used, 1) + ' GB';
+            memTotal.textContent = formatGB(data.memory.total, 1) + ' GB';
+            updateBar(memBar, data.memory.percent);
+            swapUsed.textContent = formatGB(data.memory.swap_used, 1) + ' GB';
+            swapTotal.textContent = formatGB(data.memory.swap_total, 1) + ' GB';
+            updateBar(swapBar, data.memory.swap_percent);
+        }
+        // Disk
+        if (Array.isArray(data.disk)) {
+            let html = '';
+            data.disk.forEach(d => {
+                html +=
+                    `<div class="mb-2"><strong>${escapeHtml(d.mountpoint)}</strong>: ${formatGB(d.used, 1)}/${formatGB(d.total, 1)} GB
+                     <div class="progress"><div class="progress-bar" style="width:${d.percent}%">${d.percent}%</div></div>
+                    </div>`;
+            });
+            diskContainer.innerHTML = html;
+        }
+        // Disk I/O
+        if (data.disk_io) {
+            diskIoContainer.innerHTML = Object.entries(data.disk_io).map(([dev, io]) =>
+                `<p class="mb-1"><strong>${escapeHtml(dev)}</strong>: R ${(io.read_rate / 1024 ** 2).toFixed(2)} MB/s
+                 (${io.read_iops.toFixed(0)} IOPS) &middot; W ${(io.write_rate / 1024 ** 2).toFixed(2)} MB/s
+                 (${io.write_iops.toFixed(0)} IOPS)${io.busy_percent !== undefined ? ` &middot; ${io.busy_percent.toFixed(0)}% busy` : ''}</p>`
+            ).join('') || 'No disks found';
+        }
+        // Network
+        if (data.network) {
+            netSent.textContent = formatGB(data.network.bytes_sent, 2);
+            netRecv.textContent = formatGB(data.network.bytes_recv, 2);
+            netSendRate.textContent = formatMbps(data.network.send_rate);
+            netRecvRate.textContent = formatMbps(data.network.recv_rate);
+        }
+
+        // Temperature
+        if (Array.isArray(data.temperature)) {
+            if (data.temperature.length > 0) {
+                let tempHtml = '';
+                data.temperature.forEach(sensor => {
+                    tempHtml += `<p class="mb-1">${escapeHtml(sensor.name)}: ${sensor.current.toFixed(1)}°C`;
+                    if (sensor.high !== null) {
+                        tempHtml += ` <small class="text-warning">(High: ${sensor.high.toFixed(1)}°C)</small>`;
+                    }
+                    if (sensor.critical !== null) {
+                        tempHtml += ` <small class="text-danger">(Critical: ${sensor.critical.toFixed(1)}°C)</small>`;
+                    }
+                    tempHtml += '</p>';
+                });
+                tempContainer.innerHTML = tempHtml;
+            } else {
+                tempContainer.textContent = 'No temperature sensors found';
+            }
+        }
+
+        // System Time
+        if (data.system_time) {
+            systemUptime.textContent = formatUptime(data.system_time.uptime);
+            systemBootTime.textContent = new Date(data.system_time.boot_time * 1000).toLocaleString();
+        }
+
+        // Processes
+        if (data.processes) {
+            procCount.textContent = data.processes.count;
+            procTable.innerHTML = data.processes.top_cpu.map(p =>
+                `<tr><td>${p.pid}</td><td>${escapeHtml(p.name)}</td><td>${escapeHtml(p.username)}</td>
+                 <td>${p.cpu_percent.toFixed(1)}</td><td>${(p.rss / 1024 ** 2).toFixed(1)} MB</td>
+                 <td>${(p.io_rate / 1024).toFixed(1)} KB/s</td></tr>`).join('');
+        }
+
+        // cgroups and pressure stall information (only when the collector is enabled)
+        if (data.cgroups && cgroupTable) {
+            const psi = data.cgroups.pressure;
+            psiSummary.textContent = ['cpu', 'memory', 'io']
+                .filter(r => psi[r]).map(r => `${r} ${psi[r].some.avg10.toFixed(1)}%`).join(' · ') || 'N/A';
+            cgroupTable.innerHTML = Object.entries(data.cgroups.groups).map(([name, g]) => {
+                const mem = g.memory ? `${(g.memory.current / 1024 ** 2).toFixed(0)} MB` +
+                    (g.memory.max ? ` / ${(g.memory.max / 1024 ** 2).toFixed(0)} MB` : '') : '';
+                const io = g.io ? `R ${(g.io.read_rate / 1024 ** 2).toFixed(2)} · W ${(g.io.write_rate / 1024 ** 2).toFixed(2)} MB/s` : '';
+                const stall = ['cpu', 'memory', 'io'].map(r => g.pressure[r] ?? '-').join(' / ');
+                return `<tr><td>${escapeHtml(name)}</td><td>${g.cpu ? g.cpu.usage_percent.toFixed(1) : ''}</td>
+                        <td>${g.cpu && g.cpu.throttled_percent !== undefined ? g.cpu.throttled_percent.toFixed(1) : ''}</td>
+                        <td>${mem}</td><td>${io}</td><td>${stall}</td></tr>`;
+            }).join('');
+        }
+
+        // Dim panels whose collector missed its deadline this tick
+        const stale = data.stale || [];
+        document.querySelectorAll('[data-metric]').forEach(card => {
+            card.classList.toggle('stale', stale.includes(card.dataset.metric));
+        });
+    }
+
+    // Process, mount, sensor, device, cgroup and alert names are chosen by
+    // whoever controls them on the host, so they are escaped before going
+    // into innerHTML
+    function escapeHtml(value) {
+        const entities = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+        return String(value ?? '').replace(/[&<>"']/g, c => entities[c]);
+    }
+
+    function formatGB(bytes, digits) {
+        return (bytes / 1024 ** 3).toFixed(digits);
+    }
+
+    function formatMbps(bytesPerSecond) {
+        return (bytesPerSecond * 8 / 1024 ** 2).toFixed(2);
+    }
+
+    function formatUptime(seconds) {
+        const days = Math.floor(seconds / 86400);
+        const pad = n => String(Math.floor(n)).padStart(2, '0');
+        const clock = `${pad(seconds % 86400 / 3600)}:${pad(seconds % 3600 / 60)}:${pad(seconds % 60)}`;
+        return days > 0 ? `${days}d ${clock}` : clock;
+    }
+
+    function updateBar(bar, val) {
+        bar.style.width = `${val}%`;
+        bar.textContent = `${val}%`;
+    }
+});
@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import AlertEngine  # noqa: E402
+from history import flatten_snapshot  # noqa: E402
+
+
+def test_threshold_from_sibling_field():
+    engine = AlertEngine.from_config(['temperature.*.current > high'])
+    data = {'temperature': [{'name': 'coretemp', 'current': 95.0, 'high': 80.0, 'critical': 100.0},
+                            {'name': 'acpitz', 'current': 40.0, 'high': 80.0, 'critical': 100.0}]}
+    events = engine.evaluate(1000.0, flatten_snapshot(data))
+    assert [(e['state'], e['series'], e['threshold']) for e in events] == [
+        ('firing', 'temperature.coretemp.current', 80.0)]
@@ -0,0 +1,43 @@
+import errno
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cgroups import CgroupTree  # noqa: E402
+
+
+def make_group(path, usage):
+    os.makedirs(path)
+    with open(os.path.join(path, 'cpu.stat'), 'w') as f:
+        f.write(f"usage_usec {usage}\nuser_usec 0\nsystem_usec 0\n")
+    with open(os.path.join(path, 'memory.current'), 'w') as f:
+        f.write("4096\n")
+
+
+def test_recreated_group_is_reopened(tmp_path):
+    root = tmp_path / 'cgroup'
+    root.mkdir()
+    (root / 'cgroup.stat').write_text("nr_descendants 1\nnr_dying_descendants 0\n")
+    make_group(root / 'svc', 100)
+    tree = CgroupTree(root=str(root), depth=1)
+    assert tree.read()['/svc']['usage_usec'] == 100
+    assert tree.scans == 1
+
+    # A service restart removes the cgroup and creates it again at the same
+    # path. Files held open on the old one fail with ENODEV.
+    shutil.rmtree(root / 'svc')
+    make_group(root / 'svc', 7)
+    old = tree.groups['/svc']
+
+    def removed():
+        raise OSError(errno.ENODEV, "No such device")
+
+    old.read = removed
+    assert '/svc' not in tree.read()
+    assert '/svc' not in tree.groups
+    assert tree.read()['/svc']['usage_usec'] == 7
+    assert tree.scans == 2
+    tree.read()
+    assert tree.scans == 2
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fleet import FleetAgent, FleetHub, INGEST_PATH  # noqa: E402
+
+
+class FakeSio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, payload, room=None):
+        self.emitted.append((event, payload, room))
+
+
+def sample(seq):
+    return {'seq': seq, 'timestamp': 1000.0 + seq, 'cpu': {'percent': float(seq)}}
+
+
+def test_encode_batch_keeps_samples_until_sent():
+    agent = FleetAgent('http://hub', 'a')
+    for seq in (1, 2, 3):
+        agent.on_sample(seq, sample(seq))
+    samples, last = agent.encode_batch(None)
+    assert [s['seq'] for s in samples] == [1, 2, 3]
+    assert 'data' in samples[0] and samples[1]['base'] == 1
+    assert len(agent.buffer) == 3
+    agent.on_sample(4, sample(4))
+    agent.sent_through(last['seq'])
+    assert [data['seq'] for data in agent.buffer] == [4]
+
+
+def test_reconnect_after_failed_send(monkeypatch):
+    async def scenario():
+        sio = FakeSio()
+        hub = FleetHub(sio)
+        app = web.Application()
+        app.router.add_get(INGEST_PATH, hub.ingest)
+        server = TestServer(app)
+        await server.start_server()
+
+        send_str = aiohttp.ClientWebSocketResponse.send_str
+        failures = []
+
+        async def flaky_send_str(ws, data, *args, **kwargs):
+            # The hello goes through send_str too; fail the first batch
+            if not failures and '"batch"' in data:
+                failures.append(data)
+                raise ConnectionResetError("Connection lost")
+            return await send_str(ws, data, *args, **kwargs)
+
+        monkeypatch.setattr(aiohttp.ClientWebSocketResponse, 'send_str', flaky_send_str)
+        agent = FleetAgent(str(server.make_url('/')), 'host-a', batch_interval=0.05)
+        for seq in (1, 2, 3):
+            agent.on_sample(seq, sample(seq))
+        task = asyncio.create_task(agent.run())
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                if agent.sent == 3:
+                    break
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await server.close()
+        return hub, agent, failures
+
+    hub, agent, failures = asyncio.run(scenario())
+    assert len(failures) == 1
+    assert agent.sent == 3
+    assert not agent.buffer
+    host = hub.hosts['host-a']
+    assert host['samples'] == 3
+    assert host['latest'] == sample(3)
+
+
+def test_hub_closes_on_malformed_frames():
+    frames = ['[]', '1', '"x"', '{"type": "batch", "samples": 1}', '{"type": "batch", "samples": [1]}',
+              '{"type": "batch", "samples": [{"seq": 1, "data": []}]}',
+              '{"type": "batch", "samples": [{"seq": 2, "base": 1, "ops": 5}]}',
+              '{"type": "batch", "samples": [{"seq": 2, "base": 1, "ops": [[[]]]}]}']
+
+    async def scenario():
+        hub = FleetHub(FakeSio())
+        app = web.Application()
+        app.router.add_get(INGEST_PATH, hub.ingest)
+        server = TestServer(app)
+        await server.start_server()
+        codes = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for frame in frames:
+                    async with session.ws_connect(server.make_url(INGEST_PATH)) as ws:
+                        await ws.send_json({'type': 'hello', 'host': 'host-a'})
+                        await ws.send_json({'type': 'batch', 'samples': [{'seq': 1, 'data': sample(1)}]})
+                        await ws.send_str(frame)
+                        msg = await ws.receive(timeout=5)
+                        codes.append((msg.type, ws.close_code))
+        finally:
+            await server.close()
+        return hub, codes
+
+    hub, codes = asyncio.run(scenario())
+    assert codes == [(aiohttp.WSMsgType.CLOSE, aiohttp.WSCloseCode.UNSUPPORTED_DATA)] * len(frames)
+    # The bad frames leave the last good state in place
+    assert hub.hosts['host-a']['latest'] == sample(1)
+    assert not hub.hosts['host-a']['connected']
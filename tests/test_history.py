@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore  # noqa: E402
+
+
+def test_history_records_only_metrics(tmp_path):
+    data = {
+        'version': 2, 'timestamp': 1000.0, 'seq': 7,
+        'cpu': {
+            'percent': 12.5,
+            'per_core': [10.0, 15.0, 0.0, 25.0],
+            'cores': {'count': 4, 'max': 25.0, 'max_core': 3, 'busy': 0, 'busy_threshold': 90.0}
+        },
+        'system_time': {'boot_time': 1.7e9, 'uptime': 3600.0},
+        'temperature': [{'name': 'coretemp', 'current': 48.0, 'high': 80.0, 'critical': 100.0}],
+        'network': {'interfaces': {'high': {'recv_rate': 5.0}}}
+    }
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    assert store.append(1000.0, data) == {
+        'cpu.percent': 12.5,
+        'cpu.cores.count': 4.0,
+        'cpu.cores.max': 25.0,
+        'cpu.cores.busy': 0.0,
+        'system_time.uptime': 3600.0,
+        'temperature.coretemp.current': 48.0,
+        'network.interfaces.high.recv_rate': 5.0
+    }
@@ -1,14 +1,38 @@
 import os
 import time
+import json
+import platform
 import asyncio
+import heapq
+import signal
+import tempfile
+from collections import deque
+from fnmatch import fnmatch
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import psutil
+import numpy as np
 import logging
 import yaml
 from pathlib import Path
 from aiohttp import web
 import socketio
 from jinja2 import Environment, FileSystemLoader
+from history import HistoryStore, HistoryExport, ROLLUPS, flatten_snapshot
+from shared import SampleSegment, SegmentFull
+from sketches import SketchStore
+from burst import BurstSampler
+from recording import SampleRecorder, SampleReader
+from procfs import ProcFS
+from cgroups import CgroupTree
+from alerts import AlertEngine, parse_duration
+from delta import diff_snapshot
+from fleet import FleetAgent, FleetHub, INGEST_PATH
+from assets import AssetPipeline, TemplatePage, encode_body, conditional_response
+from instrumentation import Instruments, TimedJSON, watch_loop_lag, COUNT_BUCKETS
+import prometheus
+import export
 
 # Configure logging
 logging.basicConfig(
@@ -22,6 +46,7 @@ def load_config():
     default_config = {
         'server': {
             'host': '0.0.0.0',
+            'workers': 1,
             'http': {'enabled': True, 'port': 3000},
             'https': {
                 'enabled': True,
@@ -35,14 +60,84 @@ def load_config():
         },
         'monitoring': {
             'update_interval': 1.0,
+            'collector_timeout': 2.0,
+            'collector_workers': 8,
+            'collector_backend': 'auto',
+            'keyframe_interval': 30,
+            'max_pending_frames': 2,
+            'stall_timeout': 30.0,
             'metrics': {
                 'cpu': True,
                 'memory': True,
                 'disk': True,
                 'network': True,
-                'processes': True
+                'temperature': True,
+                'system_time': True,
+                'processes': True,
+                'disk_io': True,
+                'cgroups': False
             }
         },
+        'history': {
+            'enabled': True,
+            'db_path': 'instance/history.db',
+            'memory_samples': 3600,
+            'flush_interval': 10.0,
+            'background_interval': 10.0,
+            'max_points': 5000,
+            'retention': {
+                'raw': 6 * 3600,
+                '10s': 2 * 86400,
+                '1m': 30 * 86400,
+                '1h': 365 * 86400
+            }
+        },
+        'sketches': {
+            'enabled': True,
+            'windows': [['1m', 60], ['1h', 168]],
+            'relative_accuracy': 0.01,
+            'max_bins': 512,
+            'ewma': ['1m', '5m', '15m'],
+            'metrics': ['*'],
+            'max_series': 1000
+        },
+        'burst': {
+            'enabled': True,
+            'duration': 30,
+            'rate': 20,
+            'max_duration': 60,
+            'max_rate': 50,
+            'max_overhead': 0.02,
+            'resolution': 0.25
+        },
+        'recording': {
+            'file': '',
+            'keyframe_interval': 60
+        },
+        'replay': {
+            'file': '',
+            'speed': 1.0,
+            'loop': False,
+            'start': None,
+            'retime': True
+        },
+        'fleet': {
+            'mode': 'standalone',
+            'hub_url': '',
+            'host_id': '',
+            'group': 'default',
+            'token': '',
+            'batch_interval': 5.0,
+            'max_buffer': 600
+        },
+        'alerts': {
+            'rules': [],
+            'missing_after': '30s'
+        },
+        'instrumentation': {
+            'panel': False,
+            'loop_lag_interval': 0.5
+        },
         'security': {
             'enable_cors': False,
             'cors_origins': ['*'],
@@ -51,7 +146,7 @@ def load_config():
     }
     
     # Try to load user config
-    config_path = Path('config.yaml')
+    config_path = Path(os.environ.get('MONITOR_CONFIG', 'config.yaml'))
     if config_path.exists():
         try:
             with open(config_path) as f:
@@ -65,21 +160,27 @@ def load_config():
                             default[key] = value
                 merge_dicts(default_config, user_config)
         except Exception as e:
-            logging.warning(f"Error loading config.yaml: {e}. Using default configuration.")
+            logging.warning(f"Error loading {config_path}: {e}. Using default configuration.")
     else:
-        logging.info("No config.yaml found. Using default configuration.")
+        logging.info(f"No {config_path} found. Using default configuration.")
     
     return default_config
 
 # Load configuration
 config = load_config()
 
-# Set up Jinja2 templates
+# Set up Jinja2 templates and the static assets they link to
 env = Environment(loader=FileSystemLoader('templates'))
+assets = AssetPipeline('static')
+
+# The monitor's own costs: collector and tick durations, serialization,
+# emit fan-out, event-loop lag and client count
+instruments = Instruments()
 
 # Create Socket.IO server
 sio = socketio.AsyncServer(
     async_mode='aiohttp',
+    json=TimedJSON(instruments),
     cors_allowed_origins=config['security']['cors_origins'] if config['security']['enable_cors'] else []
 )
 
@@ -90,51 +191,168 @@ sio.attach(app)
 # Monitoring interval (seconds)
 MONITOR_INTERVAL = float(config['monitoring']['update_interval'])
 
-# Data fetching
-_last_net = psutil.net_io_counters()
+# Data fetching. The read_*() collectors return typed values (integer bytes,
+# float rates and epoch seconds) for schema v2; the get_*_info() functions
+# format them into the original v1 strings.
+SCHEMA_VERSION = 2
+GB = 1024**3
 
-def get_cpu_info():
+_boot_time = None
+
+
+class CounterState:
+    """Previous counter readings, keyed per collector, with monotonic timestamps.
+
+    Rates are computed against the real time since the previous reading of
+    the same counters, so they stay correct at any interval. The sampler
+    owns one instance; direct calls to the collectors share a module-level one.
+    """
+
+    def __init__(self):
+        self.previous = {}
+        # pid -> per-process state for the process table
+        self.processes = {}
+
+    def delta(self, key, counters, now=None):
+        # Stores `counters` and returns (previous counters, elapsed seconds),
+        # or (None, None) on the first reading
+        now = time.monotonic() if now is None else now
+        last = self.previous.get(key)
+        self.previous[key] = (now, counters)
+        if last is None:
+            return None, None
+        return last[1], max(now - last[0], 1e-6)
+
+
+_local_state = CounterState()
+
+
+# Collector data sources. On Linux, 'auto' reads /proc/stat, /proc/meminfo,
+# /proc/net/dev and /proc/diskstats through file handles kept open for the
+# life of the process; any source that can't be read that way uses psutil.
+def _psutil_memory():
+    mem = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    return {
+        'total': mem.total,
+        'used': mem.used,
+        'available': mem.available,
+        'percent': mem.percent,
+        'swap_total': swap.total,
+        'swap_used': swap.used,
+        'swap_percent': swap.percent
+    }
+
+
+def _psutil_net_io():
+    return psutil.net_io_counters(), psutil.net_io_counters(pernic=True)
+
+
+procfs = None
+if config['monitoring']['collector_backend'] != 'psutil':
+    procfs = ProcFS.probe(cpu_fields=len(psutil.cpu_times()._fields))
+
+
+def _source(name, fallback):
+    return getattr(procfs, name) if procfs is not None and name in procfs.sources else fallback
+
+
+cpu_times_percpu = _source('cpu_times', lambda: psutil.cpu_times(percpu=True))
+memory_stats = _source('memory', _psutil_memory)
+net_io_counters = _source('net_io_counters', _psutil_net_io)
+disk_io_counters = _source('disk_io_counters', lambda: psutil.disk_io_counters(perdisk=True) or {})
+
+
+def counter_rate(current, previous, elapsed):
+    # Counters can reset or wrap (e.g. an interface going down); report 0 then
+    if previous is None or not elapsed:
+        return 0.0
+    return max(current - previous, 0) / elapsed
+
+# Per-core CPU accounting. cpu_times(percpu=True) is turned into one
+# (cores x fields) array per tick so deltas and aggregates are vectorized.
+_cpu_settings = config['monitoring']['metrics'].get('cpu')
+_cpu_settings = _cpu_settings if isinstance(_cpu_settings, dict) else {}
+CPU_PER_CORE = bool(_cpu_settings.get('per_core', True))
+CPU_BUSY_THRESHOLD = float(_cpu_settings.get('busy_threshold', 90.0))
+CPU_TIME_FIELDS = psutil.cpu_times()._fields
+CPU_BREAKDOWN_FIELDS = [f for f in ('user', 'system', 'iowait', 'irq', 'softirq', 'steal') if f in CPU_TIME_FIELDS]
+# guest time is already counted in user/nice, and idle/iowait aren't busy
+_CPU_TOTAL_COLUMNS = np.array([f not in ('guest', 'guest_nice') for f in CPU_TIME_FIELDS])
+_CPU_IDLE_COLUMNS = np.array([f in ('idle', 'iowait') for f in CPU_TIME_FIELDS])
+_CPU_BREAKDOWN_COLUMNS = [CPU_TIME_FIELDS.index(f) for f in CPU_BREAKDOWN_FIELDS]
+
+
+def cpu_time_deltas(state):
+    # Returns (per-core busy percent array, overall busy percent, breakdown
+    # percent per cpu_times field) since the previous call
+    times = np.array(cpu_times_percpu(), dtype=np.float64)
+    previous, _ = state.delta('cpu_times', times)
+    if previous is None or previous.shape != times.shape:
+        # First read or CPU hotplug: fall back to the averages since boot
+        delta = times
+    else:
+        # Counters can step backwards slightly on some kernels
+        delta = np.maximum(times - previous, 0.0)
+    total = delta[:, _CPU_TOTAL_COLUMNS].sum(axis=1)
+    idle = delta[:, _CPU_IDLE_COLUMNS].sum(axis=1)
+    per_core = np.where(total > 0, 100.0 * (1.0 - idle / np.where(total > 0, total, 1.0)), 0.0)
+    grand_total = total.sum()
+    if grand_total <= 0:
+        return per_core, 0.0, {f: 0.0 for f in CPU_BREAKDOWN_FIELDS}
+    overall = 100.0 * (1.0 - idle.sum() / grand_total)
+    column_sums = delta[:, _CPU_BREAKDOWN_COLUMNS].sum(axis=0) * (100.0 / grand_total)
+    return per_core, overall, dict(zip(CPU_BREAKDOWN_FIELDS, np.round(column_sums, 2).tolist()))
+
+
+def read_cpu(state=None):
+    state = state or _local_state
     try:
         # Get CPU percent and load average
         load_1, load_5, load_15 = os.getloadavg()
-        return {
-            'percent': psutil.cpu_percent(interval=None),
-            'load_1': round(load_1, 2),
-            'load_5': round(load_5, 2),
-            'load_15': round(load_15, 2)
+        per_core, percent, breakdown = cpu_time_deltas(state)
+        result = {
+            'percent': round(float(percent), 1),
+            'load_1': load_1,
+            'load_5': load_5,
+            'load_15': load_15,
+            'times_percent': breakdown,
+            'cores': {
+                'count': int(per_core.size),
+                'max': round(float(per_core.max()), 1) if per_core.size else 0.0,
+                'max_core': int(per_core.argmax()) if per_core.size else 0,
+                'stddev': round(float(per_core.std()), 2) if per_core.size else 0.0,
+                'busy': int((per_core >= CPU_BUSY_THRESHOLD).sum()),
+                'busy_threshold': CPU_BUSY_THRESHOLD
+            }
         }
+        if CPU_PER_CORE:
+            result['per_core'] = np.round(per_core, 1).tolist()
+        return result
     except Exception as e:
         logging.error(f"CPU info error: {e}")
-        return {'percent': 0, 'load_1': 0, 'load_5': 0, 'load_15': 0, 'error': str(e)}
+        return {'percent': 0.0, 'load_1': 0.0, 'load_5': 0.0, 'load_15': 0.0, 'error': str(e)}
 
 
-def get_memory_info():
+def read_memory(state=None):
     try:
-        mem = psutil.virtual_memory()
-        swap = psutil.swap_memory()
-        return {
-            'total': f"{mem.total / (1024**3):.1f} GB",
-            'used': f"{mem.used / (1024**3):.1f} GB",
-            'percent': mem.percent,
-            'swap_total': f"{swap.total / (1024**3):.1f} GB",
-            'swap_used': f"{swap.used / (1024**3):.1f} GB",
-            'swap_percent': swap.percent
-        }
+        return memory_stats()
     except Exception as e:
         logging.error(f"Memory info error: {e}")
-        return {'total': 'N/A', 'used': 'N/A', 'percent': 0, 'swap_total': 'N/A', 'swap_used': 'N/A', 'swap_percent': 0, 'error': str(e)}
+        return {'total': 0, 'used': 0, 'available': 0, 'percent': 0.0,
+                'swap_total': 0, 'swap_used': 0, 'swap_percent': 0.0, 'error': str(e)}
 
 
-def get_disk_info():
+def read_disk(state=None):
     parts = []
     try:
         for p in psutil.disk_partitions():
             if p.fstype:
                 try:
                     usage = psutil.disk_usage(p.mountpoint)
-                    total = usage.total / (1024**3)
-                    used = usage.used / (1024**3)
-                    parts.append({'device': p.device, 'mountpoint': p.mountpoint, 'total': f"{total:.1f}", 'used': f"{used:.1f}", 'percent': usage.percent})
+                    parts.append({'device': p.device, 'mountpoint': p.mountpoint, 'fstype': p.fstype,
+                                  'total': usage.total, 'used': usage.used, 'free': usage.free,
+                                  'percent': usage.percent})
                 except Exception:
                     continue
     except Exception as e:
@@ -142,37 +360,19 @@ def get_disk_info():
     return parts
 
 
-def get_system_time_info():
+def read_system_time(state=None):
+    global _boot_time
     try:
-        boot_time = psutil.boot_time()
-        uptime = time.time() - boot_time
-        
-        # Convert boot time to readable format
-        boot_datetime = datetime.fromtimestamp(boot_time)
-        boot_str = boot_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Format uptime
-        days = int(uptime // (24 * 3600))
-        uptime = uptime % (24 * 3600)
-        hours = int(uptime // 3600)
-        uptime %= 3600
-        minutes = int(uptime // 60)
-        seconds = int(uptime % 60)
-        
-        uptime_str = ''
-        if days > 0:
-            uptime_str += f"{days}d "
-        uptime_str += f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        
-        return {
-            'boot_time': boot_str,
-            'uptime': uptime_str
-        }
+        # Boot time is fixed for the life of the process; only uptime moves
+        if _boot_time is None:
+            _boot_time = psutil.boot_time()
+        return {'boot_time': _boot_time, 'uptime': time.time() - _boot_time}
     except Exception as e:
         logging.error(f"System time info error: {e}")
-        return {'boot_time': 'N/A', 'uptime': 'N/A'}
+        return {'boot_time': 0.0, 'uptime': 0.0, 'error': str(e)}
 
-def get_temperature_info():
+
+def read_temperature(state=None):
     try:
         temps = psutil.sensors_temperatures()
         result = []
@@ -180,65 +380,1495 @@ def get_temperature_info():
             for entry in entries:
                 result.append({
                     'name': f"{name}: {entry.label}" if entry.label else name,
-                    'current': round(entry.current, 1),
-                    'high': round(entry.high, 1) if entry.high is not None else None,
-                    'critical': round(entry.critical, 1) if entry.critical is not None else None
+                    'current': entry.current,
+                    'high': entry.high,
+                    'critical': entry.critical
                 })
         return result
     except Exception as e:
         logging.error(f"Temperature info error: {e}")
         return []
 
-def get_network_info():
-    global _last_net
-    try:
-        current = psutil.net_io_counters()
-        sent = current.bytes_sent - _last_net.bytes_sent
-        recv = current.bytes_recv - _last_net.bytes_recv
-        _last_net = current
-        send_rate = sent * 8 / (MONITOR_INTERVAL * (1024**2))
-        recv_rate = recv * 8 / (MONITOR_INTERVAL * (1024**2))
+
+def read_network(state=None):
+    state = state or _local_state
+    try:
+        now = time.monotonic()
+        current, pernic = net_io_counters()
+        previous, elapsed = state.delta('network', current, now)
+        previous_nics, _ = state.delta('network_nics', pernic, now)
+        interfaces = {}
+        for nic, c in pernic.items():
+            p = previous_nics.get(nic) if previous_nics else None
+            interfaces[nic] = {
+                'bytes_sent': c.bytes_sent,
+                'bytes_recv': c.bytes_recv,
+                'send_rate': counter_rate(c.bytes_sent, p and p.bytes_sent, elapsed),
+                'recv_rate': counter_rate(c.bytes_recv, p and p.bytes_recv, elapsed),
+                'packets_sent_rate': counter_rate(c.packets_sent, p and p.packets_sent, elapsed),
+                'packets_recv_rate': counter_rate(c.packets_recv, p and p.packets_recv, elapsed),
+                'errin': c.errin,
+                'errout': c.errout,
+                'dropin': c.dropin,
+                'dropout': c.dropout
+            }
         return {
-            'bytes_sent_total': f"{current.bytes_sent/(1024**3):.2f}",
-            'bytes_recv_total': f"{current.bytes_recv/(1024**3):.2f}",
-            'send_rate_mbps': f"{send_rate:.2f}",
-            'recv_rate_mbps': f"{recv_rate:.2f}"}
+            'bytes_sent': current.bytes_sent,
+            'bytes_recv': current.bytes_recv,
+            'send_rate': counter_rate(current.bytes_sent, previous and previous.bytes_sent, elapsed),
+            'recv_rate': counter_rate(current.bytes_recv, previous and previous.bytes_recv, elapsed),
+            'interfaces': interfaces
+        }
     except Exception as e:
         logging.error(f"Network info error: {e}")
-        return {'bytes_sent_total': 0, 'bytes_recv_total': 0, 'send_rate_mbps': 0, 'recv_rate_mbps': 0, 'error': str(e)}
+        return {'bytes_sent': 0, 'bytes_recv': 0, 'send_rate': 0.0, 'recv_rate': 0.0, 'interfaces': {}, 'error': str(e)}
+
+
+# Per-device disk I/O. Loop and RAM devices are skipped by default.
+_disk_io_settings = config['monitoring']['metrics'].get('disk_io')
+_disk_io_settings = _disk_io_settings if isinstance(_disk_io_settings, dict) else {}
+DISK_IO_EXCLUDE = list(_disk_io_settings.get('exclude', ['loop*', 'ram*', 'zram*']))
 
 
-async def background_monitor(sid):
-    logging.info(f"Background monitor started for {sid} (interval={MONITOR_INTERVAL}s)")
-    await asyncio.sleep(0.1)
+def read_disk_io(state=None):
+    state = state or _local_state
+    try:
+        counters = disk_io_counters()
+        previous, elapsed = state.delta('disk_io', counters)
+        devices = {}
+        for device, c in counters.items():
+            if any(fnmatch(device, pattern) for pattern in DISK_IO_EXCLUDE):
+                continue
+            p = previous.get(device) if previous else None
+            entry = {
+                'read_bytes': c.read_bytes,
+                'write_bytes': c.write_bytes,
+                'read_rate': counter_rate(c.read_bytes, p and p.read_bytes, elapsed),
+                'write_rate': counter_rate(c.write_bytes, p and p.write_bytes, elapsed),
+                'read_iops': counter_rate(c.read_count, p and p.read_count, elapsed),
+                'write_iops': counter_rate(c.write_count, p and p.write_count, elapsed)
+            }
+            if hasattr(c, 'busy_time'):
+                # busy_time is in milliseconds (Linux, FreeBSD)
+                busy = counter_rate(c.busy_time, p and p.busy_time, elapsed) / 10.0
+                entry['busy_percent'] = min(busy, 100.0)
+            devices[device] = entry
+        return devices
+    except Exception as e:
+        logging.error(f"Disk I/O info error: {e}")
+        return {}
+
+
+# cgroup v2 slices and pressure stall information (PSI). Off by default;
+# enable with {enabled: true, paths: ['/system.slice'], depth: 2}.
+_cgroup_settings = config['monitoring']['metrics'].get('cgroups')
+_cgroup_settings = _cgroup_settings if isinstance(_cgroup_settings, dict) else {}
+CGROUP_ROOT = _cgroup_settings.get('root', '/sys/fs/cgroup')
+CGROUP_PATHS = list(_cgroup_settings.get('paths', ['/']))
+CGROUP_DEPTH = int(_cgroup_settings.get('depth', 2))
+CGROUP_MAX_GROUPS = int(_cgroup_settings.get('max_groups', 50))
+_cgroup_tree = None
+
+
+def _pressure_rates(pressure, previous, elapsed):
+    # 'total' is cumulative stall time in microseconds, so its rate is the
+    # exact stalled share since the previous reading
+    for resource, kinds in pressure.items():
+        for kind, values in kinds.items():
+            p = previous.get(resource, {}).get(kind) if previous else None
+            values['percent'] = round(min(counter_rate(values['total'], p and p['total'], elapsed) / 1e4, 100.0), 2)
+    return pressure
+
+
+def _cgroup_entry(c, p, elapsed):
+    entry = {'pressure': c['pressure']}
+    if 'usage_usec' in c:
+        cpu = {'usage_percent': round(counter_rate(c['usage_usec'], p and p.get('usage_usec'), elapsed) / 1e4, 2)}
+        if 'nr_periods' in c:
+            # Share of CFS periods in which the group hit its quota
+            periods = counter_rate(c['nr_periods'], p and p.get('nr_periods'), 1.0)
+            throttled = counter_rate(c['nr_throttled'], p and p.get('nr_throttled'), 1.0)
+            cpu['throttled_percent'] = round(100.0 * throttled / periods, 2) if periods else 0.0
+            cpu['throttled_time_rate'] = counter_rate(c['throttled_usec'], p and p.get('throttled_usec'), elapsed) / 1e6
+            cpu['nr_throttled'] = c['nr_throttled']
+        entry['cpu'] = cpu
+    if 'memory_current' in c:
+        limit = c.get('memory_max')
+        entry['memory'] = {
+            'current': c['memory_current'],
+            'max': limit,
+            'percent': round(100.0 * c['memory_current'] / limit, 1) if limit else None
+        }
+    if 'rbytes' in c:
+        entry['io'] = {
+            'read_rate': counter_rate(c['rbytes'], p and p.get('rbytes'), elapsed),
+            'write_rate': counter_rate(c['wbytes'], p and p.get('wbytes'), elapsed),
+            'read_iops': counter_rate(c['rios'], p and p.get('rios'), elapsed),
+            'write_iops': counter_rate(c['wios'], p and p.get('wios'), elapsed)
+        }
+    return entry
+
+
+def read_cgroups(state=None):
+    global _cgroup_tree
+    state = state or _local_state
+    try:
+        if _cgroup_tree is None:
+            _cgroup_tree = CgroupTree(CGROUP_ROOT, CGROUP_PATHS, CGROUP_DEPTH, CGROUP_MAX_GROUPS)
+        now = time.monotonic()
+        pressure = _cgroup_tree.pressure()
+        counters = _cgroup_tree.read()
+        previous_pressure, elapsed = state.delta('pressure', pressure, now)
+        previous, _ = state.delta('cgroups', counters, now)
+        groups = {}
+        for name, c in counters.items():
+            groups[name] = _cgroup_entry(c, previous.get(name) if previous else None, elapsed)
+        return {'pressure': _pressure_rates(pressure, previous_pressure, elapsed), 'groups': groups}
+    except Exception as e:
+        logging.error(f"cgroup info error: {e}")
+        return {'pressure': {}, 'groups': {}, 'error': str(e)}
+
+
+# Process table. process_iter() keeps long-lived Process objects between
+# calls, so per-process CPU percent is a real delta, and only the attributes
+# needed for ranking are read. Our per-PID state is added and dropped as
+# PIDs appear and exit; usernames are only looked up for the top entries.
+_process_settings = config['monitoring']['metrics'].get('processes')
+_process_settings = _process_settings if isinstance(_process_settings, dict) else {}
+PROCESS_TOP_N = int(_process_settings.get('top_n', 10))
+PROCESS_ATTRS = ['name', 'cpu_percent', 'memory_info', 'io_counters']
+
+
+def _process_entry(row):
+    cpu_percent, rss, io_rate, pid, name, state = row
+    if 'username' not in state:
+        try:
+            state['username'] = state['proc'].username()
+        except (psutil.Error, KeyError):
+            state['username'] = None
+    return {'pid': pid, 'name': name, 'username': state['username'],
+            'cpu_percent': cpu_percent, 'rss': rss, 'io_rate': io_rate}
+
+
+def read_processes(state=None):
+    state = state or _local_state
+    try:
+        _, elapsed = state.delta('processes', None)
+        processes = state.processes
+        rows = []
+        seen = set()
+        for proc in psutil.process_iter(PROCESS_ATTRS, ad_value=None):
+            info = proc.info
+            pid = proc.pid
+            seen.add(pid)
+            mem = info['memory_info']
+            io = info['io_counters']
+            io_total = io.read_bytes + io.write_bytes if io is not None else None
+            entry = processes.get(pid)
+            io_rate = 0.0
+            if entry is None or entry['proc'] is not proc:
+                # New PID, or a PID reused by a different process
+                entry = processes[pid] = {'proc': proc, 'io': io_total}
+            else:
+                if io_total is not None and entry['io'] is not None:
+                    io_rate = counter_rate(io_total, entry['io'], elapsed)
+                entry['io'] = io_total
+            rows.append((info['cpu_percent'] or 0.0, mem.rss if mem is not None else 0, io_rate, pid, info['name'], entry))
+        for pid in processes.keys() - seen:
+            del processes[pid]
+        # heapq.nlargest is a partial sort: O(n log k) for the top k entries
+        return {
+            'count': len(rows),
+            'top_cpu': [_process_entry(r) for r in heapq.nlargest(PROCESS_TOP_N, rows, key=itemgetter(0))],
+            'top_memory': [_process_entry(r) for r in heapq.nlargest(PROCESS_TOP_N, rows, key=itemgetter(1))],
+            'top_io': [_process_entry(r) for r in heapq.nlargest(PROCESS_TOP_N, rows, key=itemgetter(2))]
+        }
+    except Exception as e:
+        logging.error(f"Process info error: {e}")
+        return {'count': 0, 'top_cpu': [], 'top_memory': [], 'top_io': [], 'error': str(e)}
+
+
+# v1 formatting
+def _with_error(result, raw):
+    if 'error' in raw:
+        result['error'] = raw['error']
+    return result
+
+
+def format_cpu_v1(raw):
+    return _with_error({
+        'percent': raw['percent'],
+        'load_1': round(raw['load_1'], 2),
+        'load_5': round(raw['load_5'], 2),
+        'load_15': round(raw['load_15'], 2)
+    }, raw)
+
+
+def format_memory_v1(raw):
+    if 'error' in raw:
+        return {'total': 'N/A', 'used': 'N/A', 'percent': 0, 'swap_total': 'N/A', 'swap_used': 'N/A',
+                'swap_percent': 0, 'error': raw['error']}
+    return {
+        'total': f"{raw['total'] / GB:.1f} GB",
+        'used': f"{raw['used'] / GB:.1f} GB",
+        'percent': raw['percent'],
+        'swap_total': f"{raw['swap_total'] / GB:.1f} GB",
+        'swap_used': f"{raw['swap_used'] / GB:.1f} GB",
+        'swap_percent': raw['swap_percent']
+    }
+
+
+def format_disk_v1(raw):
+    return [{'device': d['device'], 'mountpoint': d['mountpoint'], 'total': f"{d['total'] / GB:.1f}",
+             'used': f"{d['used'] / GB:.1f}", 'percent': d['percent']} for d in raw]
+
+
+def format_system_time_v1(raw):
+    if 'error' in raw:
+        return {'boot_time': 'N/A', 'uptime': 'N/A'}
+    boot_str = datetime.fromtimestamp(raw['boot_time']).strftime('%Y-%m-%d %H:%M:%S')
+
+    # Format uptime
+    uptime = raw['uptime']
+    days = int(uptime // (24 * 3600))
+    uptime = uptime % (24 * 3600)
+    hours = int(uptime // 3600)
+    uptime %= 3600
+    minutes = int(uptime // 60)
+    seconds = int(uptime % 60)
+
+    uptime_str = ''
+    if days > 0:
+        uptime_str += f"{days}d "
+    uptime_str += f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+    return {
+        'boot_time': boot_str,
+        'uptime': uptime_str
+    }
+
+
+def format_temperature_v1(raw):
+    return [{
+        'name': t['name'],
+        'current': round(t['current'], 1),
+        'high': round(t['high'], 1) if t['high'] is not None else None,
+        'critical': round(t['critical'], 1) if t['critical'] is not None else None
+    } for t in raw]
+
+
+def format_network_v1(raw):
+    return _with_error({
+        'bytes_sent_total': f"{raw['bytes_sent'] / GB:.2f}",
+        'bytes_recv_total': f"{raw['bytes_recv'] / GB:.2f}",
+        'send_rate_mbps': f"{raw['send_rate'] * 8 / (1024**2):.2f}",
+        'recv_rate_mbps': f"{raw['recv_rate'] * 8 / (1024**2):.2f}"
+    }, raw)
+
+
+def get_cpu_info():
+    return format_cpu_v1(read_cpu())
+
+
+def get_memory_info():
+    return format_memory_v1(read_memory())
+
+
+def get_disk_info():
+    return format_disk_v1(read_disk())
+
+
+def get_system_time_info():
+    return format_system_time_v1(read_system_time())
+
+
+def get_temperature_info():
+    return format_temperature_v1(read_temperature())
+
+
+def get_network_info():
+    return format_network_v1(read_network())
+
+
+COLLECTORS = {
+    'cpu': read_cpu,
+    'memory': read_memory,
+    'disk': read_disk,
+    'network': read_network,
+    'temperature': read_temperature,
+    'system_time': read_system_time,
+    'processes': read_processes,
+    'disk_io': read_disk_io,
+    'cgroups': read_cgroups
+}
+
+V1_FORMATTERS = {
+    'cpu': format_cpu_v1,
+    'memory': format_memory_v1,
+    'disk': format_disk_v1,
+    'network': format_network_v1,
+    'temperature': format_temperature_v1,
+    'system_time': format_system_time_v1
+}
+
+
+def format_snapshot_v1(snapshot):
+    data = {name: V1_FORMATTERS[name](value) for name, value in snapshot.items() if name in V1_FORMATTERS}
+    data['stale'] = snapshot.get('stale', [])
+    return data
+
+
+# Slow-moving metrics default to a longer interval than monitoring.update_interval
+DEFAULT_METRIC_INTERVALS = {
+    'disk': 10.0,
+    'temperature': 5.0,
+    'processes': 2.0
+}
+
+
+def metric_schedule(monitoring):
+    # Each entry under monitoring.metrics is either a boolean or a mapping
+    # like {enabled: true, interval: 0.5}; returns {collector: interval}
+    schedule = {}
+    for name in COLLECTORS:
+        setting = monitoring['metrics'].get(name, True)
+        interval = DEFAULT_METRIC_INTERVALS.get(name, monitoring['update_interval'])
+        if isinstance(setting, dict):
+            if not setting.get('enabled', True):
+                continue
+            interval = setting.get('interval', interval)
+        elif not setting:
+            continue
+        schedule[name] = float(interval)
+    return schedule
+
+
+METRIC_SCHEDULE = metric_schedule(config['monitoring'])
+
+
+def collect_snapshot():
+    return {name: collector() for name, collector in COLLECTORS.items()}
+
+
+# Collectors can block on slow mounts or sensor drivers, so they run in a
+# bounded thread pool and never on the event loop itself
+COLLECTOR_TIMEOUT = float(config['monitoring']['collector_timeout'])
+collector_pool = ThreadPoolExecutor(
+    max_workers=int(config['monitoring']['collector_workers']),
+    thread_name_prefix='collector'
+)
+
+
+def run_collector(name, state):
+    # Timed in the worker thread, so the figure excludes time spent queued
+    start = time.perf_counter()
+    value = COLLECTORS[name](state)
+    return value, (time.perf_counter() - start) * 1000.0
+
+
+# Shared sampler: one collection per tick, broadcast to every subscribed client.
+# Clients pick a schema (1: formatted strings, 2: typed numbers) and a
+# protocol. 'delta' clients get a keyframe on connect and every
+# KEYFRAME_INTERVAL ticks, and only the changed fields in between.
+PROTOCOLS = ('full', 'delta')
+SCHEMAS = (1, 2)
+EVENTS = {
+    1: {'full': 'system_update', 'keyframe': 'system_keyframe', 'patch': 'system_patch'},
+    2: {'full': 'metrics_update', 'keyframe': 'metrics_keyframe', 'patch': 'metrics_patch'}
+}
+KEYFRAME_INTERVAL = int(config['monitoring']['keyframe_interval'])
+# Seconds an HTTP poll keeps the sampler running with no clients connected
+POLL_KEEPALIVE = 60.0
+# A client with this many frames still queued for it is skipped until it
+# catches up, and disconnected if it stays that way for STALL_TIMEOUT seconds
+MAX_PENDING_FRAMES = int(config['monitoring']['max_pending_frames'])
+STALL_TIMEOUT = float(config['monitoring']['stall_timeout'])
+
+
+def client_room(schema, protocol):
+    return f"monitor_v{schema}_{protocol}"
+
+
+_engineio_warned = False
+
+
+def engineio_unavailable(e):
+    global _engineio_warned
+    if not _engineio_warned:
+        logging.warning(f"Cannot inspect Engine.IO sockets, backpressure is disabled: {e!r}")
+        _engineio_warned = True
+
+
+def engineio_socket(sid):
+    # The Engine.IO socket behind a Socket.IO client. This reaches into
+    # python-engineio internals (pinned in requirements.txt); if an upgrade
+    # moves them, backpressure is switched off rather than every emit failing
+    try:
+        return sio.eio.sockets.get(sio.manager.eio_sid_from_sid(sid, '/'))
+    except (AttributeError, KeyError, TypeError) as e:
+        engineio_unavailable(e)
+        return None
+
+
+def outbound_backlog(sid):
+    # Packets queued in Engine.IO for this client but not yet written to
+    # its transport (or collected by its next long-poll)
+    socket = engineio_socket(sid)
+    if socket is None:
+        return 0
+    try:
+        return socket.queue.qsize()
+    except AttributeError as e:
+        engineio_unavailable(e)
+        return 0
+
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.queued = 0
+        self.lagging_since = None
+        # A delta client that missed a frame needs a keyframe once it recovers
+        self.resync = False
+
+    def to_dict(self):
+        return {
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'queued': self.queued,
+            'lagging_for': round(time.monotonic() - self.lagging_since, 1) if self.lagging_since else 0.0
+        }
+
+
+class Subscription:
+    # A client that asked for a subset of metrics at its own cadence. It
+    # leaves the shared rooms and is sent its frames individually.
+    def __init__(self, metrics, period):
+        self.metrics = metrics
+        self.period = period
+        self.next_send = 0.0
+        self.previous = None
+
+
+class Listener:
+    # A sampler listener and the metric groups it needs collected: None for
+    # all of them, at least every `interval` seconds (None for each
+    # collector's own interval). One that needs none still gets every
+    # sample, holding whatever clients and other listeners caused to be
+    # collected.
+    def __init__(self, callback, metrics=None, interval=None):
+        self.callback = callback
+        self.metrics = None if metrics is None else frozenset(metrics)
+        self.interval = interval
+
+
+class Sampler:
+    def __init__(self, schedule):
+        # The sampler ticks at the fastest collector's interval and only runs
+        # the collectors that are due; the rest are served from cache
+        self.schedule = schedule
+        self.interval = min(schedule.values(), default=MONITOR_INTERVAL)
+        self.clients = {}
+        self.stats = {}
+        self.subscriptions = {}
+        self.listeners = []
+        # Counter readings behind every rate, owned by this sampler alone
+        self.state = CounterState()
+        # Latest v2 snapshot; other schemas are derived from it once per tick
+        self.latest = None
+        self.latest_time = None
+        self.seq = 0
+        self._formatted = {}
+        self._subsets = {}
+        self._previous = {}
+        self._task = None
+        self._active = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._tick = asyncio.Event()
+        self._polled_until = 0.0
+        # Last good value per collector, and calls still running past their deadline
+        self._results = {}
+        self._pending = {}
+        self._stale = set()
+        self._next_due = {}
+        # Set when the latest snapshot only covers what subscribers asked for
+        self._partial = False
+
+    async def add_client(self, sid, protocol='full', schema=1):
+        self.clients[sid] = (schema, protocol)
+        self.stats[sid] = ClientStats()
+        await sio.enter_room(sid, client_room(schema, protocol))
+        if protocol == 'delta':
+            await self.send_keyframe(sid, schema)
+        elif self.latest is not None:
+            await sio.emit(EVENTS[schema]['full'], self.snapshot(schema), room=sid)
+        self.start()
+
+    def snapshot(self, schema=SCHEMA_VERSION):
+        if self.latest is None or schema == SCHEMA_VERSION:
+            return self.latest
+        cached = self._formatted.get(schema)
+        if cached is None or cached[0] != self.seq:
+            cached = (self.seq, format_snapshot_v1(self.latest))
+            self._formatted[schema] = cached
+        return cached[1]
+
+    def snapshot_subset(self, schema, metrics):
+        # Shared by every subscriber with the same schema and metric set
+        key = (schema, metrics)
+        cached = self._subsets.get(key)
+        if cached is None or cached[0] != self.seq:
+            data = {'version': SCHEMA_VERSION, 'timestamp': self.latest['timestamp'], 'seq': self.seq}
+            data.update((name, self.latest[name]) for name in metrics if name in self.latest)
+            data['stale'] = [name for name in self.latest['stale'] if name in metrics]
+            if schema != SCHEMA_VERSION:
+                data = format_snapshot_v1(data)
+            cached = (self.seq, data)
+            self._subsets[key] = cached
+        return cached[1]
+
+    async def send_keyframe(self, room, schema):
+        if self.latest is not None:
+            await sio.emit(EVENTS[schema]['keyframe'], {'seq': self.seq, 'data': self.snapshot(schema)}, room=room)
+
+    async def send_subscribed(self, sid, keyframe=False, lagging=()):
+        schema, protocol = self.clients[sid]
+        sub = self.subscriptions[sid]
+        if self.latest is None:
+            return
+        if sid in lagging:
+            self.stats[sid].dropped += 1
+            sub.previous = None
+            return
+        self.stats[sid].sent += 1
+        data = self.snapshot_subset(schema, sub.metrics)
+        previous, sub.previous = sub.previous, (self.seq, data)
+        if protocol == 'full':
+            await sio.emit(EVENTS[schema]['full'], data, room=sid)
+        elif keyframe or previous is None or self.seq % KEYFRAME_INTERVAL == 0:
+            await sio.emit(EVENTS[schema]['keyframe'], {'seq': self.seq, 'data': data}, room=sid)
+        else:
+            patch = {'seq': self.seq, 'base': previous[0], 'ops': diff_snapshot(previous[1], data)}
+            await sio.emit(EVENTS[schema]['patch'], patch, room=sid)
+
+    async def subscribe(self, sid, metrics, period):
+        # Narrows a client to `metrics` sent at most every `period` seconds;
+        # the set of collectors that run is the union of what clients need
+        schema, protocol = self.clients[sid]
+        sub = self.subscriptions[sid] = Subscription(frozenset(metrics), max(float(period), self.interval))
+        await sio.leave_room(sid, client_room(schema, protocol))
+        if self.latest is not None:
+            # Otherwise the first frame goes out on the next tick
+            await self.send_subscribed(sid, keyframe=True)
+            sub.next_send = asyncio.get_running_loop().time() + sub.period
+        return sub
+
+    async def unsubscribe(self, sid):
+        if self.subscriptions.pop(sid, None) is None:
+            return
+        schema, protocol = self.clients[sid]
+        await sio.enter_room(sid, client_room(schema, protocol))
+        if protocol == 'delta':
+            await self.send_keyframe(sid, schema)
+        elif self.latest is not None:
+            await sio.emit(EVENTS[schema]['full'], self.snapshot(schema), room=sid)
+
+    def remove_client(self, sid):
+        self.clients.pop(sid, None)
+        self.stats.pop(sid, None)
+        self.subscriptions.pop(sid, None)
+        if not self.has_demand():
+            self._active.clear()
+
+    def status(self):
+        return {
+            'interval': self.interval,
+            'seq': self.seq,
+            'clients': len(self.clients),
+            'subscriptions': len(self.subscriptions),
+            'stale': sorted(self._stale),
+            # Collectors still running past their deadline
+            'overrunning': sorted(name for name, future in self._pending.items() if not future.done())
+        }
+
+    def client_summary(self):
+        summary = {}
+        for sid, (schema, protocol) in self.clients.items():
+            entry = {'schema': schema, 'protocol': protocol, **self.stats[sid].to_dict()}
+            sub = self.subscriptions.get(sid)
+            if sub is not None:
+                entry['subscription'] = {'metrics': sorted(sub.metrics), 'interval': sub.period}
+            summary[sid] = entry
+        return summary
+
+    def add_listener(self, callback, metrics=None, interval=None):
+        # Listeners are called with (timestamp, snapshot) after every sample.
+        # The collectors for `metrics` (None for all) keep running for them
+        # at least every `interval` seconds even when no clients are
+        # connected. A listener may be a coroutine function; it is awaited
+        # before the next tick.
+        listener = Listener(callback, metrics, interval)
+        self.listeners.append(listener)
+        if listener.metrics is None or listener.metrics:
+            self.start()
+
+    def listener_demand(self):
+        # Collectors listeners need whether or not anyone is connected, each
+        # at the shortest interval any of them asked for
+        demand = {}
+        for listener in self.listeners:
+            names = self.schedule if listener.metrics is None else listener.metrics
+            for name in names:
+                if name in self.schedule:
+                    interval = max(self.schedule[name], listener.interval or 0.0)
+                    demand[name] = min(demand.get(name, interval), interval)
+        return self.schedule if demand == self.schedule else demand
+
+    def is_watched(self):
+        # Clients or HTTP polls want live samples, not just listeners
+        return bool(self.clients) or time.monotonic() < self._polled_until
+
+    def has_demand(self):
+        return self.is_watched() or bool(self.listener_demand())
+
+    def demand(self):
+        # Collectors anyone needs right now, and how often. HTTP polls and
+        # unsubscribed clients want everything; subscribers and listeners
+        # what they asked for.
+        if len(self.subscriptions) < len(self.clients) or time.monotonic() < self._polled_until:
+            return self.schedule
+        listened = self.listener_demand()
+        if listened is self.schedule:
+            return listened
+        names = set().union(*(sub.metrics for sub in self.subscriptions.values()))
+        demand = dict(listened)
+        demand.update((name, interval) for name, interval in self.schedule.items() if name in names)
+        return demand
+
+    def subscribers_due(self, now):
+        return [sid for sid, sub in self.subscriptions.items() if sub.next_send <= now + self.interval / 2]
+
+    def touch(self):
+        # HTTP endpoints call this so polling alone keeps samples fresh
+        self._polled_until = time.monotonic() + POLL_KEEPALIVE
+        self.start()
+
+    async def wait_for_sample(self, timeout):
+        # Latest v2 snapshot for HTTP consumers. If the sampler was idle and
+        # the snapshot is old, wait (bounded) for the next tick.
+        self.touch()
+        max_age = max(self.schedule.values(), default=self.interval) + COLLECTOR_TIMEOUT
+        if self.latest is None or self._partial or time.time() - self.latest_time > max_age:
+            try:
+                await asyncio.wait_for(self._tick.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.latest
+
+    def start(self):
+        self._active.set()
+        if self.is_watched():
+            # Cut short a sleep that only listeners' background demand set
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def collect(self, name):
+        # Returns (value, stale). A collector that misses its deadline keeps
+        # running in the pool; until it finishes, its last good value is reused
+        # instead of queueing another call behind it.
+        future = self._pending.pop(name, None)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(collector_pool, run_collector, name, self.state)
+        elif not future.done():
+            self._pending[name] = future
+            return self._results.get(name), True
+        try:
+            value, elapsed = await asyncio.wait_for(asyncio.shield(future), COLLECTOR_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning(f"Collector '{name}' exceeded {COLLECTOR_TIMEOUT}s, serving stale data")
+            self._pending[name] = future
+            return self._results.get(name), True
+        except Exception as e:
+            logging.error(f"Collector '{name}' failed: {e}")
+            return self._results.get(name), True
+        instruments.observe(f"collector.{name}", elapsed)
+        self._results[name] = value
+        return value, False
+
+    def due_collectors(self, now, demand):
+        # Allow half a tick of slack so timer jitter doesn't push a collector
+        # to the following tick
+        due = []
+        for name, interval in demand.items():
+            next_due = self._next_due.get(name, now)
+            if next_due > now + interval:
+                # Wanted more often now than when it was last scheduled,
+                # e.g. a client arrived while only history sampled it
+                next_due = now
+            if next_due <= now + self.interval / 2:
+                due.append(name)
+                self._next_due[name] = max(next_due + interval, now)
+        return due
+
+    async def collect_snapshot(self, now=None):
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        demand = self.demand()
+        for name in list(self._next_due):
+            if name not in demand:
+                # Not needed by anyone; run it as soon as it is wanted again
+                del self._next_due[name]
+        self._partial = demand is not self.schedule
+        candidates = demand
+        due = ()
+        if self._partial:
+            # Only collect on ticks where a subscriber is about to be sent it,
+            # so a slow subscriber never gets a value collected ticks earlier
+            due = self.subscribers_due(now)
+            wanted = set().union(*(self.subscriptions[sid].metrics for sid in due))
+            candidates = dict(self.listener_demand())
+            candidates.update((name, interval) for name, interval in demand.items() if name in wanted)
+        names = self.due_collectors(now, candidates)
+        if self._partial and not names and not due:
+            # Nothing new for anyone; listeners would only see repeats
+            return None
+        results = await asyncio.gather(*(self.collect(name) for name in names))
+        for name, (_, is_stale) in zip(names, results):
+            if is_stale:
+                self._stale.add(name)
+            else:
+                self._stale.discard(name)
+        data = {'version': SCHEMA_VERSION, 'timestamp': time.time()}
+        data.update((name, self._results[name]) for name in demand if name in self._results)
+        data['stale'] = sorted(self._stale.intersection(demand))
+        return data
+
+    async def check_backlog(self):
+        # Returns the clients too far behind to be sent this tick. Skipping
+        # them keeps at most MAX_PENDING_FRAMES queued per client, and the
+        # frame they get once they drain is the latest one.
+        lagging = set()
+        stalled = []
+        for sid, stats in self.stats.items():
+            stats.queued = outbound_backlog(sid)
+            if stats.queued < MAX_PENDING_FRAMES:
+                stats.lagging_since = None
+                continue
+            lagging.add(sid)
+            if stats.lagging_since is None:
+                stats.lagging_since = time.monotonic()
+            elif time.monotonic() - stats.lagging_since > STALL_TIMEOUT:
+                stalled.append(sid)
+        for sid in stalled:
+            logging.warning(f"Disconnecting stalled client {sid} "
+                            f"({self.stats[sid].queued} frames queued, {self.stats[sid].dropped} dropped)")
+            socket = engineio_socket(sid)
+            await sio.disconnect(sid)
+            # Its queue will never drain, so don't wait for it to flush
+            if socket is not None:
+                await socket.close(wait=False, abort=True)
+            lagging.discard(sid)
+        return lagging
+
+    async def broadcast(self, now):
+        lagging = await self.check_backlog()
+        for sid in self.subscribers_due(now):
+            sub = self.subscriptions[sid]
+            # Keep to the subscriber's own grid, restarting it after a gap
+            sub.next_send += sub.period
+            if sub.next_send <= now:
+                sub.next_send = now + sub.period
+            await self.send_subscribed(sid, lagging=lagging)
+        shared = {sid: client for sid, client in self.clients.items() if sid not in self.subscriptions}
+        for sid, (schema, protocol) in shared.items():
+            stats = self.stats[sid]
+            if sid in lagging:
+                stats.dropped += 1
+                stats.resync = protocol == 'delta'
+            elif stats.resync:
+                # Caught up after missing patches: resync it on its own
+                await self.send_keyframe(sid, schema)
+                stats.resync = False
+                stats.sent += 1
+                lagging.add(sid)
+            else:
+                stats.sent += 1
+        skip = list(lagging)
+        active = set(shared.values())
+        for schema in SCHEMAS:
+            protocols = {protocol for s, protocol in active if s == schema}
+            if not protocols:
+                self._previous.pop(schema, None)
+                continue
+            data = self.snapshot(schema)
+            previous = self._previous.get(schema)
+            self._previous[schema] = (self.seq, data)
+            events = EVENTS[schema]
+            if 'full' in protocols:
+                await sio.emit(events['full'], data, room=client_room(schema, 'full'), skip_sid=skip)
+            if 'delta' in protocols:
+                room = client_room(schema, 'delta')
+                if previous is None or previous[0] != self.seq - 1 or self.seq % KEYFRAME_INTERVAL == 0:
+                    await sio.emit(events['keyframe'], {'seq': self.seq, 'data': data}, room=room, skip_sid=skip)
+                else:
+                    patch = {'seq': self.seq, 'base': previous[0], 'ops': diff_snapshot(previous[1], data)}
+                    await sio.emit(events['patch'], patch, room=room, skip_sid=skip)
+
+    def set_latest(self, data):
+        self.seq = data['seq']
+        self.latest = data
+        self.latest_time = data['timestamp']
+        tick, self._tick = self._tick, asyncio.Event()
+        tick.set()
+
+    async def notify_listeners(self):
+        for listener in self.listeners:
+            try:
+                result = listener.callback(self.latest_time, self.latest)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Sampler listener error: {e}")
+
+    async def publish_event(self, name, data):
+        # Events that every connected client gets, such as alerts
+        await sio.emit(name, data)
+
+    async def run(self):
+        logging.info(f"Sampler started (tick={self.interval}s, schedule={self.schedule})")
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            if not self.has_demand():
+                self._active.clear()
+                logging.info("No clients connected, sampler idle")
+                await self._active.wait()
+                logging.info("Sampler resumed")
+                next_tick = loop.time()
+                self._next_due.clear()
+            tick_start = time.perf_counter()
+            try:
+                data = await self.collect_snapshot(next_tick)
+                if data is not None:
+                    data['seq'] = self.seq + 1
+                    self.set_latest(data)
+                    with instruments.timer('emit'):
+                        await self.broadcast(next_tick)
+            except Exception as e:
+                logging.error(f"Error in sampler: {e}")
+                data = None
+            instruments.observe('tick', (time.perf_counter() - tick_start) * 1000.0)
+            instruments.observe('clients', len(self.clients), COUNT_BUCKETS)
+            if data is not None:
+                await self.notify_listeners()
+            # Schedule against the tick grid so collection time doesn't add drift
+            next_tick = max(next_tick + self.interval, loop.time())
+            if not self.is_watched() and self._next_due:
+                # Only listeners' background demand: sleep until a collector
+                # is due, unless a client or HTTP poll arrives first
+                next_tick = max(next_tick, min(self._next_due.values()) - self.interval / 2)
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), next_tick - loop.time())
+                    next_tick = loop.time()
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.sleep(next_tick - loop.time())
+
+
+# Multi-worker mode: one process samples and publishes into a shared memory
+# segment, worker processes serve clients from it. Workers poll the segment
+# this often, and their demand lapses this long after they stop renewing it.
+SEGMENT_POLL_INTERVAL = 0.05
+DEMAND_TTL = 2.0
+# Seconds between refreshes of the sampler process's own instrumentation
+INTERNAL_REFRESH = 5.0
+
+
+class PublishingSampler(Sampler):
+    # The sampler process in multi-worker mode. It has no clients of its
+    # own; each sample is published with recent events and alert state for
+    # the workers to fan out.
+    def __init__(self, schedule, segment, recent_events=64):
+        super().__init__(schedule)
+        self.segment = segment
+        self.events = deque(maxlen=recent_events)
+        self._event_id = 0
+        self._internal = None
+        self._internal_time = 0.0
+
+    def is_watched(self):
+        return time.time() < self.segment.demand_until()
+
+    def demand(self):
+        # Workers narrow per client, so every collector runs here while any
+        # worker has demand; otherwise only what listeners need
+        if time.time() < self.segment.demand_until():
+            return self.schedule
+        return self.listener_demand()
+
+    def publish(self):
+        if time.monotonic() - self._internal_time >= INTERNAL_REFRESH:
+            self._internal = {**instruments.to_dict(), 'sampler': self.status()}
+            self._internal_time = time.monotonic()
+        message = {
+            'sample': self.latest,
+            'events': list(self.events),
+            'alerts': alert_state(),
+            'internal': self._internal
+        }
+        try:
+            self.segment.publish(json.dumps(message, separators=(',', ':')).encode('utf-8'))
+        except SegmentFull as e:
+            logging.error(f"Sample not published: {e}")
+
+    async def broadcast(self, now):
+        self.publish()
+
+    async def publish_event(self, name, data):
+        self._event_id += 1
+        self.events.append([self._event_id, name, data])
+        self.publish()
+
+
+class SharedSampler(Sampler):
+    # A serving worker in multi-worker mode. Samples are read from the shared
+    # segment instead of collected; rooms, subscriptions, backlog checks and
+    # deltas work as they do in a single process.
+    def __init__(self, schedule, segment, worker):
+        super().__init__(schedule)
+        self.segment = segment
+        self.worker = worker
+        self.alerts = {'active': [], 'recent': []}
+        self.internal = None
+        self._segment_seq = 0
+        self._event_id = None
+        self._parent = os.getppid()
+
+    def has_demand(self):
+        # Listeners here only mirror samples (the history ring), so they
+        # don't keep the sampler process collecting
+        return bool(self.clients) or time.monotonic() < self._polled_until
+
+    def status(self):
+        status = super().status()
+        status['worker'] = self.worker
+        status['stale'] = self.latest['stale'] if self.latest is not None else []
+        return status
+
+    async def receive(self, message, now):
+        events = message['events']
+        if self._event_id is None:
+            # Events published before this worker started are not replayed
+            self._event_id = events[-1][0] if events else 0
+        for event_id, name, data in events:
+            if event_id > self._event_id:
+                self._event_id = event_id
+                await sio.emit(name, data)
+        self.alerts = message['alerts']
+        self.internal = message['internal']
+        data = message['sample']
+        if data is None or data['seq'] == self.seq:
+            return
+        self.set_latest(data)
+        with instruments.timer('emit'):
+            await self.broadcast(now)
+        instruments.observe('clients', len(self.clients), COUNT_BUCKETS)
+        await self.notify_listeners()
+
+    async def run(self):
+        logging.info(f"Worker {self.worker} reading samples from shared memory segment {self.segment.name}")
+        loop = asyncio.get_running_loop()
+        poll = min(SEGMENT_POLL_INTERVAL, self.interval / 4)
+        while True:
+            if os.getppid() != self._parent:
+                logging.error(f"Sampler process exited, stopping worker {self.worker}")
+                signal.raise_signal(signal.SIGINT)
+                return
+            self.segment.set_demand(self.worker, time.time() + DEMAND_TTL if self.has_demand() else 0.0)
+            self._segment_seq, payload = self.segment.read(self._segment_seq)
+            if payload is not None:
+                try:
+                    await self.receive(json.loads(payload), loop.time())
+                except Exception as e:
+                    logging.error(f"Error in worker {self.worker}: {e}")
+            await asyncio.sleep(poll)
+
+
+class ReplaySampler(Sampler):
+    # Serves a recording instead of running collectors. Samples go through
+    # the same rooms, subscriptions, deltas and listeners as live ones,
+    # paced by their recorded timestamps divided by `speed`; a speed of 0
+    # sends them as fast as the emit path takes them.
+    def __init__(self, reader, speed=1.0, loop=False, start=None, retime=True):
+        schedule = reader.header.get('schedule') or METRIC_SCHEDULE
+        super().__init__({name: float(interval) for name, interval in schedule.items()})
+        self.reader = reader
+        self.speed = max(0.0, float(speed))
+        self.loop = loop
+        self.start_at = start
+        self.retime = retime
+        self.replayed = 0
+        self.passes = 0
+        self.position = None
+        self.finished = False
+        # Longer gaps, where the recording sampler sat idle or between two
+        # sessions appended to one file, are shortened to this
+        self.max_gap = self.interval * 2
+
+    def demand(self):
+        return self.schedule
+
+    def status(self):
+        status = super().status()
+        status['replay'] = {
+            'file': self.reader.path,
+            'speed': self.speed,
+            'replayed': self.replayed,
+            'passes': self.passes,
+            'position': self.position,
+            'finished': self.finished
+        }
+        return status
+
+    def start(self):
+        if not self.finished:
+            super().start()
+
+    async def wait_for_sample(self, timeout):
+        if self.finished:
+            return self.latest
+        return await super().wait_for_sample(timeout)
+
+    async def run(self):
+        logging.info(f"Replaying {self.reader.path} at {self.speed or 'max'} speed")
+        loop = asyncio.get_running_loop()
+        while True:
+            previous = None
+            next_tick = loop.time()
+            for ts, data in self.reader.samples(self.start_at):
+                if not self.has_demand():
+                    self._active.clear()
+                    logging.info("No clients connected, replay paused")
+                    await self._active.wait()
+                    logging.info("Replay resumed")
+                    next_tick = loop.time()
+                if self.speed and previous is not None:
+                    next_tick += min(max(ts - previous, 0.0), self.max_gap) / self.speed
+                    await asyncio.sleep(next_tick - loop.time())
+                    next_tick = max(next_tick, loop.time())
+                else:
+                    # Still yield, so clients and HTTP requests are served
+                    await asyncio.sleep(0)
+                previous = ts
+                self.position = ts
+                tick_start = time.perf_counter()
+                try:
+                    # Our own seq, so delta clients see an unbroken sequence
+                    # across loops and appended sessions
+                    data = {**data, 'seq': self.seq + 1}
+                    if self.retime:
+                        data['timestamp'] = time.time()
+                    self.set_latest(data)
+                    with instruments.timer('emit'):
+                        await self.broadcast(loop.time())
+                except Exception as e:
+                    logging.error(f"Error in replay: {e}")
+                instruments.observe('tick', (time.perf_counter() - tick_start) * 1000.0)
+                instruments.observe('clients', len(self.clients), COUNT_BUCKETS)
+                self.replayed += 1
+                await self.notify_listeners()
+            self.passes += 1
+            if not self.loop or previous is None:
+                break
+        self.finished = True
+        logging.info(f"Replay of {self.reader.path} finished after {self.replayed} samples, serving the last one")
+
+
+def create_sampler():
+    replay = config['replay']
+    if not replay['file']:
+        return Sampler(METRIC_SCHEDULE)
+    try:
+        reader = SampleReader(replay['file'])
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot replay {replay['file']}: {e}")
+        exit(1)
+    return ReplaySampler(reader, speed=replay['speed'], loop=replay['loop'], start=replay['start'],
+                         retime=replay['retime'])
+
+
+sampler = create_sampler()
+
+
+# Metric history: recent samples in memory, everything else in SQLite
+HISTORY_FLUSH_INTERVAL = float(config['history']['flush_interval'])
+HISTORY_PRUNE_INTERVAL = 3600
+history = None
+# One thread owns the SQLite connection so writes and queries never interleave
+history_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history')
+
+
+async def history_writer():
+    loop = asyncio.get_running_loop()
+    last_prune = 0
     while True:
+        await asyncio.sleep(HISTORY_FLUSH_INTERVAL)
         try:
-            data = {
-                'cpu': get_cpu_info(),
-                'memory': get_memory_info(),
-                'disk': get_disk_info(),
-                'network': get_network_info(),
-                'temperature': get_temperature_info(),
-                'system_time': get_system_time_info()
-            }
-            await sio.emit('system_update', data, room=sid)
-            await asyncio.sleep(MONITOR_INTERVAL)
+            await loop.run_in_executor(history_pool, history.flush, history.take_pending())
+            if time.time() - last_prune >= HISTORY_PRUNE_INTERVAL:
+                await loop.run_in_executor(history_pool, history.prune)
+                last_prune = time.time()
         except Exception as e:
-            logging.error(f"Error in background monitor: {e}")
+            logging.error(f"History write error: {e}")
+
+
+async def start_history(app):
+    global history
+    if not config['history']['enabled']:
+        return
+    db_path = Path(config['history']['db_path'])
+    if isinstance(sampler, ReplaySampler):
+        # Replayed samples and their alert events must not mix into the live
+        # host's history and rollups; they get a database of their own that
+        # is deleted on shutdown
+        app['history_scratch'] = tempfile.TemporaryDirectory(prefix='monitor-replay-')
+        db_path = Path(app['history_scratch'].name) / db_path.name
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    history = HistoryStore(
+        str(db_path),
+        memory_samples=config['history']['memory_samples'],
+        retention=config['history']['retention'],
+        sample_interval=sampler.interval,
+        # Workers only query; the sampler process owns the database
+        readonly=WORKER_INDEX is not None
+    )
+    # Records whatever is collected for clients and other listeners, and
+    # with nobody connected samples every collector this often (0: never)
+    background = float(config['history']['background_interval'])
+    sampler.add_listener(history.append, metrics=None if background > 0 else (), interval=background)
+    if history.readonly:
+        return
+    logging.info(f"Recording metric history to {db_path}")
+    app['history_writer'] = asyncio.create_task(history_writer())
+
+
+async def stop_history(app):
+    if history is None:
+        return
+    loop = asyncio.get_running_loop()
+    if history.readonly:
+        await loop.run_in_executor(history_pool, history.close)
+        return
+    app['history_writer'].cancel()
+    await loop.run_in_executor(history_pool, history.flush, history.take_pending())
+    await loop.run_in_executor(history_pool, history.close)
+    if 'history_scratch' in app:
+        app['history_scratch'].cleanup()
+
+
+app.on_startup.append(start_history)
+app.on_cleanup.append(stop_history)
+
+
+# Sample recording: every snapshot the sampler produces is appended to
+# recording.file, to be served again later with replay.file
+recorder = None
+
+
+async def start_recording(app):
+    global recorder
+    path = config['recording']['file']
+    if not path or WORKER_INDEX is not None:
+        return
+    if isinstance(sampler, ReplaySampler):
+        # Re-recording a replay would pass replayed samples off as this host's
+        logging.warning(f"Not recording samples to {path} while replaying {sampler.reader.path}")
+        return
+    header = {
+        'host': platform.node(),
+        'created': time.time(),
+        'interval': sampler.interval,
+        'schedule': sampler.schedule
+    }
+    try:
+        recorder = SampleRecorder(path, keyframe_interval=config['recording']['keyframe_interval'], header=header)
+    except (OSError, ValueError) as e:
+        logging.error(f"Not recording samples: {e}")
+        return
+    logging.info(f"Recording samples to {path}")
+    sampler.add_listener(recorder.on_sample)
+
+
+async def stop_recording(app):
+    if recorder is not None:
+        recorder.close()
+
+
+app.on_startup.append(start_recording)
+app.on_cleanup.append(stop_recording)
+
+
+# Streaming quantile sketches and EWMAs of every flattened metric, rolled
+# per window, for long-range percentiles without keeping raw samples
+sketch_store = None
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def record_sketches(ts, data):
+    sketch_store.add(ts, flatten_snapshot(data))
+
+
+async def start_sketches(app):
+    global sketch_store
+    settings = config['sketches']
+    if not settings['enabled']:
+        return
+    try:
+        sketch_store = SketchStore(
+            [(parse_duration(step), int(keep)) for step, keep in settings['windows']],
+            relative_accuracy=float(settings['relative_accuracy']),
+            max_bins=int(settings['max_bins']),
+            halflives=[parse_duration(h) for h in settings['ewma']],
+            metrics=settings['metrics'],
+            max_series=int(settings['max_series'])
+        )
+    except (TypeError, ValueError) as e:
+        logging.error(f"Invalid sketches configuration: {e}")
+        return
+    sampler.add_listener(record_sketches, metrics=())
+
+
+app.on_startup.append(start_sketches)
+
+
+def quantile_query(patterns, quantiles, seconds, include_sketch=False):
+    # Shared by /api/quantiles and the 'quantiles' Socket.IO event; raises
+    # ValueError on bad arguments
+    seconds = parse_duration(seconds)
+    if not seconds > 0:
+        raise ValueError("range must be positive")
+    quantiles = [float(q) for q in quantiles]
+    if not all(0 <= q <= 1 for q in quantiles):
+        raise ValueError("quantiles must be between 0 and 1")
+    now = time.time()
+    ewma_names = [str(h) for h in config['sketches']['ewma']]
+    series = {}
+    for metric in match_metrics(patterns, sketch_store.metrics()):
+        sketch, step, since = sketch_store.window(metric, seconds, now)
+        if sketch is None:
+            continue
+        entry = {'resolution': step, 'since': since, **sketch.summary(quantiles)}
+        entry['ewma'] = dict(zip(ewma_names, sketch_store.ewma(metric)))
+        if include_sketch:
+            entry['sketch'] = sketch.to_dict()
+        series[metric] = entry
+    return {'range': seconds, 'series': series}
+
+
+# On-demand burst sampling: raw CPU, disk and network counters many times a
+# second for a bounded window, streamed to the 'burst' room as envelopes
+burst_sampler = None
+burst_stream = None
+BURST_ROOM = 'burst'
+BURST_EMIT_INTERVAL = 1.0
+_burst_disks = {}
+
+
+def read_burst_cpu():
+    # Busy and total CPU seconds per core, counted as in cpu_time_deltas()
+    times = np.array(cpu_times_percpu(), dtype=np.float64)
+    total = times[:, _CPU_TOTAL_COLUMNS].sum(axis=1)
+    return total - times[:, _CPU_IDLE_COLUMNS].sum(axis=1), total
+
+
+def _whole_disk(device):
+    # Partitions would count their disk's I/O twice; on Linux only whole
+    # disks are listed in /sys/block
+    included = _burst_disks.get(device)
+    if included is None:
+        included = _burst_disks[device] = (
+            not any(fnmatch(device, pattern) for pattern in DISK_IO_EXCLUDE)
+            and (not os.path.isdir('/sys/block') or os.path.exists(f"/sys/block/{device.replace('/', '!')}")))
+    return included
+
+
+def read_burst_disk():
+    totals = [0, 0, 0, 0]
+    for device, c in disk_io_counters().items():
+        if _whole_disk(device):
+            totals[0] += c.read_bytes
+            totals[1] += c.write_bytes
+            totals[2] += c.read_count
+            totals[3] += c.write_count
+    return totals
+
+
+def read_burst_network():
+    current, _ = net_io_counters()
+    return current.bytes_sent, current.bytes_recv
+
+
+async def start_burst(app):
+    global burst_sampler
+    settings = config['burst']
+    if not settings['enabled']:
+        return
+    if isinstance(sampler, ReplaySampler):
+        # Bursts read the live host, which a replay isn't showing
+        logging.info("Burst sampling is disabled while replaying")
+        return
+    try:
+        burst_sampler = BurstSampler(
+            read_burst_cpu, read_burst_disk, read_burst_network,
+            max_duration=parse_duration(settings['max_duration']),
+            max_rate=float(settings['max_rate']),
+            max_overhead=float(settings['max_overhead']),
+            per_core=CPU_PER_CORE
+        )
+    except (TypeError, ValueError) as e:
+        logging.error(f"Invalid burst configuration: {e}")
+
+
+async def stop_burst(app):
+    if burst_sampler is not None:
+        await asyncio.get_running_loop().run_in_executor(None, burst_sampler.stop)
+    if burst_stream is not None:
+        await burst_stream
+
+
+app.on_startup.append(start_burst)
+app.on_cleanup.append(stop_burst)
+
+
+async def stream_burst(burst_id):
+    # Every BURST_EMIT_INTERVAL, the buckets that are complete go out as a
+    # 'burst_data' envelope; once sampling ends, the rest and a summary
+    step = parse_duration(config['burst']['resolution'])
+    row = 0
+    while True:
+        running = burst_sampler.running
+        envelope, row = burst_sampler.envelope(row, step, final=not running)
+        if envelope is not None:
+            await sio.emit('burst_data', envelope, room=BURST_ROOM)
+        if not running:
             break
+        await asyncio.sleep(BURST_EMIT_INTERVAL)
+    status = burst_sampler.status()
+    logging.info(f"Burst {burst_id} {status['state']}: {status['samples']} samples at {status['achieved_rate']} Hz, "
+                 f"{status['overhead']:.2%} of a core, {status['throttled']} throttled")
+    await sio.emit('burst_complete', status, room=BURST_ROOM)
+
+
+async def start_burst_window(duration=None, rate=None):
+    # Shared by POST /api/burst and the 'burst' Socket.IO event; raises
+    # ValueError on bad arguments and RuntimeError while a burst is running
+    global burst_stream
+    settings = config['burst']
+    duration = parse_duration(settings['duration'] if duration is None else duration)
+    rate = float(settings['rate'] if rate is None else rate)
+    if burst_stream is not None and not burst_stream.done():
+        # The last burst ended less than BURST_EMIT_INTERVAL ago; let its
+        # final envelope go out before the ring is reused
+        await burst_stream
+    burst_id = burst_sampler.start(duration, rate)
+    logging.info(f"Burst {burst_id} started: {duration:g}s at {rate:g} Hz")
+    burst_stream = asyncio.create_task(stream_burst(burst_id))
+    return burst_sampler.status()
+
+
+# Alert rules, evaluated against every sample. Only state changes (firing,
+# resolved) are emitted as 'alert' events and recorded in history.
+alert_engine = AlertEngine.from_config(config['alerts']['rules'],
+                                       missing_after=parse_duration(config['alerts']['missing_after']))
+
+
+async def evaluate_alerts(ts, data):
+    flat = flatten_snapshot(data)
+    if data.get('stale'):
+        # A stale collector's cached values count as missing
+        stale = set(data['stale'])
+        flat = {name: value for name, value in flat.items() if name.split('.', 1)[0] not in stale}
+    events = alert_engine.evaluate(ts, flat)
+    if not events:
+        return
+    for event in events:
+        logging.warning(f"Alert {event['state']}: {event['rule']} on {event['series']} "
+                        f"(value={event['value']}, threshold={event['threshold']})")
+        await sampler.publish_event('alert', event)
+    if history is not None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(history_pool, history.record_events, events)
+
+
+def alert_state():
+    if isinstance(sampler, SharedSampler):
+        # Evaluated in the sampler process and published with each sample
+        return sampler.alerts
+    return {'active': alert_engine.active(), 'recent': list(alert_engine.recent)}
+
+
+async def start_alerts(app):
+    if alert_engine.rules and WORKER_INDEX is None:
+        logging.info(f"Evaluating {len(alert_engine.rules)} alert rules")
+        sampler.add_listener(evaluate_alerts, metrics=alert_engine.groups(sampler.schedule))
+
+
+app.on_startup.append(start_alerts)
+
+
+async def start_loop_lag(app):
+    app['loop_lag'] = asyncio.create_task(
+        watch_loop_lag(instruments, float(config['instrumentation']['loop_lag_interval'])))
+
+
+async def stop_loop_lag(app):
+    app['loop_lag'].cancel()
+
+
+app.on_startup.append(start_loop_lag)
+app.on_cleanup.append(stop_loop_lag)
+
+
+# Fleet mode: 'standalone' (default), 'agent' streams samples to a hub, and
+# 'hub' also accepts agents and fans their samples out to Socket.IO rooms
+FLEET_MODE = config['fleet']['mode']
+fleet_hub = FleetHub(sio, token=config['fleet']['token']) if FLEET_MODE == 'hub' else None
+
+# Serving processes sharing the listening ports; with more than one, this
+# process only samples. WORKER_INDEX is set inside each worker.
+WORKERS = max(1, int(config['server']['workers']))
+if WORKERS > 1 and FLEET_MODE != 'standalone':
+    logging.warning(f"server.workers is not supported in fleet {FLEET_MODE} mode, using 1")
+    WORKERS = 1
+if WORKERS > 1 and isinstance(sampler, ReplaySampler):
+    logging.warning("server.workers is not supported when replaying, using 1")
+    WORKERS = 1
+WORKER_INDEX = None
+WORKER_RESTART_DELAY = 2.0
 
 
 # Routes
+index_page = TemplatePage(env, 'index.html', assets, internals_panel=config['instrumentation']['panel'],
+                          cgroups_panel='cgroups' in METRIC_SCHEDULE)
+
+
 async def index(request):
-    template = env.get_template('index.html')
-    html = template.render()
-    return web.Response(text=html, content_type='text/html')
+    return conditional_response(request, index_page.get(), 'text/html; charset=utf-8')
 
 
-async def api_system_info(request):
-    try:
-        import platform
-        info = {
+_static_info = None
+
+
+def get_static_info():
+    # Platform details don't change while the server runs; gather them once
+    global _static_info
+    if _static_info is None:
+        _static_info = {
             'os': f"{platform.system()} {platform.release()}",
             'hostname': platform.node(),
             'cpu_model': platform.processor(),
@@ -246,84 +1876,575 @@ async def api_system_info(request):
             'physical_cores': psutil.cpu_count(logical=False),
             'python_version': platform.python_version()
         }
-        return web.json_response(info)
+    return _static_info
+
+
+async def api_system_info(request):
+    try:
+        return web.json_response(get_static_info())
     except Exception as e:
         logging.error(f"Static info error: {e}")
         return web.json_response({'error': str(e)}, status=500)
 
 
+class SampleCache:
+    # Encoded response bodies, built on first use and reused until the next
+    # sample, so any number of pollers cost one encoding per tick at most
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, seq, build):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != seq:
+            entry = (seq, build())
+            self._entries[key] = entry
+        return entry[1]
+
+
+sample_cache = SampleCache()
+# Distinguishes sequence numbers across restarts so old ETags never match
+SAMPLER_EPOCH = f"{int(time.time()):x}"
+
+
+def _encode_snapshot(data, seq, schema):
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return encode_body(body, f'"{SAMPLER_EPOCH}-{seq}-v{schema}"', compresslevel=6)
+
+
+async def serve_snapshot(request, schema):
+    latest = await sampler.wait_for_sample(COLLECTOR_TIMEOUT + sampler.interval)
+    if latest is None:
+        return web.json_response({'error': 'No sample collected yet'}, status=503)
+    try:
+        entry = sample_cache.get(('snapshot', schema), latest['seq'],
+                                 lambda: _encode_snapshot(sampler.snapshot(schema), latest['seq'], schema))
+    except Exception as e:
+        logging.error(f"Snapshot encoding error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+    return conditional_response(request, entry, 'application/json')
+
+
+async def api_snapshot(request):
+    return await serve_snapshot(request, 1)
+
+
+async def api_metrics_v2(request):
+    return await serve_snapshot(request, SCHEMA_VERSION)
+
+
+async def prometheus_metrics(request):
+    # Rendered at most once per sample, however many scrapers ask
+    data = await sampler.wait_for_sample(COLLECTOR_TIMEOUT + sampler.interval)
+    if data is None:
+        return web.Response(status=503, text='No sample collected yet\n')
+    try:
+        body = sample_cache.get('prometheus', data['seq'], lambda: prometheus.render_metrics(data))
+    except Exception as e:
+        logging.error(f"Metrics rendering error: {e}")
+        return web.Response(status=500, text=f"{e}\n")
+    return web.Response(body=body, headers={'Content-Type': prometheus.CONTENT_TYPE})
+
+
+async def api_history(request):
+    if history is None:
+        return web.json_response({'error': 'History is disabled'}, status=404)
+    metrics = request.query.getall('metric', [])
+    if not metrics:
+        return web.json_response({'metrics': history.metrics()})
+    try:
+        now = time.time()
+        end = float(request.query.get('end', now))
+        start = float(request.query.get('start', end - float(request.query.get('range', 3600))))
+        max_points = min(int(request.query.get('points', 500)), int(config['history']['max_points']))
+    except ValueError as e:
+        return web.json_response({'error': f"Invalid query parameter: {e}"}, status=400)
+    step = history.choose_resolution(start, end, max_points, now)
+    loop = asyncio.get_running_loop()
+    series = {}
+    try:
+        for metric in metrics:
+            if step == 0:
+                # Serve raw points from memory and only go to disk for the older part
+                points = history.query_memory(metric, start, end)
+                oldest = history.oldest_in_memory()
+                if oldest is None or oldest > start:
+                    older = await loop.run_in_executor(
+                        history_pool, history.query_db, metric, start, min(end, oldest or end), step)
+                    points = [p for p in older if oldest is None or p[0] < oldest] + points
+            else:
+                points = await loop.run_in_executor(history_pool, history.query_db, metric, start, end, step)
+            series[metric] = points
+    except Exception as e:
+        logging.error(f"History query error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+    return web.json_response({'start': start, 'end': end, 'resolution': step, 'series': series})
+
+
+def match_metrics(patterns, known):
+    # Shell-style patterns are matched against `known`; exact names are kept
+    # even if `known` lacks them
+    metrics = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            names = [name for name in known if fnmatch(name, pattern)]
+        else:
+            names = [pattern]
+        metrics.extend(name for name in names if name not in metrics)
+    return metrics
+
+
+# Rows fetched from the database per chunk written to an export response
+EXPORT_BATCH_ROWS = 1000
+
+
+async def api_history_export(request):
+    # Streams every stored sample for a time range, one row per timestamp
+    # and one column per metric, without building the result in memory
+    if history is None:
+        return web.json_response({'error': 'History is disabled'}, status=404)
+    encoder_class = export.FORMATS.get(request.query.get('format', 'ndjson'))
+    if encoder_class is None:
+        return web.json_response({'error': f"format must be one of {', '.join(export.FORMATS)}"}, status=400)
+    try:
+        end = float(request.query.get('end', time.time()))
+        start = float(request.query.get('start', end - float(request.query.get('range', 3600))))
+        step = int(request.query.get('resolution', 0))
+    except ValueError as e:
+        return web.json_response({'error': f"Invalid query parameter: {e}"}, status=400)
+    if step != 0 and step not in ROLLUPS:
+        return web.json_response({'error': f"resolution must be 0 (raw) or one of {sorted(ROLLUPS)}"}, status=400)
+    # Without any metric parameter, every metric is exported
+    metrics = match_metrics(request.query.getall('metric', ['*']), history.metrics())
+    if not metrics:
+        return web.json_response({'error': 'No metrics match'}, status=400)
+
+    loop = asyncio.get_running_loop()
+    rows = HistoryExport(history, metrics, start, end, step)
+    try:
+        await loop.run_in_executor(history_pool, rows.open)
+        count = await loop.run_in_executor(history_pool, rows.count) if encoder_class.needs_count else None
+    except Exception as e:
+        await loop.run_in_executor(history_pool, rows.close)
+        logging.error(f"History export error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+    encoder = encoder_class(metrics, count)
+    response = web.StreamResponse(headers={
+        'Content-Type': encoder.content_type,
+        'Content-Disposition': f'attachment; filename="history-{int(start)}-{int(end)}.{encoder.extension}"'
+    })
+    if count is not None:
+        response.content_length = encoder.content_length()
+    else:
+        response.enable_chunked_encoding()
+    try:
+        await response.prepare(request)
+        await response.write(encoder.header())
+        while True:
+            batch = await loop.run_in_executor(history_pool, rows.fetch, EXPORT_BATCH_ROWS)
+            if not batch:
+                break
+            # Waits for the client to drain, so a slow reader holds one batch
+            await response.write(encoder.encode(batch))
+        await response.write_eof()
+    except ConnectionError:
+        # Client went away mid-export
+        pass
+    finally:
+        await loop.run_in_executor(history_pool, rows.close)
+    return response
+
+
+async def api_quantiles(request):
+    if sketch_store is None:
+        return web.json_response({'error': 'Sketches are disabled'}, status=404)
+    patterns = request.query.getall('metric', [])
+    if not patterns:
+        return web.json_response({'metrics': sketch_store.metrics()})
+    try:
+        quantiles = request.query['q'].split(',') if 'q' in request.query else DEFAULT_QUANTILES
+        result = quantile_query(patterns, quantiles, request.query.get('range', 3600),
+                                request.query.get('sketch') in ('1', 'true'))
+    except ValueError as e:
+        return web.json_response({'error': f"Invalid query parameter: {e}"}, status=400)
+    return web.json_response(result)
+
+
+BURST_MAX_POINTS = 10000
+
+
+async def api_burst(request):
+    # The current or last burst, downsampled to ?points= buckets over its window
+    if burst_sampler is None:
+        return web.json_response({'error': 'Burst sampling is disabled'}, status=404)
+    try:
+        points = int(request.query.get('points', 300))
+        if not 0 < points <= BURST_MAX_POINTS:
+            raise ValueError(f"points must be between 1 and {BURST_MAX_POINTS}")
+    except ValueError as e:
+        return web.json_response({'error': f"Invalid query parameter: {e}"}, status=400)
+    result = {'burst': burst_sampler.status()}
+    if burst_sampler.burst is not None:
+        result['envelope'], _ = burst_sampler.envelope(0, burst_sampler.burst['duration'] / points)
+    return web.json_response(result)
+
+
+async def api_burst_start(request):
+    # Parameters as a JSON body or in the query string
+    if burst_sampler is None:
+        return web.json_response({'error': 'Burst sampling is disabled'}, status=404)
+    params = dict(request.query)
+    if request.body_exists:
+        try:
+            body = await request.json()
+        except ValueError as e:
+            return web.json_response({'error': f"Invalid JSON body: {e}"}, status=400)
+        if isinstance(body, dict):
+            params.update(body)
+    if burst_sampler.running:
+        return web.json_response({'error': 'A burst is already running', 'burst': burst_sampler.status()},
+                                 status=409)
+    try:
+        status = await start_burst_window(params.get('duration'), params.get('rate'))
+    except (TypeError, ValueError) as e:
+        return web.json_response({'error': f"Invalid burst parameter: {e}"}, status=400)
+    except RuntimeError as e:
+        return web.json_response({'error': str(e), 'burst': burst_sampler.status()}, status=409)
+    return web.json_response({'burst': status})
+
+
+async def api_burst_stop(request):
+    if burst_sampler is None:
+        return web.json_response({'error': 'Burst sampling is disabled'}, status=404)
+    # Waits at most for the read in progress, off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, burst_sampler.stop)
+    return web.json_response({'burst': burst_sampler.status()})
+
+
+async def api_alerts(request):
+    result = {'rules': [rule.to_dict() for rule in alert_engine.rules], **alert_state()}
+    if 'start' in request.query or 'range' in request.query:
+        # Older transitions come from the history database
+        if history is None:
+            return web.json_response({'error': 'History is disabled'}, status=404)
+        try:
+            end = float(request.query.get('end', time.time()))
+            start = float(request.query.get('start', end - float(request.query.get('range', 86400))))
+        except ValueError as e:
+            return web.json_response({'error': f"Invalid query parameter: {e}"}, status=400)
+        loop = asyncio.get_running_loop()
+        result['events'] = await loop.run_in_executor(history_pool, history.query_events, start, end)
+    return web.json_response(result)
+
+
+async def api_fleet(request):
+    if fleet_hub is None:
+        return web.json_response({'error': 'Not running in hub mode'}, status=404)
+    return web.json_response(fleet_hub.summary())
+
+
+async def api_internal(request):
+    # Self-instrumentation: where the monitor's own time goes. Durations in ms.
+    stats = instruments.to_dict()
+    stats['sampler'] = sampler.status()
+    if isinstance(sampler, SharedSampler):
+        # Collector timings live in the sampler process; refreshed every few seconds
+        stats['sampler_process'] = sampler.internal
+    return web.json_response(stats)
+
+
+async def api_clients(request):
+    # Per-connection delivery stats: frames sent, frames dropped while the
+    # client was behind, and what is still queued for it
+    return web.json_response({
+        'max_pending_frames': MAX_PENDING_FRAMES,
+        'stall_timeout': STALL_TIMEOUT,
+        'clients': sampler.client_summary()
+    })
+
+
 # Socket events
 @sio.event
-async def connect(sid, environ):
-    logging.info(f'Client connected: {sid}')
-    asyncio.create_task(background_monitor(sid))
-    await sio.emit('connection_ack', {'message': 'Connected'}, room=sid)
+async def connect(sid, environ, auth=None):
+    auth = auth if isinstance(auth, dict) else {}
+    protocol = auth.get('protocol', 'full')
+    if protocol not in PROTOCOLS:
+        protocol = 'full'
+    try:
+        schema = int(auth.get('schema', 1))
+    except (TypeError, ValueError):
+        schema = 1
+    if schema not in SCHEMAS:
+        schema = 1
+    logging.info(f'Client connected: {sid} (schema={schema}, protocol={protocol})')
+    await sio.emit('connection_ack', {'message': 'Connected', 'schema': schema, 'protocol': protocol}, room=sid)
+    await sampler.add_client(sid, protocol, schema)
+
+
+@sio.event
+async def request_keyframe(sid):
+    # Sent by delta clients that missed a patch and need to resync
+    if sid in sampler.subscriptions:
+        await sampler.send_subscribed(sid, keyframe=True)
+    elif sid in sampler.clients:
+        schema, _ = sampler.clients[sid]
+        await sampler.send_keyframe(sid, schema)
+
+
+@sio.event
+async def subscribe(sid, data):
+    # {'metrics': ['cpu', 'memory'], 'interval': 5}: only these metric groups,
+    # at most once per interval seconds
+    if sid not in sampler.clients or not isinstance(data, dict):
+        return {'error': 'Invalid subscription'}
+    metrics = data.get('metrics', list(sampler.schedule))
+    if isinstance(metrics, str) or not isinstance(metrics, list):
+        return {'error': 'metrics must be a list'}
+    unknown = [name for name in metrics if name not in sampler.schedule]
+    if unknown:
+        return {'error': f"Unknown or disabled metrics: {', '.join(map(str, unknown))}"}
+    try:
+        period = float(data.get('interval', sampler.interval))
+    except (TypeError, ValueError):
+        return {'error': 'interval must be a number'}
+    if not 0 <= period < float('inf'):
+        return {'error': 'interval must be a non-negative number'}
+    sub = await sampler.subscribe(sid, metrics, period)
+    logging.info(f"Client {sid} subscribed to {sorted(sub.metrics)} every {sub.period}s")
+    return {'ok': True, 'metrics': sorted(sub.metrics), 'interval': sub.period}
+
+
+@sio.event
+async def quantiles(sid, data):
+    # {'metrics': ['cpu.percent'], 'q': [0.5, 0.99], 'range': '24h'}; the
+    # answer is the acknowledgement
+    if sketch_store is None:
+        return {'error': 'Sketches are disabled'}
+    if not isinstance(data, dict) or not isinstance(data.get('metrics'), list):
+        return {'error': 'metrics must be a list'}
+    try:
+        return quantile_query([str(m) for m in data['metrics']], data.get('q', DEFAULT_QUANTILES),
+                              data.get('range', 3600), bool(data.get('sketch')))
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}
+
+
+@sio.event
+async def burst(sid, data=None):
+    # {'duration': 30, 'rate': 20}: starts a burst, or joins the one running,
+    # and puts the client in the room its envelopes are streamed to
+    if burst_sampler is None:
+        return {'error': 'Burst sampling is disabled'}
+    data = data if isinstance(data, dict) else {}
+    if burst_sampler.running:
+        await sio.enter_room(sid, BURST_ROOM)
+        return {'joined': True, **burst_sampler.status()}
+    try:
+        status = await start_burst_window(data.get('duration'), data.get('rate'))
+    except (TypeError, ValueError, RuntimeError) as e:
+        return {'error': str(e)}
+    await sio.enter_room(sid, BURST_ROOM)
+    return status
+
+
+@sio.event
+async def unsubscribe(sid):
+    # Back to every metric at the global interval
+    await sampler.unsubscribe(sid)
+    return {'ok': True}
 
 
 @sio.event
 async def disconnect(sid):
     logging.info(f'Client disconnected: {sid}')
+    sampler.remove_client(sid)
+
+
+@sio.event
+async def watch(sid, data):
+    # Hub mode: subscribe to 'host_update' events for {'host': id} or {'group': name}
+    if fleet_hub is None or not isinstance(data, dict):
+        return {'error': 'Not running in hub mode'}
+    await fleet_hub.watch(sid, host=data.get('host'), group=data.get('group'))
+    return {'ok': True}
+
+
+@sio.event
+async def unwatch(sid, data):
+    if fleet_hub is not None and isinstance(data, dict):
+        await fleet_hub.unwatch(sid, host=data.get('host'), group=data.get('group'))
+
+
+async def run_agent():
+    # Agent mode: no web server, just the sampler streaming to the hub
+    fleet = config['fleet']
+    if not fleet['hub_url']:
+        logging.error("fleet.hub_url must be set in agent mode.")
+        exit(1)
+    agent = FleetAgent(
+        fleet['hub_url'],
+        fleet['host_id'] or platform.node(),
+        group=fleet['group'],
+        token=fleet['token'],
+        info=get_static_info(),
+        batch_interval=float(fleet['batch_interval']),
+        max_buffer=fleet['max_buffer']
+    )
+    sampler.add_listener(agent.on_sample)
+    await agent.run()
 
 
-async def main():
+async def main(reuse_port=None):
     host = config['server']['host']
-    
+
+    if FLEET_MODE == 'agent':
+        await run_agent()
+        return
+
+    assets.build()
+    logging.info(f"Serving {len(assets.assets)} static assets")
+
     # Set up routes
     app.router.add_get('/', index)
+    app.router.add_get('/static/{path:.+}', assets.handle)
     app.router.add_get('/api/system_info', api_system_info)
-    
+    app.router.add_get('/api/snapshot', api_snapshot)
+    app.router.add_get('/api/v2/metrics', api_metrics_v2)
+    app.router.add_get('/metrics', prometheus_metrics)
+    app.router.add_get('/api/history', api_history)
+    app.router.add_get('/api/history/export', api_history_export)
+    app.router.add_get('/api/quantiles', api_quantiles)
+    app.router.add_get('/api/burst', api_burst)
+    app.router.add_post('/api/burst', api_burst_start)
+    app.router.add_delete('/api/burst', api_burst_stop)
+    app.router.add_get('/api/alerts', api_alerts)
+    app.router.add_get('/api/clients', api_clients)
+    app.router.add_get('/api/internal', api_internal)
+    if fleet_hub is not None:
+        app.router.add_get(INGEST_PATH, fleet_hub.ingest)
+        app.router.add_get('/api/fleet', api_fleet)
+
+    # (scheme, port, ssl context) for each enabled listener
+    listeners = []
     if config['server']['https']['enabled']:
-        # HTTPS server
         cert_file = config['server']['https']['certificates']['cert_file']
         key_file = config['server']['https']['certificates']['key_file']
-        https_port = config['server']['https']['port']
         
         if not os.path.exists(cert_file) or not os.path.exists(key_file):
             logging.error("SSL certificates not found. Cannot start HTTPS server.")
             exit(1)
         
         import ssl
-        logging.info(f"Starting HTTPS server at https://{host}:{https_port}")
         context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
         context.load_cert_chain(cert_file, key_file)
-        
-        # Run the server with SSL
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(
-            runner,
-            host,
-            https_port,
-            ssl_context=context
-        )
+        listeners.append(('https', config['server']['https']['port'], context))
+
+    if config['server']['http']['enabled']:
+        listeners.append(('http', config['server']['http']['port'], None))
+
+    if not listeners:
+        logging.error("Neither HTTP nor HTTPS is enabled. At least one must be enabled.")
+        exit(1)
+
+    # One runner serves every listener, so HTTP and HTTPS share the app
+    runner = web.AppRunner(app)
+    await runner.setup()
+    for scheme, port, context in listeners:
+        logging.info(f"Starting {scheme.upper()} server at {scheme}://{host}:{port}")
+        site = web.TCPSite(runner, host, port, ssl_context=context, reuse_port=reuse_port)
         await site.start()
-        
-        # Keep the server running
+    if WORKER_INDEX is not None:
+        # Mirror samples from the start, even with no clients yet
+        sampler.start()
+
+    # Keep the server running
+    try:
         while True:
             await asyncio.sleep(3600)
-    
-    elif config['server']['http']['enabled']:
-        # HTTP server
-        http_port = config['server']['http']['port']
-        logging.info(f"Starting HTTP server at http://{host}:{http_port}")
-        
-        # Run the server
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(
-            runner,
-            host,
-            http_port
-        )
-        await site.start()
-        
-        # Keep the server running
+    finally:
+        await runner.cleanup()
+
+
+def worker_main(index, segment_name, epoch):
+    # Entry point of a serving process, started by run_workers()
+    global sampler, SAMPLER_EPOCH, WORKER_INDEX
+    WORKER_INDEX = index
+    # ETags stay valid whichever worker a poller lands on
+    SAMPLER_EPOCH = epoch
+    segment = SampleSegment.attach(segment_name, WORKERS)
+    sampler = SharedSampler(METRIC_SCHEDULE, segment, index)
+    logging.info(f"Worker {index} started (pid {os.getpid()})")
+    try:
+        asyncio.run(main(reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        segment.close()
+
+
+def start_worker(index, segment):
+    import multiprocessing
+    # Spawned rather than forked, so no event loop or pool threads are inherited
+    process = multiprocessing.get_context('spawn').Process(
+        target=worker_main, args=(index, segment.name, SAMPLER_EPOCH), name=f"worker-{index}", daemon=True)
+    process.start()
+    return process
+
+
+async def run_sampler_process(segment):
+    # Samples, records history and evaluates alerts for all workers, and
+    # restarts any worker that exits
+    global sampler
+    sampler = PublishingSampler(METRIC_SCHEDULE, segment)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    state = {}
+    await start_history(state)
+    await start_recording(state)
+    await start_alerts(state)
+    await start_loop_lag(state)
+    # Workers open the history database read-only, so it must exist first
+    workers = [start_worker(index, segment) for index in range(WORKERS)]
+    logging.info(f"Started {WORKERS} workers; sampling in process {os.getpid()}")
+    restart_at = {}
+    try:
         while True:
-            await asyncio.sleep(3600)
-    
-    else:
-        logging.error("Neither HTTP nor HTTPS is enabled. At least one must be enabled.")
-        exit(1)
+            if sampler.has_demand():
+                sampler.start()
+            for index, process in enumerate(workers):
+                if process.is_alive():
+                    continue
+                if index not in restart_at:
+                    logging.warning(f"Worker {index} exited with code {process.exitcode}, "
+                                    f"restarting in {WORKER_RESTART_DELAY}s")
+                    restart_at[index] = time.monotonic() + WORKER_RESTART_DELAY
+                elif time.monotonic() >= restart_at[index]:
+                    del restart_at[index]
+                    workers[index] = start_worker(index, segment)
+            await asyncio.sleep(0.25)
+    finally:
+        for process in workers:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        await stop_loop_lag(state)
+        await stop_recording(state)
+        await stop_history(state)
+
+
+def run_workers():
+    segment = SampleSegment.create(WORKERS)
+    try:
+        asyncio.run(run_sampler_process(segment))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        segment.close()
+
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if WORKERS > 1:
+        run_workers()
+    else:
+        asyncio.run(main())